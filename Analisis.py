@@ -0,0 +1,145 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Análisis rápido de la entrada para elegir el motor de compresión: con una muestra de unos
+# cientos de KB se estima la entropía de orden 0 (de los bytes o, en el texto, de los
+# caracteres, que es lo que codifica Huffman) y, según el objetivo, se prueba zlib o lzma
+# sobre la misma muestra. Los datos sin redundancia (ya comprimidos o aleatorios) se guardan
+# tal cual en lugar de gastar CPU en codificarlos y terminar con un archivo más grande.
+# Consola importa las constantes al arrancar, así que numpy solo se carga dentro de entropy.
+import lzma
+import zlib
+
+# Motores, del más barato al más caro en CPU; ante estimaciones parecidas gana el más barato
+ENGINES = ('stored', 'huffman', 'zlib', 'lzma')
+
+# Objetivos: speed solo estima la entropía; balanced prueba además zlib y size también lzma
+TARGETS = ('speed', 'balanced', 'size')
+TRIALS = {'speed': (), 'balanced': ('zlib',), 'size': ('zlib', 'lzma')}
+
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+
+# La muestra son SAMPLE_SLICES trozos repartidos por los datos, SAMPLE_SIZE bytes en total
+SAMPLE_SIZE = 1 << 18
+SAMPLE_SLICES = 16
+
+# Huffman no alcanza la entropía exacta y además guarda la tabla de cada bloque
+HUFFMAN_OVERHEAD = 0.02
+
+# Si ningún motor baja de esta razón estimada, no vale la pena codificar
+HOPELESS_RATIO = 0.97
+
+# Un motor más caro solo se elige si mejora la razón estimada en al menos esta fracción
+MIN_GAIN = 0.05
+
+
+def check_engine(engine, target='balanced'):
+    """
+    Comprueba que engine sea un motor de ENGINES o 'auto' y target uno de TARGETS.
+    """
+    if engine != 'auto' and engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}; use one of {', '.join(ENGINES)} or auto.")
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target {target}; use one of {', '.join(TARGETS)}.")
+
+
+def sample(data, size=SAMPLE_SIZE, slices=SAMPLE_SLICES):
+    """
+    Devuelve una muestra de los bytes: los datos completos si son pequeños o, si no, slices trozos
+    contiguos repartidos uniformemente, para que cuenten tanto el principio como el final.
+    """
+    if len(data) <= size:
+        return bytes(data)
+    piece = size // slices
+    starts = ((len(data) - piece) * index // (slices - 1) for index in range(slices))
+    return b''.join(bytes(data[start:start + piece]) for start in starts)
+
+
+def entropy(data):
+    """
+    Devuelve la entropía de orden 0 de los bytes en bits por byte (de 0 a 8).
+    """
+    import numpy as np
+
+    if not len(data):
+        return 0.0
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    probabilities = counts[counts > 0] / len(data)
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def character_entropy(data):
+    """
+    Devuelve la entropía de orden 0 de los caracteres de un texto UTF-8 en bits por byte. Los
+    caracteres partidos en los bordes de los trozos de la muestra se descartan.
+    """
+    import numpy as np
+
+    text = bytes(data).decode('utf-8', errors='ignore')
+    if not text:
+        return 0.0
+    _, counts = np.unique(np.frombuffer(text.encode('utf-32-le'), dtype='<u4'), return_counts=True)
+    probabilities = counts / len(text)
+    # Bits por caracter repartidos entre los bytes que ocupa cada caracter en promedio
+    return float(-(probabilities * np.log2(probabilities)).sum()) * len(text) / len(text.encode('utf-8'))
+
+
+def estimate_ratios(data, target='balanced', characters=False):
+    """
+    Estima la razón de compresión (tamaño comprimido / original) de cada motor que el objetivo
+    considera, sobre una muestra de los datos. Con characters los datos son texto UTF-8 y
+    Huffman codifica caracteres enteros en lugar de bytes.
+    """
+    check_engine('auto', target)
+    data = sample(data)
+    bits = character_entropy(data) if characters else entropy(data)
+    ratios = {'stored': 1.0, 'huffman': bits / 8 + HUFFMAN_OVERHEAD}
+    if data:
+        if 'zlib' in TRIALS[target]:
+            ratios['zlib'] = len(zlib.compress(data, ZLIB_LEVEL)) / len(data)
+        if 'lzma' in TRIALS[target]:
+            ratios['lzma'] = len(lzma.compress(data, preset=LZMA_PRESET)) / len(data)
+    return ratios
+
+
+def choose_engine(data, target='balanced', characters=False):
+    """
+    Devuelve el motor más barato para los datos según el objetivo: 'stored' si ninguno baja de
+    HOPELESS_RATIO y, si no, el más barato de los que bajan, salvo que uno más caro lo mejore
+    en al menos MIN_GAIN. characters es el de estimate_ratios.
+    """
+    ratios = estimate_ratios(data, target, characters)
+    viable = [engine for engine in ENGINES[1:] if engine in ratios and ratios[engine] < HOPELESS_RATIO]
+    if not viable:
+        return 'stored'
+
+    choice = viable[0]
+    for engine in viable[1:]:
+        if ratios[engine] < ratios[choice] * (1 - MIN_GAIN):
+            choice = engine
+    return choice
+
+
+def compress_raw(engine, data):
+    """
+    Codifica los bytes con un motor sin tabla de Huffman: 'stored', 'zlib' o 'lzma'.
+    """
+    if engine == 'stored':
+        return bytes(data)
+    if engine == 'zlib':
+        return zlib.compress(data, ZLIB_LEVEL)
+    return lzma.compress(data, preset=LZMA_PRESET)
+
+
+def decompress_raw(engine, record):
+    """
+    Inversa de compress_raw.
+    """
+    if engine == 'stored':
+        return bytes(record)
+    if engine == 'zlib':
+        return zlib.decompress(record)
+    return lzma.decompress(record)
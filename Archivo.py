@@ -0,0 +1,275 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Archivo con varios miembros comprimidos (de cualquier códec) en un solo archivo, con un
+# directorio central al final: listar o extraer un miembro solo lee el final del archivo y
+# ese miembro, sin recorrer los demás. La lectura usa mmap.
+#
+#   python Archivo.py create archivo.hfa carpeta_o_archivo [...] [-j procesos]
+#   python Archivo.py list archivo.hfa
+#   python Archivo.py extract archivo.hfa -o salida [miembro ...]
+#
+# Formato (v son varints y el resto enteros big endian):
+#   cabecera:    MAGIC (4) | versión (1)
+#   miembros:    el archivo comprimido de cada uno, tal cual
+#   directorio:  miembros (v) | por miembro: nombre (v + UTF-8) | códec (v + UTF-8) |
+#                desplazamiento (v) | tamaño (v) | tamaño original (v) | CRC-32 (4)
+#   final:       desplazamiento del directorio (8) | tamaño del directorio (4)
+# El códec es la extensión del archivo comprimido en Registro.DECOMPRESSORS y el CRC-32 es
+# el de los bytes guardados, que se comprueba al extraer.
+import argparse
+import mmap
+import os
+import sys
+import tempfile
+import zlib
+from Bloques import decode_varint, encode_varint
+from Consola import find_files, process_file, split_duplicates
+from Registro import COMPRESSORS, decompress_path, find_entry
+
+MAGIC = b'\x89HFA'
+VERSION = 1
+
+FOOTER_SIZE = 12
+COPY_SIZE = 1 << 20
+
+
+class ArchiveMember:
+    """
+    Entrada del directorio central: nombre (ruta relativa con /), códec, desplazamiento y tamaño
+    de los datos guardados, tamaño del archivo original y CRC-32 de los datos guardados.
+    """
+
+    def __init__(self, name, codec, offset, size, original_size, checksum):
+        self.name = name
+        self.codec = codec
+        self.offset = offset
+        self.size = size
+        self.original_size = original_size
+        self.checksum = checksum
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    return encode_varint(len(data)) + data
+
+
+def decode_string(data, pos):
+    size, pos = decode_varint(data, pos)
+    return bytes(data[pos:pos + size]).decode('utf-8'), pos + size
+
+
+class ArchiveWriter:
+    """
+    Escribe un archivo nuevo; los miembros se añaden con add y close escribe el directorio.
+    Si ocurre un error dentro del bloque with, se borra el archivo incompleto.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + bytes((VERSION,)))
+        self.members = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.path)
+
+    def add(self, name, compressed_file, codec, original_size):
+        """
+        Copia el archivo comprimido al final del archivo como el miembro name.
+        """
+        if name in self.members:
+            raise ValueError(f"Duplicate archive member {name}.")
+        offset = self.file.tell()
+        checksum = 0
+        with open(compressed_file, 'rb') as source:
+            for chunk in iter(lambda: source.read(COPY_SIZE), b''):
+                checksum = zlib.crc32(chunk, checksum)
+                self.file.write(chunk)
+        self.members[name] = ArchiveMember(name, codec, offset, self.file.tell() - offset, original_size, checksum)
+
+    def close(self):
+        directory = bytearray(encode_varint(len(self.members)))
+        for member in self.members.values():
+            directory += encode_string(member.name) + encode_string(member.codec)
+            directory += encode_varint(member.offset) + encode_varint(member.size) + encode_varint(member.original_size)
+            directory += member.checksum.to_bytes(4, byteorder='big')
+        directory_offset = self.file.tell()
+        self.file.write(directory)
+        self.file.write(directory_offset.to_bytes(8, byteorder='big') + len(directory).to_bytes(4, byteorder='big'))
+        self.file.close()
+
+
+class ArchiveReader:
+    """
+    Abre un archivo con mmap y lee su directorio central; los miembros se leen bajo demanda.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap no acepta archivos vacíos
+            self.file.close()
+            raise ValueError(f"{path} is not an archive.")
+        if self.map[:len(MAGIC)] != MAGIC or len(self.map) < len(MAGIC) + 1 + FOOTER_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not an archive.")
+        if self.map[len(MAGIC)] != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported archive version {self.map[len(MAGIC)]}.")
+
+        footer = self.map[-FOOTER_SIZE:]
+        directory_offset = int.from_bytes(footer[:8], byteorder='big')
+        directory_size = int.from_bytes(footer[8:], byteorder='big')
+        directory = self.map[directory_offset:directory_offset + directory_size]
+
+        self.members = {}
+        count, pos = decode_varint(directory, 0)
+        for _ in range(count):
+            name, pos = decode_string(directory, pos)
+            codec, pos = decode_string(directory, pos)
+            offset, pos = decode_varint(directory, pos)
+            size, pos = decode_varint(directory, pos)
+            original_size, pos = decode_varint(directory, pos)
+            checksum = int.from_bytes(directory[pos:pos + 4], byteorder='big')
+            pos += 4
+            self.members[name] = ArchiveMember(name, codec, offset, size, original_size, checksum)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def write_member(self, name, output_file):
+        """
+        Escribe los datos guardados del miembro (aún comprimidos) en output_file y comprueba su CRC-32.
+        """
+        member = self.members[name]
+        # La vista no copia los datos; se libera antes de poder cerrar el mmap
+        with memoryview(self.map)[member.offset:member.offset + member.size] as data:
+            if zlib.crc32(data) != member.checksum:
+                raise ValueError(f"Corrupted archive member {name}: checksum mismatch.")
+            with open(output_file, 'wb') as file:
+                file.write(data)
+
+    def extract(self, name, output_folder, progress_callback=None, **options):
+        """
+        Descomprime el miembro en la carpeta de salida, con su ruta relativa, y devuelve la ruta
+        del resultado. Las opciones se pasan al codificador como en Registro.decompress_path.
+        """
+        member = self.members[name]
+        parts = member.name.split('/')
+        # Un archivo manipulado no debe poder escribir fuera de la carpeta de salida
+        if member.name.startswith('/') or '..' in parts or os.path.isabs(member.name):
+            raise ValueError(f"Unsafe archive member name {member.name}.")
+        output_file = os.path.join(output_folder, *parts)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        # La carpeta temporal está junto al resultado para que renombrarlo no copie nada
+        with tempfile.TemporaryDirectory(prefix='.tmp-', dir=os.path.dirname(output_file)) as folder:
+            compressed_file = os.path.join(folder, os.path.splitext(os.path.basename(member.name))[0] + member.codec)
+            self.write_member(name, compressed_file)
+            result = decompress_path(compressed_file, folder, progress_callback, **options)
+            os.replace(result, output_file)
+        return output_file
+
+
+def member_name(input_file, relative):
+    """
+    Nombre del miembro: la ruta relativa del archivo, con / como separador. Los archivos de un
+    directorio llevan delante el nombre del directorio (ver Consola.find_files).
+    """
+    return os.path.normpath(os.path.join(relative, os.path.basename(input_file))).replace(os.sep, '/')
+
+
+def create_archive(archive_path, inputs, workers=None, **options):
+    """
+    Comprime los archivos de las rutas dadas (archivos o directorios) en paralelo y los guarda en
+    un archivo nuevo. Devuelve [(archivo, error)] de los que fallaron, que no se incluyen; entre
+    ellos están los que tendrían el mismo nombre de miembro que uno anterior.
+    """
+    files, duplicates = split_duplicates(find_files(inputs, COMPRESSORS))
+    failures = [(input_file, f"same member name as {previous_file}") for input_file, previous_file in duplicates]
+    with tempfile.TemporaryDirectory(prefix='.tmp-', dir=os.path.dirname(os.path.abspath(archive_path))) as folder:
+        names = {input_file: member_name(input_file, relative) for input_file, relative in files}
+        # Con varios archivos a la vez, cada codificador trabaja en un solo proceso
+        if workers != 1:
+            options.setdefault('workers', 1)
+        # Cada trabajo usa su propia carpeta para que archivos con el mismo nombre no choquen
+        tasks = (('compress', input_file, os.path.join(folder, str(number)), options, (False, False, None))
+                 for number, (input_file, _) in enumerate(files))
+
+        # Bloques carga numpy; se importa aquí para que listar y extraer no lo necesiten
+        from Bloques import map_blocks
+        with ArchiveWriter(archive_path) as writer:
+            for input_file, output_file, size_read, _, error, _ in map_blocks(process_file, tasks, workers):
+                if error:
+                    failures.append((input_file, error))
+                    continue
+                writer.add(names[input_file], output_file, find_entry(COMPRESSORS, input_file)[2], size_read)
+                os.remove(output_file)
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Pack compressed files into one archive, list it or extract members.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help="compress files and directory trees into a new archive")
+    create.add_argument('archive')
+    create.add_argument('inputs', nargs='+', help="files or directories to add")
+    create.add_argument('-j', '--workers', type=int, default=None, help="files compressed at once (default: one per core)")
+
+    listing = commands.add_parser('list', help="list the members of an archive")
+    listing.add_argument('archive')
+
+    extract = commands.add_parser('extract', help="decompress members of an archive")
+    extract.add_argument('archive')
+    extract.add_argument('members', nargs='*', help="members to extract (default: all)")
+    extract.add_argument('-o', '--output', required=True, help="output folder")
+    return parser
+
+
+def main(arguments=None):
+    args = build_parser().parse_args(arguments)
+
+    if args.command == 'create':
+        failures = create_archive(args.archive, args.inputs, args.workers)
+        for input_file, error in failures:
+            print(f"FAILED {input_file}: {error}", file=sys.stderr)
+        return 1 if failures else 0
+
+    with ArchiveReader(args.archive) as reader:
+        if args.command == 'list':
+            print(f"{'size':>12}{'original':>12}  {'codec':<10}name")
+            for member in reader.members.values():
+                print(f"{member.size:>12}{member.original_size:>12}  {member.codec:<10}{member.name}")
+            return 0
+
+        missing = [name for name in args.members if name not in reader.members]
+        for name in missing:
+            print(f"FAILED {name}: no such member", file=sys.stderr)
+        for name in args.members or reader.members:
+            if name in reader.members:
+                print(f"{name} -> {reader.extract(name, args.output)}")
+        return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Comprobación del tiempo de arranque: importa los puntos de entrada en un intérprete nuevo
+# con python -X importtime, falla si se cargó alguna dependencia pesada o si se pasó del
+# presupuesto, y muestra las importaciones más lentas.
+#
+#   python Arranque.py [--budget milisegundos] [--top n]
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Puntos de entrada que deben arrancar rápido
+ENTRY_MODULES = ('Compresor', 'Consola')
+
+# Dependencias que solo deben cargarse al usar el códec que las necesita
+HEAVY_MODULES = ('moviepy', 'numpy', 'PIL', 'bitarray', 'matplotlib')
+
+# Tiempo máximo de importación, en milisegundos
+BUDGET_MS = 100
+
+
+def measure_imports(module):
+    """
+    Importa el módulo con -X importtime y devuelve [(módulo, propio en µs, acumulado en µs)].
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # Formato: "import time:  propio |  acumulado | módulo"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(self_time), int(cumulative)))
+    return imports
+
+
+def check_module(module, budget_ms, top):
+    """
+    Mide un punto de entrada, muestra el informe y devuelve True si pasa la comprobación.
+    """
+    imports = measure_imports(module)
+    total_ms = sum(self_time for _, self_time, _ in imports) / 1000
+    loaded = {name.split('.')[0] for name, _, _ in imports}
+    heavy = sorted(loaded.intersection(HEAVY_MODULES))
+
+    print(f"{module}: {total_ms:.1f} ms for {len(imports)} imports (budget {budget_ms} ms)")
+    for name, _, cumulative in sorted(imports, key=lambda entry: entry[2], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if heavy:
+        print(f"  heavy dependencies loaded at startup: {', '.join(heavy)}")
+
+    return not heavy and total_ms <= budget_ms
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Check the cold-start import time of the entry points.")
+    parser.add_argument('--budget', type=float, default=BUDGET_MS, help="maximum import time in milliseconds")
+    parser.add_argument('--top', type=int, default=5, help="number of slowest imports to show")
+    args = parser.parse_args(arguments)
+
+    results = [check_module(module, args.budget, args.top) for module in ENTRY_MODULES]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
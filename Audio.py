@@ -6,69 +6,94 @@
 # Importación de las librerías necesarias para su funcionamiento
 import os
 import wave
-import numpy as np
+import AudioSinPerdida
+from Bloques import is_container, partial_output
+from Medicion import NULL_RECORDER
+from Remuestreo import PolyphaseResampler, read_samples, write_samples
+
+
+# Número de frames que se leen, procesan y escriben a la vez; acota la memoria usada
+BLOCK_FRAMES = 1 << 16
 
 
 class AudioCompressor:
-    def compress_file(self, input_file, output_folder):
-        # Abrir el archivo WAV de entrada para lectura binaria
-        with wave.open(input_file, 'rb') as wave_file:
-            # Obtener la configuración del archivo WAV
+    def __init__(self, block_frames=BLOCK_FRAMES, factor=2, lossless=False, workers=None, recorder=None):
+        # Inicializa el compresor; block_frames fija cuántos frames se procesan por bloque,
+        # de modo que la memoria no crece con la duración de la grabación, y factor es la
+        # reducción de la frecuencia de muestreo al comprimir. Con lossless se usa en su lugar
+        # el códec sin pérdida, repartido en workers procesos (por defecto, uno por núcleo).
+        # recorder recibe las mediciones de cada etapa
+        self.block_frames = block_frames
+        self.factor = factor
+        self.lossless = lossless
+        self.workers = workers
+        self.recorder = recorder or NULL_RECORDER
+
+    def read_blocks(self, wave_file):
+        """
+        Lee el archivo WAV abierto en bloques de block_frames frames, hasta getnframes() frames.
+        """
+        remaining = wave_file.getnframes()
+        while remaining > 0:
+            frames = wave_file.readframes(min(self.block_frames, remaining))
+            if not frames:
+                break
+            remaining -= self.block_frames
+            yield frames
+
+    def resample_file(self, input_file, output_file_path, up, down, progress_callback=None):
+        """
+        Remuestrea un archivo WAV por up/down con el filtro polifásico, bloque por bloque.
+        progress_callback recibe el porcentaje de frames procesados tras cada bloque.
+        """
+        # Abrir el archivo WAV de entrada y el de salida; los bloques se escriben según se procesan
+        # y, si el callback cancela a la mitad, se borra la salida incompleta
+        with wave.open(input_file, 'rb') as wave_file, partial_output(output_file_path), \
+                wave.open(output_file_path, 'wb') as resampled_wave_file:
+            # Copiar la configuración del archivo WAV
             sample_width = wave_file.getsampwidth()
             channels = wave_file.getnchannels()
-            framerate = wave_file.getframerate()
-            frames = wave_file.readframes(wave_file.getnframes())
-
-        # Convertir los frames del audio a un array de NumPy con tipo de dato int16
-        audio_array = np.frombuffer(frames, dtype=np.int16)
+            resampled_wave_file.setsampwidth(sample_width)
+            resampled_wave_file.setnchannels(channels)
+            resampled_wave_file.setframerate(int(wave_file.getframerate() * up / down))
+
+            # El filtro conserva su estado entre bloques, así que el resultado no depende de block_frames
+            resampler = PolyphaseResampler(up, down, channels)
+            for frames in self.recorder.iterate('read', self.read_blocks(wave_file), len):
+                with self.recorder.stage('resample', len(frames)) as stage:
+                    resampled_frames = write_samples(resampler.process(read_samples(frames, sample_width, channels)),
+                                                     sample_width)
+                    stage.bytes_out = len(resampled_frames)
+                # La cabecera se completa al cerrar el archivo
+                with self.recorder.stage('write', len(resampled_frames)) as stage:
+                    resampled_wave_file.writeframesraw(resampled_frames)
+                    stage.bytes_out = len(resampled_frames)
+                if progress_callback:
+                    progress_callback(100 * wave_file.tell() / max(wave_file.getnframes(), 1))
+            resampled_wave_file.writeframesraw(write_samples(resampler.flush(), sample_width))
 
-        # Reducir el número de muestras (puedes ajustar este valor)
-        factor = 2
-        compressed_audio_array = audio_array[::factor]
+        return output_file_path
 
-        # Convertir el array comprimido de audio de nuevo a frames de bytes
-        compressed_frames = compressed_audio_array.tobytes()
+    def compress_file(self, input_file, output_folder, progress_callback=None):
+        if self.lossless:
+            output_file_path = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_compressed.bin")
+            return AudioSinPerdida.compress_file(input_file, output_file_path, workers=self.workers,
+                                                 progress_callback=progress_callback, recorder=self.recorder)
 
         # Construir la ruta de salida para el archivo comprimido
         output_file_path = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_compressed.wav")
 
-        # Crear un nuevo archivo WAV para escribir el audio comprimido
-        with wave.open(output_file_path, 'wb') as compressed_wave_file:
-            compressed_wave_file.setsampwidth(sample_width)
-            compressed_wave_file.setnchannels(channels)
-            compressed_wave_file.setframerate(int(framerate / factor))
-            compressed_wave_file.writeframes(compressed_frames)
-
-        return output_file_path
-
-    def decompress_file(self, input_file, output_folder):
-        # Abrir el archivo WAV comprimido para lectura binaria
-        with wave.open(input_file, 'rb') as compressed_wave_file:
-            # Obtener la configuración del archivo WAV comprimido
-            sample_width = compressed_wave_file.getsampwidth()
-            channels = compressed_wave_file.getnchannels()
-            framerate = compressed_wave_file.getframerate()
-            frames = compressed_wave_file.readframes(compressed_wave_file.getnframes())
-
-        # Convertir los frames del audio comprimido a un array de NumPy con tipo de dato int16
-        audio_array = np.frombuffer(frames, dtype=np.int16)
-
-        # Ajustar el número de muestras para la descompresión (debería ser el mismo factor utilizado en la compresión)
-        factor = 2
-        decompressed_audio_array = np.zeros(len(audio_array) * factor, dtype=np.int16)
-        decompressed_audio_array[::factor] = audio_array
-
-        # Convertir el array descomprimido de audio de nuevo a frames de bytes
-        decompressed_frames = decompressed_audio_array.tobytes()
+        # Reducir la frecuencia de muestreo por factor, filtrando antes para evitar aliasing
+        return self.resample_file(input_file, output_file_path, 1, self.factor, progress_callback)
 
+    def decompress_file(self, input_file, output_folder, progress_callback=None):
         # Construir la ruta de salida para el archivo descomprimido
         output_file_path = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(input_file))[0]}_decompressed.wav")
 
-        # Crear un nuevo archivo WAV para escribir el audio descomprimido
-        with wave.open(output_file_path, 'wb') as decompressed_wave_file:
-            decompressed_wave_file.setsampwidth(sample_width)
-            decompressed_wave_file.setnchannels(channels)
-            decompressed_wave_file.setframerate(int(framerate * factor))
-            decompressed_wave_file.writeframes(decompressed_frames)
+        # Los archivos sin pérdida se reconocen por su número mágico
+        if is_container(input_file, AudioSinPerdida.MAGIC):
+            return AudioSinPerdida.decompress_file(input_file, output_file_path, self.workers, progress_callback,
+                                                   self.recorder)
 
-        return output_file_path
+        # Recuperar la frecuencia original interpolando (debería ser el mismo factor utilizado en la compresión)
+        return self.resample_file(input_file, output_file_path, self.factor, 1, progress_callback)
@@ -0,0 +1,410 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Compresión de audio sin pérdida al estilo de FLAC: cada subtrama de cada canal se predice
+# con un predictor fijo o LPC y los residuos se codifican con códigos de Rice.
+#
+# Formato: el marco del contenedor por bloques (Bloques.py) con su propio número mágico;
+# los metadatos (JSON) describen el WAV original. Cada bloque es independiente:
+#   frames (v) | modo estéreo por subtrama (1 c/u, solo con 2 canales)
+#   por subtrama y canal: orden (1) | desplazamiento (1) | parámetro de Rice (1) | coeficientes (v)
+#   bits de escape (1) | tamaño de cada flujo (v) | unario | bits bajos | escapes
+# Los cocientes de Rice (en unario), sus bits bajos y los valores escapados van en flujos
+# separados para poder decodificarlos con operaciones vectorizadas.
+import json
+import wave
+import numpy as np
+from Bloques import ContainerReader, ContainerWriter, decode_varint, encode_varint, map_blocks, partial_output
+from Huffman import pack_bits, read_fields
+from Medicion import NULL_RECORDER, worker_recorder
+from Remuestreo import read_samples, write_samples
+
+MAGIC = b'\x89HLA'
+VERSION = 1
+
+# Frames por bloque del contenedor y por subtrama; todas las subtramas de un bloque
+# se reconstruyen a la vez, así que bloques grandes decodifican más rápido
+BLOCK_FRAMES = 1 << 20
+SUBFRAME_FRAMES = 4096
+
+# Predictores fijos de orden 0 a 4 (coeficientes de x[n - 1], x[n - 2], ...)
+FIXED_COEFFICIENTS = ((), (1,), (2, -1), (3, -3, 1), (4, -6, 4, -1))
+
+# Órdenes LPC que se prueban y bits de los coeficientes cuantizados (con signo)
+LPC_ORDERS = (4, 8, 12)
+LPC_PRECISION = 15
+
+# Los predictores candidatos se comparan con una de cada EVALUATION_STEP muestras
+EVALUATION_STEP = 4
+
+# Un cociente de Rice igual a ESCAPE_QUOTIENT indica que el valor va completo en el flujo de escapes
+MAX_RICE_PARAMETER = 30
+ESCAPE_QUOTIENT = 63
+
+# Modos estéreo: qué par de señales se codifica en lugar de (izquierdo, derecho)
+STEREO_INDEPENDENT = 0
+STEREO_LEFT_SIDE = 1
+STEREO_SIDE_RIGHT = 2
+STEREO_MID_SIDE = 3
+
+
+def zigzag(values):
+    # Intercala positivos y negativos: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+    return (values << 1) ^ (values >> 63)
+
+
+def unzigzag(values):
+    return (values >> 1) ^ -(values & 1)
+
+
+def tukey_window(length, alpha=0.5):
+    """
+    Ventana de Tukey: plana en el centro con los bordes en coseno, como la que usa FLAC.
+    """
+    window = np.ones(length)
+    edge = int(alpha * (length - 1) / 2)
+    if edge > 0:
+        ramp = 0.5 * (1 - np.cos(np.pi * np.arange(edge) / edge))
+        window[:edge] = ramp
+        window[length - edge:] = ramp[::-1]
+    return window
+
+
+def decorrelate(left, right):
+    """
+    Elige para cada subtrama el par de señales más barato entre izquierdo/derecho,
+    izquierdo/lateral, lateral/derecho y medio/lateral. Devuelve (modos, primera, segunda).
+    """
+    side = left - right
+    mid = (left + right) >> 1
+    # Estimación del costo: magnitud del residuo del predictor fijo de orden 2
+    cost = {name: np.abs(np.diff(signal, 2, axis=1)).sum(axis=1)
+            for name, signal in (('left', left), ('right', right), ('side', side), ('mid', mid))}
+    modes = np.argmin(np.stack((cost['left'] + cost['right'], cost['left'] + cost['side'],
+                                cost['side'] + cost['right'], cost['mid'] + cost['side'])), axis=0)
+
+    rows = np.arange(len(modes))
+    first = np.stack((left, left, side, mid))[modes, rows]
+    second = np.stack((right, side, right, side))[modes, rows]
+    return modes.astype(np.uint8), first, second
+
+
+def recorrelate(modes, first, second):
+    """
+    Invierte decorrelate y devuelve (izquierdo, derecho).
+    """
+    modes = modes[:, None]
+    mid = (first << 1) | (second & 1)
+    left = np.select([modes == STEREO_SIDE_RIGHT, modes == STEREO_MID_SIDE], [first + second, (mid + second) >> 1], first)
+    right = np.select([modes == STEREO_INDEPENDENT, modes == STEREO_SIDE_RIGHT, modes == STEREO_MID_SIDE],
+                      [second, second, (mid - second) >> 1], first - second)
+    return left, right
+
+
+def lpc_coefficients(signals):
+    """
+    Calcula con Levinson-Durbin, para todas las señales a la vez, los coeficientes LPC
+    de cada orden de LPC_ORDERS. Devuelve {orden: array (señales, orden)}.
+    """
+    windowed = signals * tukey_window(signals.shape[1])
+    max_order = max(LPC_ORDERS)
+    autocorrelation = np.stack([(windowed[:, lag:] * windowed[:, :windowed.shape[1] - lag]).sum(axis=1)
+                                for lag in range(max_order + 1)], axis=1)
+    # Un poco de ruido blanco evita sistemas mal condicionados
+    autocorrelation[:, 0] *= 1 + 1e-9
+
+    coefficients = np.zeros((len(signals), max_order))
+    error = autocorrelation[:, 0].copy()
+    by_order = {}
+    for order in range(max_order):
+        accumulated = autocorrelation[:, order + 1] - (coefficients[:, :order] * autocorrelation[:, order:0:-1]).sum(axis=1)
+        reflection = np.divide(accumulated, error, out=np.zeros_like(error), where=error > 0)
+        coefficients[:, :order] -= reflection[:, None] * coefficients[:, :order][:, ::-1]
+        coefficients[:, order] = reflection
+        error *= 1 - reflection ** 2
+        if order + 1 in LPC_ORDERS:
+            by_order[order + 1] = coefficients[:, :order + 1].copy()
+    return by_order
+
+
+def quantize_coefficients(coefficients):
+    """
+    Cuantiza los coeficientes a enteros de LPC_PRECISION bits y devuelve (enteros, desplazamientos).
+    """
+    largest = np.abs(coefficients).max(axis=1)
+    exponents = np.floor(np.log2(np.where(largest > 0, largest, 1)))
+    shifts = np.clip(LPC_PRECISION - 2 - exponents, 0, 15).astype(np.int64)
+    limit = (1 << (LPC_PRECISION - 1)) - 1
+    quantized = np.clip(np.rint(coefficients * (2.0 ** shifts)[:, None]), -limit, limit).astype(np.int64)
+    return quantized, shifts
+
+
+def predict(signals, coefficients, shifts, step=1):
+    """
+    Predicción de cada muestra (o de una de cada step) a partir de las anteriores, con ceros
+    antes del inicio de la subtrama.
+    """
+    length = signals.shape[1]
+    order = coefficients.shape[1]
+    padded = np.zeros((len(signals), length + order), dtype=np.int64)
+    padded[:, order:] = signals
+    prediction = np.zeros((len(signals), -(-length // step)), dtype=np.int64)
+    for tap in range(order):
+        prediction += coefficients[:, tap, None] * padded[:, order - 1 - tap:order - 1 - tap + length:step]
+    return prediction >> shifts[:, None]
+
+
+def rice_parameters(values):
+    """
+    Elige el parámetro de Rice de cada señal y devuelve (parámetros, bits estimados).
+    """
+    length = values.shape[1]
+    estimate = np.floor(np.log2(values.mean(axis=1) + 1)).astype(np.int64)
+    best_parameter = np.zeros(len(values), dtype=np.int64)
+    best_cost = np.full(len(values), np.inf)
+    for offset in (-1, 0, 1):
+        parameter = np.clip(estimate + offset, 0, MAX_RICE_PARAMETER)
+        cost = length * (parameter + 1) + (values >> parameter[:, None]).sum(axis=1)
+        better = cost < best_cost
+        best_parameter[better] = parameter[better]
+        best_cost[better] = cost[better]
+    return best_parameter, best_cost
+
+
+def choose_predictors(signals):
+    """
+    Prueba los predictores fijos y LPC en cada señal y se queda con el más barato.
+    Devuelve (coeficientes por señal, desplazamientos, parámetros de Rice, residuos en zigzag).
+    """
+    count = len(signals)
+    candidates = [(np.tile(np.array(fixed, dtype=np.int64), (count, 1)), np.zeros(count, dtype=np.int64))
+                  for fixed in FIXED_COEFFICIENTS]
+    candidates += [quantize_coefficients(coefficients) for coefficients in lpc_coefficients(signals.astype(np.float64)).values()]
+
+    # Los candidatos se comparan con una de cada EVALUATION_STEP muestras; solo el elegido
+    # se calcula completo
+    sampled = signals[:, ::EVALUATION_STEP]
+    best_cost = np.full(count, np.inf)
+    best_candidate = np.zeros(count, dtype=np.int64)
+    for number, (coefficients, shifts) in enumerate(candidates):
+        values = zigzag(sampled - predict(signals, coefficients, shifts, EVALUATION_STEP))
+        _, cost = rice_parameters(values)
+        cost += coefficients.shape[1] * LPC_PRECISION / EVALUATION_STEP
+        better = cost < best_cost
+        best_cost[better] = cost[better]
+        best_candidate[better] = number
+
+    values = np.zeros_like(signals)
+    coefficients = [None] * count
+    shifts = np.zeros(count, dtype=np.int64)
+    for number, (candidate_coefficients, candidate_shifts) in enumerate(candidates):
+        rows = np.flatnonzero(best_candidate == number)
+        if len(rows):
+            values[rows] = zigzag(signals[rows] - predict(signals[rows], candidate_coefficients[rows], candidate_shifts[rows]))
+            shifts[rows] = candidate_shifts[rows]
+            for row, row_coefficients in zip(rows, candidate_coefficients[rows].tolist()):
+                coefficients[row] = row_coefficients
+
+    parameters, _ = rice_parameters(values)
+    return coefficients, shifts, parameters, values
+
+
+def compress_audio_block(task):
+    """
+    Codifica un bloque (muestras enteras con forma (frames, canales), opciones de medición) y devuelve
+    su registro junto con las etapas medidas.
+    """
+    samples, measure = task
+    recorder = worker_recorder(measure)
+    frames, channels = samples.shape
+    subframes = -(-frames // SUBFRAME_FRAMES)
+
+    # Las subtramas incompletas se completan con ceros; al decodificar se recortan
+    padded = np.zeros((subframes * SUBFRAME_FRAMES, channels), dtype=np.int64)
+    padded[:frames] = samples
+    signals = padded.reshape(subframes, SUBFRAME_FRAMES, channels).transpose(0, 2, 1).copy()
+
+    header = bytearray(encode_varint(frames))
+    with recorder.stage('prediction', samples.nbytes):
+        if channels == 2:
+            modes, signals[:, 0], signals[:, 1] = decorrelate(signals[:, 0], signals[:, 1])
+            header += modes.tobytes()
+
+        signals = signals.reshape(-1, SUBFRAME_FRAMES)
+        coefficients, shifts, parameters, values = choose_predictors(signals)
+    for signal_coefficients, shift, parameter in zip(coefficients, shifts, parameters):
+        header += bytes((len(signal_coefficients), int(shift), int(parameter)))
+        for coefficient in signal_coefficients:
+            header += encode_varint(zigzag(coefficient))
+
+    # Cociente en unario (ceros terminados en un uno), bits bajos y escapes en flujos separados
+    with recorder.stage('rice coding', values.nbytes) as stage:
+        sample_parameters = np.repeat(parameters, SUBFRAME_FRAMES)
+        values = values.ravel()
+        quotients = values >> sample_parameters
+        escaped = quotients >= ESCAPE_QUOTIENT
+        quotients[escaped] = ESCAPE_QUOTIENT
+        unary, _ = pack_bits(np.ones(len(values), dtype=np.uint64), quotients + 1)
+
+        low_lengths = np.where(escaped, 0, sample_parameters)
+        kept = low_lengths > 0
+        low_bits, _ = pack_bits((values & ((1 << low_lengths) - 1))[kept], low_lengths[kept]) if kept.any() else (b'', 0)
+
+        escape_bits = int(values[escaped].max()).bit_length() if escaped.any() else 0
+        escapes, _ = pack_bits(values[escaped], np.full(escaped.sum(), escape_bits)) if escape_bits else (b'', 0)
+        stage.bytes_out = len(unary) + len(low_bits) + len(escapes)
+
+    header.append(escape_bits)
+    for stream in (unary, low_bits, escapes):
+        header += encode_varint(len(stream))
+    return b''.join((header, unary, low_bits, escapes)), recorder.stages
+
+
+def decompress_audio_block(task):
+    """
+    Decodifica el registro de un bloque (canales, registro, opciones de medición) y devuelve las muestras
+    (frames, canales) junto con las etapas medidas.
+    """
+    channels, record, measure = task
+    recorder = worker_recorder(measure)
+    record = memoryview(record)
+    frames, pos = decode_varint(record, 0)
+    subframes = -(-frames // SUBFRAME_FRAMES)
+    signal_count = subframes * channels
+
+    if channels == 2:
+        modes = np.frombuffer(record[pos:pos + subframes], dtype=np.uint8)
+        pos += subframes
+
+    max_order = max(max(LPC_ORDERS), len(FIXED_COEFFICIENTS) - 1)
+    coefficients = np.zeros((signal_count, max_order), dtype=np.int64)
+    shifts = np.zeros(signal_count, dtype=np.int64)
+    parameters = np.zeros(signal_count, dtype=np.int64)
+    for signal in range(signal_count):
+        order, shifts[signal], parameters[signal] = record[pos:pos + 3]
+        pos += 3
+        for tap in range(order):
+            value, pos = decode_varint(record, pos)
+            coefficients[signal, tap] = unzigzag(value)
+
+    escape_bits = record[pos]
+    sizes = []
+    pos += 1
+    for _ in range(3):
+        size, pos = decode_varint(record, pos)
+        sizes.append(size)
+    unary = record[pos:pos + sizes[0]]
+    low_bits = record[pos + sizes[0]:pos + sizes[0] + sizes[1]]
+    escapes = record[pos + sizes[0] + sizes[1]:pos + sum(sizes)]
+
+    # Cada uno del flujo unario cierra un cociente
+    with recorder.stage('rice decoding', sum(sizes)) as stage:
+        total = signal_count * SUBFRAME_FRAMES
+        ones = np.flatnonzero(np.unpackbits(np.frombuffer(unary, dtype=np.uint8)))[:total]
+        if len(ones) != total:
+            raise ValueError("Corrupted block: the residual stream is truncated.")
+        quotients = np.diff(ones, prepend=-1) - 1
+        escaped = quotients == ESCAPE_QUOTIENT
+
+        sample_parameters = np.repeat(parameters, SUBFRAME_FRAMES)
+        low_lengths = np.where(escaped, 0, sample_parameters)
+        values = (quotients << sample_parameters) | read_fields(low_bits, low_lengths)
+        if escaped.any():
+            values[escaped] = read_fields(escapes, np.full(escaped.sum(), escape_bits))
+        residuals = unzigzag(values).reshape(signal_count, SUBFRAME_FRAMES)
+        stage.bytes_out = residuals.nbytes
+
+    # Todas las subtramas se reconstruyen a la vez, una muestra por paso
+    with recorder.stage('prediction', residuals.nbytes) as stage:
+        order = int(np.flatnonzero(coefficients.any(axis=0)).max(initial=-1)) + 1
+        history = np.zeros((order + SUBFRAME_FRAMES, signal_count), dtype=np.int64)
+        history[order:] = residuals.T
+        if order:
+            weights = coefficients[:, :order][:, ::-1].T.copy()
+            for position in range(SUBFRAME_FRAMES):
+                history[order + position] += (history[position:position + order] * weights).sum(axis=0) >> shifts
+
+        signals = history[order:].T.reshape(subframes, channels, SUBFRAME_FRAMES)
+        if channels == 2:
+            signals[:, 0], signals[:, 1] = recorrelate(modes, signals[:, 0], signals[:, 1])
+        samples = signals.transpose(0, 2, 1).reshape(-1, channels)[:frames]
+        stage.bytes_out = samples.nbytes
+    return samples, recorder.stages
+
+
+def read_blocks(wave_file, block_frames):
+    """
+    Lee el archivo WAV abierto en bloques de block_frames frames como enteros (frames, canales).
+    """
+    sample_width = wave_file.getsampwidth()
+    channels = wave_file.getnchannels()
+    remaining = wave_file.getnframes()
+    while remaining > 0:
+        frames = wave_file.readframes(min(block_frames, remaining))
+        if not frames:
+            break
+        remaining -= block_frames
+        yield read_samples(frames, sample_width, channels).astype(np.int64)
+
+
+def compress_file(input_file, output_file_path, block_frames=BLOCK_FRAMES, workers=None, progress_callback=None,
+                  recorder=NULL_RECORDER):
+    """
+    Comprime un archivo WAV sin pérdida; los bloques se codifican en paralelo y progress_callback
+    recibe el porcentaje tras escribir cada uno (si lanza una excepción, se borra la salida).
+    recorder recibe las etapas de cada bloque.
+    """
+    with wave.open(input_file, 'rb') as wave_file, partial_output(output_file_path), open(output_file_path, 'wb') as file:
+        metadata = json.dumps({
+            'sample_width': wave_file.getsampwidth(),
+            'channels': wave_file.getnchannels(),
+            'framerate': wave_file.getframerate(),
+        }).encode('utf-8')
+        writer = ContainerWriter(file, 0, metadata, magic=MAGIC, version=VERSION)
+        block_count = -(-wave_file.getnframes() // block_frames)
+        blocks = recorder.iterate('read', read_blocks(wave_file, block_frames), lambda samples: samples.nbytes)
+        tasks = ((samples, recorder.options) for samples in blocks)
+        for done, (record, stages) in enumerate(map_blocks(compress_audio_block, tasks, workers), 1):
+            recorder.merge(stages)
+            with recorder.stage('write', len(record)) as stage:
+                writer.write_block(record)
+                stage.bytes_out = len(record)
+            if progress_callback:
+                progress_callback(100 * done / block_count)
+        writer.close()
+
+    return output_file_path
+
+
+def decompress_file(input_file, output_file_path, workers=None, progress_callback=None, recorder=NULL_RECORDER):
+    """
+    Reconstruye exactamente el archivo WAV original; los bloques se decodifican en paralelo y
+    progress_callback recibe el porcentaje tras escribir cada uno. recorder recibe las etapas
+    de cada bloque.
+    """
+    with open(input_file, 'rb') as file:
+        reader = ContainerReader(file, magic=MAGIC)
+        if reader.version != VERSION:
+            raise ValueError(f"Unsupported lossless audio version {reader.version}.")
+        metadata = json.loads(reader.metadata)
+        channels = metadata['channels']
+
+        with partial_output(output_file_path), wave.open(output_file_path, 'wb') as wave_file:
+            wave_file.setsampwidth(metadata['sample_width'])
+            wave_file.setnchannels(channels)
+            wave_file.setframerate(metadata['framerate'])
+
+            tasks = ((channels, record, recorder.options) for record in recorder.iterate('read', reader.blocks(), len))
+            for done, (samples, stages) in enumerate(map_blocks(decompress_audio_block, tasks, workers), 1):
+                recorder.merge(stages)
+                # La cabecera se completa al cerrar el archivo
+                with recorder.stage('write', samples.nbytes) as stage:
+                    frames = write_samples(samples, metadata['sample_width'])
+                    wave_file.writeframesraw(frames)
+                    stage.bytes_out = len(frames)
+                if progress_callback:
+                    progress_callback(100 * done / len(reader.index))
+
+    return output_file_path
@@ -0,0 +1,512 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Contenedor por bloques compartido por los codificadores de texto e imágenes.
+# Cada bloque se codifica con su propia tabla, así que se puede procesar en paralelo.
+#
+# Formato (versión 2); los campos marcados con v son varints y el resto enteros big endian:
+#   cabecera:  MAGIC (4) | versión (1) | tipo de símbolo (1) | tamaño de metadatos (v) | metadatos
+#   bloques:   tabla | tamaño original (v) | bits (v) | datos
+#   tabla:     longitud máxima (1) | símbolos por longitud (v cada una) | símbolos en orden canónico
+#   índice:    número de bloques (v) | tamaño de cada bloque (v)
+#   final:     tamaño del índice (4)
+# Los símbolos UTF-8 se guardan como diferencias de punto de código dentro de cada longitud.
+#
+# La versión 3 tiene el mismo marco, pero cada bloque es un registro de LZ77.py (coincidencias
+# de LZ77 sobre los bytes UTF-8 codificadas con Huffman) en lugar de una tabla y sus datos.
+# La versión 4 codifica texto con una tabla preentrenada (Diccionario.py) cuyo identificador
+# son los metadatos; cada bloque guarda solo los caracteres que no están en ella:
+#   bloques:   escapados (v) | punto de código de cada uno (v, diferencias) | tamaño original (v) | bits (v) | datos
+# Las versiones 5, 6 y 7 guardan cada bloque tal cual, con zlib o con lzma; las elige
+# Analisis.py cuando Huffman no conviene. En todas, la versión registra el motor usado.
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import itertools
+import os
+import bitarray
+import numpy as np
+from Analisis import choose_engine, compress_raw, decompress_raw
+import LZ77
+from Huffman import MAX_CODE_LENGTH, TableDecoder, build_code_lengths, canonical_codes, code_tables, pack_codes
+from Medicion import NULL_RECORDER, worker_recorder
+
+MAGIC = b'\x89HUF'
+VERSION = 2
+LZ77_VERSION = 3
+DICTIONARY_VERSION = 4
+STORED_VERSION = 5
+ZLIB_VERSION = 6
+LZMA_VERSION = 7
+
+# Versión del contenedor de cada motor de Analisis.py, y al revés
+ENGINE_VERSIONS = {'huffman': VERSION, 'stored': STORED_VERSION, 'zlib': ZLIB_VERSION, 'lzma': LZMA_VERSION}
+VERSION_ENGINES = {version: engine for engine, version in ENGINE_VERSIONS.items()}
+
+# Tipos de símbolo: bytes sueltos (imágenes) o caracteres en UTF-8 (texto)
+SYMBOLS_BYTES = 0
+SYMBOLS_UTF8 = 1
+
+FOOTER_SIZE = 4
+
+
+def is_container(input_file, magic=MAGIC):
+    """
+    Indica si el archivo usa el contenedor por bloques (con el número mágico dado) en lugar
+    del formato original.
+    """
+    with open(input_file, 'rb') as file:
+        return file.read(len(magic)) == magic
+
+
+def utf8_length(lead_byte):
+    """
+    Devuelve el número de bytes de un caracter UTF-8 a partir de su primer byte.
+    """
+    if lead_byte < 0x80:
+        return 1
+    if lead_byte < 0xE0:
+        return 2
+    if lead_byte < 0xF0:
+        return 3
+    return 4
+
+
+def encode_varint(value):
+    """
+    Codifica un entero no negativo en grupos de 7 bits (LEB128).
+    """
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, pos):
+    """
+    Lee un varint en data a partir de pos y devuelve (valor, nueva posición).
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_table(lengths, symbol_kind):
+    """
+    Codifica la tabla canónica de un bloque: cuántos símbolos hay de cada longitud y los
+    símbolos en orden canónico.
+    """
+    max_length = max(lengths.values(), default=0)
+    groups = [[] for _ in range(max_length + 1)]
+    for symbol in lengths:
+        groups[lengths[symbol]].append(ord(symbol) if symbol_kind == SYMBOLS_UTF8 else symbol)
+
+    table = bytearray((max_length,))
+    for group in groups[1:]:
+        table += encode_varint(len(group))
+    for group in groups[1:]:
+        group.sort()
+        if symbol_kind == SYMBOLS_UTF8:
+            previous = 0
+            for code_point in group:
+                table += encode_varint(code_point - previous)
+                previous = code_point
+        else:
+            table += bytes(group)
+    return bytes(table)
+
+
+def decode_table(table, symbol_kind, pos=0):
+    """
+    Reconstruye los códigos canónicos de un bloque, con claves en bytes, en una sola pasada.
+    Devuelve (códigos, posición siguiente a la tabla).
+    """
+    max_length = table[pos]
+    pos += 1
+    counts = []
+    for _ in range(max_length):
+        count, pos = decode_varint(table, pos)
+        counts.append(count)
+
+    codes = {}
+    code = 0
+    for length, count in enumerate(counts, start=1):
+        previous = 0
+        for _ in range(count):
+            if symbol_kind == SYMBOLS_UTF8:
+                delta, pos = decode_varint(table, pos)
+                previous += delta
+                symbol = chr(previous).encode('utf-8')
+            else:
+                symbol = bytes(table[pos:pos + 1])
+                pos += 1
+            codes[symbol] = (code, length)
+            code += 1
+        code <<= 1
+
+    return codes, pos
+
+
+def compress_block(task):
+    """
+    Codifica un bloque (versión del contenedor, tipo de símbolo, datos, longitud máxima, parámetro
+    del motor, opciones de medición) y devuelve su registro en bytes junto con las etapas medidas,
+    que están vacías si no se pidió medirlas. El parámetro es el nivel en la versión 3 y el
+    diccionario en la versión 4.
+    """
+    version, symbol_kind, data, max_code_length, parameter, measure = task
+    recorder = worker_recorder(measure)
+
+    if version == LZ77_VERSION:
+        if symbol_kind == SYMBOLS_UTF8:
+            data = data.encode('utf-8')
+        return LZ77.compress_block(data, parameter, recorder), recorder.stages
+    if version == DICTIONARY_VERSION:
+        return compress_dictionary_block(data, parameter, recorder), recorder.stages
+    if version in (STORED_VERSION, ZLIB_VERSION, LZMA_VERSION):
+        if symbol_kind == SYMBOLS_UTF8:
+            data = data.encode('utf-8')
+        with recorder.stage(VERSION_ENGINES[version], len(data)) as stage:
+            record = compress_raw(VERSION_ENGINES[version], data)
+            stage.bytes_out = len(record)
+        return record, recorder.stages
+
+    if symbol_kind == SYMBOLS_UTF8:
+        original_size = len(data.encode('utf-8'))
+        with recorder.stage('frequency map', original_size):
+            frequencies = Counter(data)
+        with recorder.stage('tree'):
+            lengths = build_code_lengths(frequencies, max_code_length)
+        with recorder.stage('codebook'):
+            codebook = {char: bitarray.bitarray(format(code, f'0{length}b'))
+                        for char, (code, length) in canonical_codes(lengths).items()}
+        with recorder.stage('bit packing', original_size) as stage:
+            encoded_data = bitarray.bitarray()
+            if codebook:
+                encoded_data.encode(codebook, data)
+            payload, nbits = encoded_data.tobytes(), len(encoded_data)
+            stage.bytes_out = len(payload)
+    else:
+        original_size = len(data)
+        with recorder.stage('frequency map', original_size):
+            symbols = np.frombuffer(data, dtype=np.uint8)
+            counts = np.bincount(symbols, minlength=256)
+            frequencies = {int(byte): int(counts[byte]) for byte in np.flatnonzero(counts)}
+        with recorder.stage('tree'):
+            lengths = build_code_lengths(frequencies, max_code_length)
+        with recorder.stage('codebook'):
+            code_values, code_lengths = code_tables(canonical_codes(lengths))
+        with recorder.stage('bit packing', original_size) as stage:
+            payload, nbits = pack_codes(symbols, code_values, code_lengths)
+            stage.bytes_out = len(payload)
+
+    record = b''.join((encode_table(lengths, symbol_kind), encode_varint(original_size), encode_varint(nbits), payload))
+    return record, recorder.stages
+
+
+def compress_dictionary_block(data, dictionary, recorder=NULL_RECORDER):
+    """
+    Codifica un bloque de texto con la tabla del diccionario, en una sola pasada y sin contar
+    frecuencias, y devuelve su registro de la versión 4.
+    """
+    original_size = len(data.encode('utf-8'))
+    with recorder.stage('codebook', original_size):
+        escaped = sorted(set(data).difference(dictionary.lengths))
+        codebook = dictionary.codebook(escaped)
+    with recorder.stage('bit packing', original_size) as stage:
+        encoded_data = bitarray.bitarray()
+        if data:
+            encoded_data.encode(codebook, data)
+        payload = encoded_data.tobytes()
+        stage.bytes_out = len(payload)
+
+    header = bytearray(encode_varint(len(escaped)))
+    previous = 0
+    for char in escaped:
+        header += encode_varint(ord(char) - previous)
+        previous = ord(char)
+    return b''.join((header, encode_varint(original_size), encode_varint(len(encoded_data)), payload))
+
+
+def decompress_dictionary_block(record, dictionary, recorder=NULL_RECORDER):
+    """
+    Decodifica un registro de la versión 4 con la tabla del diccionario.
+    """
+    record = memoryview(record)
+    with recorder.stage('codebook'):
+        count, pos = decode_varint(record, 0)
+        escaped = []
+        previous = 0
+        for _ in range(count):
+            delta, pos = decode_varint(record, pos)
+            previous += delta
+            escaped.append(chr(previous))
+        original_size, pos = decode_varint(record, pos)
+        nbits, pos = decode_varint(record, pos)
+        decoder = dictionary.decoder(escaped)
+
+    with recorder.stage('bit unpacking', len(record) - pos) as stage:
+        decoded_data = decoder.decode(record[pos:], nbits)
+        stage.bytes_out = len(decoded_data)
+    if len(decoded_data) != original_size:
+        raise ValueError("Corrupted block: decoded size does not match the stored size.")
+    return bytes(decoded_data)
+
+
+def decompress_block(task):
+    """
+    Decodifica el registro de un bloque (versión, tipo de símbolo, registro, diccionario o None,
+    opciones de medición) y devuelve sus bytes originales junto con las etapas medidas.
+    """
+    version, symbol_kind, record, dictionary, measure = task
+    recorder = worker_recorder(measure)
+    if version == LZ77_VERSION:
+        return LZ77.decompress_block(record, recorder), recorder.stages
+    if version == DICTIONARY_VERSION:
+        return decompress_dictionary_block(record, dictionary, recorder), recorder.stages
+    if version in (STORED_VERSION, ZLIB_VERSION, LZMA_VERSION):
+        with recorder.stage(VERSION_ENGINES[version], len(record)) as stage:
+            data = decompress_raw(VERSION_ENGINES[version], record)
+            stage.bytes_out = len(data)
+        return data, recorder.stages
+    record = memoryview(record)
+
+    with recorder.stage('codebook'):
+        codes, pos = decode_table(record, symbol_kind)
+        original_size, pos = decode_varint(record, pos)
+        nbits, pos = decode_varint(record, pos)
+        decoder = TableDecoder(codes)
+
+    with recorder.stage('bit unpacking', len(record) - pos) as stage:
+        decoded_data = decoder.decode(record[pos:], nbits)
+        stage.bytes_out = len(decoded_data)
+    if len(decoded_data) != original_size:
+        raise ValueError("Corrupted block: decoded size does not match the stored size.")
+    return bytes(decoded_data), recorder.stages
+
+
+def map_blocks(function, tasks, workers=None):
+    """
+    Aplica function a cada tarea en un ProcessPoolExecutor y entrega los resultados en orden.
+    Se mantienen a lo sumo dos tareas pendientes por proceso para acotar la memoria.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = iter(tasks)
+    first = next(tasks, None)
+    second = next(tasks, None)
+
+    if first is None:
+        return
+    if workers == 1 or second is None:
+        # Sin paralelismo posible no vale la pena arrancar procesos
+        yield function(first)
+        if second is not None:
+            yield function(second)
+            yield from map(function, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque([executor.submit(function, first), executor.submit(function, second)])
+        for task in tasks:
+            pending.append(executor.submit(function, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ContainerWriter:
+    """
+    Escribe el contenedor por bloques sobre un archivo abierto en modo binario. Otros formatos
+    (como el audio sin pérdida) reutilizan el mismo marco con su propio número mágico y versión.
+    """
+
+    def __init__(self, file, symbol_kind, metadata=b'', magic=MAGIC, version=VERSION):
+        self.file = file
+        self.sizes = []
+        file.write(magic)
+        file.write(bytes((version, symbol_kind)))
+        file.write(encode_varint(len(metadata)))
+        file.write(metadata)
+
+    def write_block(self, record):
+        self.sizes.append(len(record))
+        self.file.write(record)
+
+    def close(self):
+        index = bytearray(encode_varint(len(self.sizes)))
+        for size in self.sizes:
+            index += encode_varint(size)
+        self.file.write(index)
+        self.file.write(len(index).to_bytes(FOOTER_SIZE, byteorder='big'))
+
+
+class ContainerReader:
+    """
+    Lee la cabecera y el índice del contenedor; los bloques se leen bajo demanda. Con otro
+    número mágico se acepta cualquier versión y es el formato que lo usa quien la valida.
+    """
+
+    def __init__(self, file, magic=MAGIC):
+        self.file = file
+        header = file.read(len(magic) + 2)
+        if header[:len(magic)] != magic:
+            raise ValueError("The file is not a block container.")
+
+        self.version = header[len(magic)]
+        self.symbol_kind = header[len(magic) + 1]
+        if magic == MAGIC and not VERSION <= self.version <= LZMA_VERSION:
+            raise ValueError(f"Unsupported container version {self.version}.")
+
+        # El tamaño de los metadatos es un varint de a lo sumo unos pocos bytes
+        data_start = file.tell()
+        prefix = file.read(10)
+        metadata_size, pos = decode_varint(prefix, 0)
+        file.seek(data_start + pos)
+        self.metadata = file.read(metadata_size)
+        self.index = self.read_index(file.tell())
+
+    def read_index(self, data_start):
+        # Los desplazamientos se obtienen acumulando los tamaños desde el primer bloque
+        self.file.seek(-FOOTER_SIZE, os.SEEK_END)
+        index_size = int.from_bytes(self.file.read(FOOTER_SIZE), byteorder='big')
+        self.file.seek(-FOOTER_SIZE - index_size, os.SEEK_END)
+        index = self.file.read(index_size)
+
+        block_count, pos = decode_varint(index, 0)
+        entries = []
+        offset = data_start
+        for _ in range(block_count):
+            size, pos = decode_varint(index, pos)
+            entries.append((offset, size))
+            offset += size
+        return entries
+
+    def read_block(self, number):
+        offset, size = self.index[number]
+        self.file.seek(offset)
+        return self.file.read(size)
+
+    def blocks(self):
+        for number in range(len(self.index)):
+            yield self.read_block(number)
+
+
+@contextmanager
+def partial_output(output_file_path):
+    """
+    Borra el archivo de salida si el bloque with termina con una excepción, por ejemplo al
+    cancelar desde el callback de progreso, para no dejar un resultado a medias.
+    """
+    try:
+        yield
+    except BaseException:
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+        raise
+
+
+def compress_blocks(chunks, output_file_path, symbol_kind, metadata=b'', max_code_length=MAX_CODE_LENGTH, workers=None,
+                    progress_callback=None, total_size=None, recorder=NULL_RECORDER, level=None, dictionary=None,
+                    engine='huffman', target='balanced'):
+    """
+    Codifica los bloques en paralelo y los escribe en el contenedor de salida. Con level (de 1 a 9)
+    los bloques se codifican con LZ77 y Huffman en la versión 3 del contenedor y con dictionary
+    (un Diccionario.HuffmanDictionary) con su tabla en la versión 4. Si no, engine es uno de los
+    motores de Analisis.py o 'auto', que lo elige según target con una muestra del primer bloque
+    (el motor queda registrado en la versión del contenedor). Si se indican
+    progress_callback y total_size (el tamaño en bytes de la entrada), se informa el
+    porcentaje al escribir cada bloque. Si el callback lanza una excepción, por ejemplo para
+    cancelar, se borra el archivo incompleto. Las etapas de cada bloque se miden en su proceso
+    y se añaden a recorder junto con la lectura y la escritura.
+    """
+    # Tamaño en bytes de los bloques enviados y aún no escritos, en orden
+    sizes = deque()
+
+    def chunk_size(chunk):
+        return len(chunk.encode('utf-8')) if symbol_kind == SYMBOLS_UTF8 else len(chunk)
+
+    chunks = iter(recorder.iterate('read', chunks, chunk_size))
+    parameter = None
+    if level is not None:
+        version, parameter = LZ77_VERSION, level
+    elif dictionary is not None:
+        version, parameter = DICTIONARY_VERSION, dictionary
+    elif engine == 'auto':
+        # La versión va en la cabecera, así que se decide antes de escribir con el primer bloque
+        first = next(chunks, None)
+        if first is not None:
+            chunks = itertools.chain((first,), chunks)
+        with recorder.stage('analysis'):
+            if symbol_kind == SYMBOLS_UTF8 and first is not None:
+                first = first.encode('utf-8')
+            version = ENGINE_VERSIONS[choose_engine(first or b'', target, symbol_kind == SYMBOLS_UTF8)]
+    else:
+        version = ENGINE_VERSIONS[engine]
+
+    def generate_tasks():
+        for chunk in chunks:
+            if progress_callback and total_size:
+                sizes.append(chunk_size(chunk))
+            yield version, symbol_kind, chunk, max_code_length, parameter, recorder.options
+
+    done = 0
+    with partial_output(output_file_path), open(output_file_path, 'wb') as file:
+        writer = ContainerWriter(file, symbol_kind, metadata, version=version)
+        for record, stages in map_blocks(compress_block, generate_tasks(), workers):
+            recorder.merge(stages)
+            with recorder.stage('write', len(record)) as stage:
+                writer.write_block(record)
+                stage.bytes_out = len(record)
+            if progress_callback and total_size:
+                done += sizes.popleft()
+                progress_callback(min(100, 100 * done / total_size))
+        writer.close()
+
+
+def read_metadata(input_file):
+    """
+    Devuelve los metadatos de la cabecera del contenedor sin decodificar ningún bloque.
+    """
+    with open(input_file, 'rb') as file:
+        return ContainerReader(file).metadata
+
+
+def decompress_blocks(input_file, workers=None, numbers=None, progress_callback=None, recorder=NULL_RECORDER,
+                      dictionary=None):
+    """
+    Devuelve los metadatos del contenedor y un generador con los bytes de cada bloque, en orden.
+    Si se indican numbers, solo se leen y decodifican esos bloques. progress_callback recibe el
+    porcentaje de bloques entregados y recorder las etapas de lectura y decodificación. Los
+    archivos de la versión 4 necesitan el diccionario con el que se comprimieron.
+    """
+    file = open(input_file, 'rb')
+    reader = ContainerReader(file)
+    if reader.version == DICTIONARY_VERSION and (dictionary is None or dictionary.id != reader.metadata):
+        file.close()
+        raise ValueError(f"The file was compressed with the dictionary {reader.metadata.hex()}; "
+                         f"pass that dictionary to decompress it.")
+    if numbers is None:
+        numbers = range(len(reader.index))
+
+    def generate():
+        with file:
+            records = recorder.iterate('read', map(reader.read_block, numbers), len)
+            tasks = ((reader.version, reader.symbol_kind, record, dictionary, recorder.options) for record in records)
+            for done, (block, stages) in enumerate(map_blocks(decompress_block, tasks, workers), 1):
+                recorder.merge(stages)
+                yield block
+                if progress_callback:
+                    progress_callback(100 * done / len(numbers))
+
+    return reader.metadata, generate()
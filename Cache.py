@@ -0,0 +1,266 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Caché en disco de resultados: si un archivo con el mismo contenido ya se comprimió (o
+# descomprimió) con el mismo códec y las mismas opciones, se reutiliza el resultado en lugar
+# de volver a codificarlo.
+#
+# Cada entrada es una carpeta con el nombre de la clave que contiene el archivo resultante:
+#   carpeta de la caché/ab/abcdef.../nombre_del_resultado
+# Las entradas se publican renombrando una carpeta temporal, que es atómico, así que varios
+# procesos pueden compartir la caché sin bloqueos: si dos guardan la misma clave gana el
+# primero y si una entrada desaparece mientras se lee, se trata como un fallo de caché.
+# La fecha de modificación de la carpeta marca el último uso para el desalojo LRU. Cada proceso
+# mide la carpeta y después lleva la cuenta de lo que guarda; vuelve a recorrerla cuando esa
+# cuenta pasa del tamaño máximo o cuando ha guardado una fracción de él desde la última vez,
+# porque otros procesos también llenan la carpeta. Así, con varios procesos la caché se pasa
+# del máximo a lo sumo en esa fracción por proceso.
+from functools import lru_cache, wraps
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+
+# Cambia cuando cambia el formato de algún códec, para no reutilizar resultados viejos
+CACHE_VERSION = 1
+
+# Tamaño máximo por defecto de la caché, en bytes
+MAX_SIZE = 1 << 30
+
+# Opciones que no cambian el resultado y no forman parte de la clave
+IGNORED_OPTIONS = ('workers', 'recorder', 'show_preview')
+
+HASH_BUFFER_SIZE = 1 << 20
+
+# Las carpetas temporales más antiguas que esto quedaron de un proceso que terminó a la mitad
+STALE_SECONDS = 3600
+
+# Cada proceso vuelve a medir la carpeta tras guardar max_size / RESCAN_SHARE bytes
+RESCAN_SHARE = 8
+
+# Tamaño total de cada carpeta de caché según este proceso y bytes que ha guardado desde que
+# la midió; las copias de ResultCache que reciben los procesos de trabajo comparten la cuenta
+_folder_sizes = {}
+_unmeasured_sizes = {}
+
+
+def cached_by_identity(maxsize):
+    """
+    Decorador para funciones de una ruta: recuerda el resultado dentro del proceso según la
+    identidad del archivo (ruta real, tamaño, fecha de modificación e inodo), así que si el
+    archivo cambia se vuelve a calcular.
+    """
+    def decorator(function):
+        @lru_cache(maxsize=maxsize)
+        def cached(path, size, modified, inode):
+            return function(path)
+
+        @wraps(function)
+        def wrapper(path):
+            stat_result = os.stat(path)
+            return cached(os.path.realpath(path), stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+
+@cached_by_identity(maxsize=1024)
+def file_digest(input_file):
+    """
+    Devuelve el hash BLAKE2 del contenido del archivo.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(input_file, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché de resultados en la carpeta dada, acotada a max_size bytes. Las entradas son copias de
+    solo lectura, para que editar un resultado no altere la caché. Con link los resultados se
+    enlazan (enlace duro) en lugar de copiarse cuando la carpeta de salida está en el mismo
+    disco; comparten el archivo con la entrada, así que esos resultados son de solo lectura.
+    """
+
+    def __init__(self, folder, max_size=MAX_SIZE, link=False):
+        self.folder = folder
+        self.max_size = max_size
+        self.link = link
+
+    def key(self, mode, entry, options, input_file):
+        """
+        Devuelve la clave de un trabajo: el hash del contenido junto con la operación, el códec
+        y sus opciones. El nombre del archivo también cuenta porque de él sale el del resultado.
+        """
+        module_name, class_name, _ = entry
+        description = json.dumps({
+            'version': CACHE_VERSION,
+            'mode': mode,
+            'codec': f"{module_name}.{class_name}",
+            'options': {name: value for name, value in options.items() if name not in IGNORED_OPTIONS},
+            'name': os.path.basename(input_file),
+            'content': file_digest(input_file),
+        }, sort_keys=True, default=repr)
+        return hashlib.blake2b(description.encode('utf-8'), digest_size=20).hexdigest()
+
+    def size(self):
+        """
+        Devuelve el tamaño total de la caché según este proceso. La primera vez se recorre la
+        carpeta y se desaloja lo que sobre, por si max_size es menor que la última vez.
+        """
+        folder = os.path.abspath(self.folder)
+        if folder not in _folder_sizes:
+            self.evict()
+        return _folder_sizes[folder]
+
+    def entry_folder(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def lookup(self, key, output_folder):
+        """
+        Si la clave está en la caché, coloca el resultado en la carpeta de salida y devuelve su
+        ruta; si no, devuelve None.
+        """
+        folder = self.entry_folder(key)
+        try:
+            name, = os.listdir(folder)
+            output_file = os.path.join(output_folder, name)
+            self.place(os.path.join(folder, name), output_file)
+            # Marca el último uso para el desalojo
+            os.utime(folder)
+        except (OSError, ValueError):
+            # No existe, se está desalojando o quedó incompleta
+            return None
+        return output_file
+
+    def place(self, cached_file, output_file):
+        # Se escribe con otro nombre y se renombra, para no dejar nunca un resultado a medias
+        temporary_file = f"{output_file}.{os.getpid()}.tmp"
+        try:
+            if self.link:
+                try:
+                    os.link(cached_file, temporary_file)
+                except OSError:
+                    # Otro disco o un sistema de archivos sin enlaces duros
+                    shutil.copyfile(cached_file, temporary_file)
+            else:
+                shutil.copyfile(cached_file, temporary_file)
+            os.replace(temporary_file, output_file)
+        except BaseException:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            raise
+
+    def store(self, key, output_file):
+        """
+        Guarda el resultado bajo la clave. Los errores se ignoran: la caché nunca hace fallar
+        un trabajo.
+        """
+        total = self.size()
+        folder = self.entry_folder(key)
+        try:
+            os.makedirs(os.path.dirname(folder), exist_ok=True)
+            temporary_folder = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(folder))
+        except OSError:
+            return
+
+        try:
+            # Siempre se copia: cambiar los permisos de un enlace cambiaría los del resultado
+            cached_file = os.path.join(temporary_folder, os.path.basename(output_file))
+            shutil.copyfile(output_file, cached_file)
+            os.chmod(cached_file, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+            size = os.path.getsize(cached_file)
+            # Si otro proceso ya publicó la misma clave, el renombrado falla y se conserva la suya
+            os.rename(temporary_folder, folder)
+        except OSError:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+            return
+
+        cache_folder = os.path.abspath(self.folder)
+        _folder_sizes[cache_folder] = total + size
+        _unmeasured_sizes[cache_folder] = _unmeasured_sizes.get(cache_folder, 0) + size
+        if _folder_sizes[cache_folder] > self.max_size or \
+                _unmeasured_sizes[cache_folder] > self.max_size // RESCAN_SHARE:
+            self.evict()
+
+    def entries(self):
+        """
+        Devuelve [(último uso, tamaño, carpeta)] de todas las entradas publicadas y borra las
+        carpetas temporales abandonadas.
+        """
+        entries = []
+        for prefix in os.scandir(self.folder):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.startswith('.tmp-'):
+                    try:
+                        if entry.stat().st_mtime < time.time() - STALE_SECONDS:
+                            shutil.rmtree(entry.path, onerror=make_writable)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except OSError:
+                    # Otro proceso la acaba de desalojar
+                    continue
+        return entries
+
+    def evict(self):
+        """
+        Borra las entradas usadas hace más tiempo hasta que la caché cabe en max_size y
+        actualiza el tamaño que lleva este proceso.
+        """
+        _unmeasured_sizes[os.path.abspath(self.folder)] = 0
+        if not os.path.isdir(self.folder):
+            _folder_sizes[os.path.abspath(self.folder)] = 0
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, folder in entries:
+            if total <= self.max_size:
+                break
+            # Se renombra antes de borrar para que nadie la lea a medias
+            doomed = os.path.join(os.path.dirname(folder), f".tmp-evicted-{os.path.basename(folder)}-{os.getpid()}")
+            try:
+                os.rename(folder, doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, onerror=make_writable)
+            total -= size
+        _folder_sizes[os.path.abspath(self.folder)] = total
+
+    def run(self, mode, entry, options, input_file, output_folder, function, progress_callback=None):
+        """
+        Devuelve el resultado guardado del trabajo o, si no lo hay, ejecuta function (que
+        devuelve la ruta del resultado) y lo guarda.
+        """
+        # La primera vez en el proceso también aplica un max_size menor, aunque todo sean aciertos
+        self.size()
+        key = self.key(mode, entry, options, input_file)
+        output_file = self.lookup(key, output_folder)
+        if output_file is not None:
+            if progress_callback:
+                progress_callback(100)
+            return output_file
+
+        output_file = function()
+        self.store(key, output_file)
+        return output_file
+
+
+def make_writable(function, path, _):
+    # En Windows no se pueden borrar archivos de solo lectura
+    os.chmod(path, stat.S_IWRITE)
+    function(path)
@@ -7,26 +7,76 @@
 # Así como la importación de los distintos métodos de compresión y descompresión
 import tkinter as tk
 from tkinter import filedialog, messagebox
+from concurrent.futures import ThreadPoolExecutor
 import os
-from Texto import TextHuffmanEncoder
-from Imagenes import ImageHuffmanEncoder
-from Audio import AudioCompressor
-from Video import VideoCompressor
+import queue
+import threading
+from Medicion import StageRecorder
+from Registro import COMPRESSORS, DECOMPRESSORS, compress_path, decompress_path, find_entry
+
+
+# Trabajos que se ejecutan a la vez; cada codificador reparte además sus bloques entre procesos
+JOB_WORKERS = 2
+
+# Cada cuántos milisegundos revisa la interfaz los mensajes de los trabajos
+POLL_INTERVAL = 100
+
+
+class JobCancelled(Exception):
+    """
+    Se lanza desde el callback de progreso para detener un trabajo cancelado.
+    """
+
+
+class Job:
+    """
+    Un archivo en la cola: su estado, progreso y la señal para cancelarlo. Si se pidió, también
+    el registro de sus etapas y el archivo donde se guarda su perfil de cProfile.
+    """
+
+    def __init__(self, mode, input_file, output_folder, record_stages=False, profile=False):
+        self.mode = mode
+        self.input_file = input_file
+        self.output_folder = output_folder
+        self.status = "Queued"
+        self.progress = 0
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.recorder = StageRecorder() if record_stages else None
+        self.profile_file = os.path.join(output_folder, f"{os.path.basename(input_file)}.prof") if profile else None
+
+    def describe(self):
+        description = f"{self.mode.capitalize()} {os.path.basename(self.input_file)}: {self.status}"
+        if self.status == "Running":
+            description += f" {self.progress:.0f}%"
+        elif self.status == "Done":
+            description += f" -> {self.result}"
+        return description
 
 
 # Clase de la interfaz gráfica, donde el usuario interactuara para comprimir y descomprimir los archivos
 class HuffmanGUI:
     def __init__(self, master):
-        # Inicialización de la interfaz gráfica
+        # Inicialización de la interfaz gráfica; los trabajos corren en hilos aparte y avisan
+        # de su avance por una cola que se revisa con after(), sin bloquear la ventana
         self.master = master
         self.master.title("COMPRESSOR")
         self.selected_folder = tk.StringVar()
+        self.record_stages = tk.BooleanVar()
+        self.profile = tk.BooleanVar()
+        self.preview = tk.BooleanVar()
+        self.jobs = []
+        self.events = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
         self.create_widgets()
+        self.master.protocol("WM_DELETE_WINDOW", self.close)
+        self.master.after(POLL_INTERVAL, self.poll_events)
 
     def create_widgets(self):
         # Configuración de la ventana principal
         app_width = 450
-        app_height = 250
+        app_height = 570
         screen_width = self.master.winfo_screenwidth()
         screen_height = self.master.winfo_screenheight()
         x_position = (screen_width - app_width) // 2
@@ -39,12 +89,24 @@ class HuffmanGUI:
         select_folder_button = tk.Button(self.master, text="Select Folder", command=self.select_folder)
         compress_button = tk.Button(self.master, text="Compress", command=self.compress)
         decompress_button = tk.Button(self.master, text="Decompress", command=self.decompress)
+        self.job_list = tk.Listbox(self.master, width=70, height=8, selectmode=tk.EXTENDED)
+        cancel_button = tk.Button(self.master, text="Cancel Selected", command=self.cancel)
+        stages_check = tk.Checkbutton(self.master, text="Record stage timings", variable=self.record_stages)
+        profile_check = tk.Checkbutton(self.master, text="Save cProfile dump to the output folder", variable=self.profile)
+        preview_check = tk.Checkbutton(self.master, text="Preview decompressed images", variable=self.preview)
+        stages_button = tk.Button(self.master, text="Show Stages", command=self.show_stages)
 
         output_folder_label.pack(pady=10)
         output_folder_entry.pack(pady=10)
         select_folder_button.pack(pady=10)
         compress_button.pack(pady=10)
         decompress_button.pack(pady=10)
+        stages_check.pack()
+        profile_check.pack()
+        preview_check.pack()
+        self.job_list.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+        cancel_button.pack(pady=5)
+        stages_button.pack(pady=5)
 
     def select_folder(self):
         # Método para seleccionar una carpeta y actualizar la variable asociada
@@ -53,66 +115,145 @@ class HuffmanGUI:
             self.selected_folder.set(folder)
 
     def compress(self):
-        # Método para la compresión de archivos
+        # Método para la compresión de archivos; se pueden elegir varios a la vez
         file_types = [("Text and Image Files", "*.txt;*.bmp;*.wav;*.mp4")]
-        input_file_path = filedialog.asksaveasfilename(title="Select a file to compress", filetypes=file_types, defaultextension=".txt")
+        input_files = filedialog.askopenfilenames(title="Select files to compress", filetypes=file_types)
         output_folder = self.selected_folder.get()
 
-        if input_file_path and output_folder:
-            # Selecciona el codificador adecuado según la extensión del archivo de entrada
-            if input_file_path.lower().endswith('.txt'):
-                encoder = TextHuffmanEncoder()
-                compressed_file_extension = '.txt.bin'
-            elif input_file_path.lower().endswith('.bmp'):
-                encoder = ImageHuffmanEncoder()
-                compressed_file_extension = '.bmp.bin'
-            elif input_file_path.lower().endswith('.wav'):
-                encoder = AudioCompressor()
-                compressed_file_extension = '.wav'
-            elif input_file_path.lower().endswith('.mp4'):
-                encoder = VideoCompressor()
-                compressed_file_extension = '.mp4'
-            else:
-                # Muestra un mensaje de advertencia si el tipo de archivo no es compatible
+        if input_files and output_folder:
+            # El codificador se elige según la extensión de cada archivo de entrada
+            unsupported = [path for path in input_files if find_entry(COMPRESSORS, path) is None]
+            if unsupported:
+                # Muestra un mensaje de advertencia si algún tipo de archivo no es compatible
                 messagebox.showwarning("Unsupported File Type", "Unsupported file type. Please select a .txt, .bmp, .wav, or .mp4 file.")
-                return
 
-            # Realiza la compresión y muestra un mensaje informativo
-            output_file = encoder.compress_file(input_file_path, output_folder)
-            compressed_file_path = os.path.splitext(output_file)[0] + compressed_file_extension
-            os.rename(output_file, compressed_file_path)
-            messagebox.showinfo("Compression Complete", f"File compressed and saved at:\n{compressed_file_path}")
+            # Los archivos compatibles se encolan y la ventana sigue respondiendo
+            for path in input_files:
+                if path not in unsupported:
+                    self.submit(Job("compress", path, output_folder, self.record_stages.get(), self.profile.get()))
 
     def decompress(self):
-        # Método para la descompresión de archivos
+        # Método para la descompresión de archivos; se pueden elegir varios a la vez
         file_types = [("MP4, Wave and Binary Files", "*.wav;*.bin;*.mp4")]
-        input_file = filedialog.askopenfilename(title="Select a file to decompress", filetypes=file_types)
+        input_files = filedialog.askopenfilenames(title="Select files to decompress", filetypes=file_types)
         output_folder = self.selected_folder.get()
 
-        if input_file and output_folder:
-            # Selecciona el decodificador adecuado según la extensión del archivo de entrada
-            if input_file.lower().endswith('.txt.bin'):
-                encoder = TextHuffmanEncoder()
-                original_file_extension = '.txt'
-            elif input_file.lower().endswith('.bmp.bin'):
-                encoder = ImageHuffmanEncoder()
-                original_file_extension = '.bmp'
-            elif input_file.lower().endswith('.wav'):
-                encoder = AudioCompressor()
-                original_file_extension = '.wav'
-            elif input_file.lower().endswith('.mp4'):
-                encoder = VideoCompressor()
-                original_file_extension = '.mp4'
-            else:
-                # Muestra un mensaje de advertencia si el tipo de archivo no es compatible
+        if input_files and output_folder:
+            # El decodificador se elige según la extensión de cada archivo de entrada
+            unsupported = [path for path in input_files if find_entry(DECOMPRESSORS, path) is None]
+            if unsupported:
+                # Muestra un mensaje de advertencia si algún tipo de archivo no es compatible
                 messagebox.showwarning("Unsupported File Type", "Unsupported file type. Please select a .bin or .wav file.")
-                return
 
-            # Realiza la descompresión y muestra un mensaje informativo
-            output_file = encoder.decompress_file(input_file, output_folder)
-            decompressed_file_path = output_file + original_file_extension
-            os.rename(output_file, decompressed_file_path)
-            messagebox.showinfo("Decompression Complete", f"File decompressed and saved at:\n{decompressed_file_path}")
+            for path in input_files:
+                if path not in unsupported:
+                    self.submit(Job("decompress", path, output_folder, self.record_stages.get(), self.profile.get()))
+
+    def submit(self, job):
+        # Añade el trabajo a la lista y lo envía a los hilos de trabajo
+        self.jobs.append(job)
+        self.job_list.insert(tk.END, job.describe())
+        job.future = self.executor.submit(self.run_job, job)
+
+    def run_job(self, job):
+        # Se ejecuta en un hilo de trabajo: nunca toca los widgets, solo envía mensajes por la cola
+        def report(percent):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            self.events.put((job, "Running", percent))
+
+        action = compress_path if job.mode == "compress" else decompress_path
+        try:
+            report(0)
+            result = action(job.input_file, job.output_folder, progress_callback=report,
+                            profile_file=job.profile_file, recorder=job.recorder)
+        except JobCancelled:
+            self.events.put((job, "Cancelled", None))
+        except Exception as error:
+            self.events.put((job, f"Failed ({error})", None))
+        else:
+            self.events.put((job, "Done", result))
+
+    def poll_events(self):
+        # Aplica los mensajes pendientes de los trabajos y vuelve a programarse; se reprograma
+        # aunque algo falle para que los demás trabajos sigan informando
+        try:
+            while True:
+                try:
+                    job, status, value = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                # Un trabajo cancelado ignora los avisos de progreso que aún estuvieran en la cola
+                if job.status == "Cancelled":
+                    continue
+                job.status = status
+                if status == "Running":
+                    job.progress = value
+                elif status == "Done":
+                    job.result = value
+                self.refresh(job)
+                if status == "Done" and self.preview.get() and job.mode == "decompress" and value.lower().endswith('.bmp'):
+                    self.show_preview(value)
+        finally:
+            self.master.after(POLL_INTERVAL, self.poll_events)
+
+    def refresh(self, job):
+        # Actualiza la línea del trabajo en la lista
+        index = self.jobs.index(job)
+        self.job_list.delete(index)
+        self.job_list.insert(index, job.describe())
+
+    def cancel(self):
+        # Cancela los trabajos seleccionados: los que esperan no llegan a empezar y los que
+        # corren se detienen en el siguiente bloque
+        for index in self.job_list.curselection():
+            job = self.jobs[index]
+            if job.status in ("Queued", "Running"):
+                job.cancel_event.set()
+                if job.future.cancel():
+                    job.status = "Cancelled"
+                    self.refresh(job)
+
+    def show_stages(self):
+        # Muestra el tiempo, los bytes y la memoria de cada etapa de los trabajos seleccionados
+        for index in self.job_list.curselection():
+            job = self.jobs[index]
+            if job.recorder is None:
+                messagebox.showinfo("Stages", f"Stage timings were not recorded for {os.path.basename(job.input_file)}.")
+                continue
+
+            window = tk.Toplevel(self.master)
+            window.title(f"Stages: {os.path.basename(job.input_file)}")
+            text = tk.Text(window, width=80, height=15, font="TkFixedFont")
+            text.insert(tk.END, job.recorder.report())
+            text.configure(state=tk.DISABLED)
+            text.pack(padx=10, pady=10)
+
+    def show_preview(self, image_file):
+        # Muestra la imagen descomprimida en una ventana aparte sin bloquear la principal; si
+        # no se puede abrir (por ejemplo, los píxeles sin cabecera de los archivos sin metadatos)
+        # solo se avisa
+        from PIL import Image, ImageTk
+
+        try:
+            with Image.open(image_file) as img:
+                img.thumbnail((800, 600))
+                photo = ImageTk.PhotoImage(img)
+        except Exception as error:
+            messagebox.showwarning("Preview", f"Cannot preview {os.path.basename(image_file)}: {error}")
+            return
+        window = tk.Toplevel(self.master)
+        window.title(os.path.basename(image_file))
+        label = tk.Label(window, image=photo)
+        label.image = photo  # Tk no guarda la referencia a la imagen
+        label.pack()
+
+    def close(self):
+        # Cancela los trabajos pendientes y cierra la ventana
+        for job in self.jobs:
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
 
 
 if __name__ == "__main__":
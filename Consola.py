@@ -0,0 +1,203 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Interfaz de línea de comandos: comprime o descomprime archivos y árboles de directorios
+# completos sin abrir la interfaz gráfica, repartiendo los archivos entre varios procesos.
+#
+#   python Consola.py compress carpeta_o_archivo [...] -o salida [-j procesos]
+#   python Consola.py decompress carpeta_o_archivo [...] -o salida [-j procesos]
+#
+# Cada directorio se reproduce dentro de la salida con su propio nombre, como hacen tar y zip,
+# para que dos directorios con archivos del mismo nombre no se pisen.
+# Con --stages se muestra cuánto tiempo tomó cada etapa de los codificadores y con
+# --profile carpeta se guarda un perfil de cProfile por archivo. Con --cache carpeta los
+# archivos que no cambiaron toman el resultado de la caché en lugar de volver a codificarse.
+# Con --level 1 a 9 los textos se comprimen con LZ77 y Huffman en lugar de solo Huffman y con
+# --dictionary tabla.dict, con una tabla preentrenada (la misma se necesita al descomprimir).
+# Con --engine auto cada texto o imagen se analiza antes para elegir entre Huffman, zlib, lzma
+# o guardarlo tal cual, según --target.
+import argparse
+import os
+import sys
+import time
+from Analisis import ENGINES, TARGETS
+from Cache import ResultCache
+from Medicion import StageRecorder
+from Registro import COMPRESSORS, DECOMPRESSORS, compress_path, decompress_path, find_entry
+
+
+def find_files(paths, table):
+    """
+    Recorre las rutas dadas (archivos o directorios) y genera (archivo, subcarpeta relativa)
+    para cada archivo cuya extensión aparece en la tabla. La subcarpeta de un archivo dentro
+    de un directorio empieza con el nombre de ese directorio.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            root = os.path.basename(os.path.normpath(path))
+            if root in ('', os.curdir, os.pardir):
+                root = os.curdir
+            for folder, subfolders, names in os.walk(path):
+                subfolders.sort()
+                relative = os.path.normpath(os.path.join(root, os.path.relpath(folder, path)))
+                for name in sorted(names):
+                    if find_entry(table, name) is not None:
+                        yield os.path.join(folder, name), relative
+        elif find_entry(table, path) is not None:
+            yield path, os.curdir
+
+
+def split_duplicates(files):
+    """
+    Separa los (archivo, subcarpeta relativa) cuyo resultado iría al mismo lugar que el de uno
+    anterior, es decir, con la misma subcarpeta y el mismo nombre. Devuelve (los demás,
+    [(archivo repetido, archivo anterior)]).
+    """
+    unique, duplicates, seen = [], [], {}
+    for input_file, relative in files:
+        target = os.path.normcase(os.path.normpath(os.path.join(relative, os.path.basename(input_file))))
+        if target in seen:
+            duplicates.append((input_file, seen[target]))
+        else:
+            seen[target] = input_file
+            unique.append((input_file, relative))
+    return unique, duplicates
+
+
+def process_file(task):
+    """
+    Comprime o descomprime un archivo (modo, archivo, carpeta de salida, opciones, medición) y
+    devuelve (archivo, resultado, bytes leídos, bytes escritos, error, etapas). La medición es
+    (medir etapas, medir memoria, archivo de perfil o None). Los errores se devuelven en lugar
+    de lanzarse para que un archivo dañado no detenga el lote.
+    """
+    mode, input_file, output_folder, options, (record_stages, trace_memory, profile_file) = task
+    recorder = StageRecorder(trace_memory) if record_stages else None
+    try:
+        os.makedirs(output_folder, exist_ok=True)
+        if profile_file:
+            os.makedirs(os.path.dirname(profile_file), exist_ok=True)
+        action = compress_path if mode == 'compress' else decompress_path
+        output_file = action(input_file, output_folder, profile_file=profile_file, recorder=recorder, **options)
+        stages = recorder.stages if recorder else []
+        return input_file, output_file, os.path.getsize(input_file), os.path.getsize(output_file), None, stages
+    except Exception as error:
+        return input_file, None, 0, 0, f"{type(error).__name__}: {error}", []
+
+
+def print_summary(processed, failed, bytes_read, bytes_written, elapsed):
+    """
+    Muestra el resumen del lote: archivos, tamaños, razón de compresión y rendimiento.
+    """
+    elapsed = max(elapsed, 1e-9)
+    ratio = bytes_written / bytes_read if bytes_read else 0
+    print(f"{processed} files processed, {failed} failed in {elapsed:.2f} s")
+    print(f"{bytes_read / 1e6:.2f} MB read, {bytes_written / 1e6:.2f} MB written (ratio {ratio:.3f})")
+    print(f"Throughput: {bytes_read / 1e6 / elapsed:.2f} MB/s, {processed / elapsed:.1f} files/s")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compress or decompress files and directory trees.")
+    parser.add_argument('mode', choices=('compress', 'decompress'))
+    parser.add_argument('inputs', nargs='+', help="files or directories to process")
+    parser.add_argument('-o', '--output', required=True, help="output folder; directory trees are mirrored inside it")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="files processed at once (default: one per core); with 1, each encoder uses every core")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print failures and the summary")
+    parser.add_argument('--stages', action='store_true', help="print the time and bytes of every encoder stage")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also measure the peak memory of every stage (slower; implies --stages)")
+    parser.add_argument('--profile', metavar='FOLDER', help="save a cProfile dump of every file in this folder")
+    parser.add_argument('--cache', metavar='FOLDER', help="reuse results of unchanged files from this cache folder")
+    parser.add_argument('--cache-size', type=float, default=1024, metavar='MB',
+                        help="maximum cache size; the least recently used results are evicted (default 1024)")
+    parser.add_argument('--link', action='store_true',
+                        help="hard-link results to the cache instead of copying them (linked results are read-only)")
+    parser.add_argument('--level', type=int, choices=range(1, 10), metavar='1-9',
+                        help="compress text with LZ77 matching at this level (1 fastest, 9 smallest)")
+    parser.add_argument('--dictionary', metavar='FILE',
+                        help="code text with this pretrained table (see Diccionario.py); needed again to decompress")
+    parser.add_argument('--engine', choices=ENGINES + ('auto',),
+                        help="engine for text and images (default huffman); auto picks one from a sample")
+    parser.add_argument('--target', choices=TARGETS, default='balanced',
+                        help="what --engine auto optimizes: speed, balanced or size (default balanced)")
+    return parser
+
+
+def main(arguments=None):
+    parser = build_parser()
+    args = parser.parse_args(arguments)
+    if args.level is not None and args.dictionary:
+        parser.error("--level and --dictionary cannot be used together")
+    if args.engine and (args.level is not None or args.dictionary):
+        parser.error("--engine cannot be used with --level or --dictionary")
+
+    # Bloques carga numpy; se importa aquí para que --help y los errores de uso respondan al instante
+    from Bloques import map_blocks
+    table = COMPRESSORS if args.mode == 'compress' else DECOMPRESSORS
+
+    # Con varios archivos a la vez, cada codificador trabaja en un solo proceso
+    options = {} if args.workers == 1 else {'workers': 1}
+    if args.cache:
+        # Cada proceso recibe su propia copia de la caché y todos comparten la carpeta
+        options['cache'] = ResultCache(args.cache, int(args.cache_size * 1e6), link=args.link)
+    record_stages = args.stages or args.trace_memory
+
+    def profile_file(input_file, relative):
+        if not args.profile:
+            return None
+        return os.path.normpath(os.path.join(args.profile, relative, os.path.basename(input_file) + '.prof'))
+
+    # El motor solo lo entienden los codificadores de texto e imágenes, y el nivel y el
+    # diccionario solo el de texto
+    block_options = dict(options)
+    if args.mode == 'compress' and args.engine:
+        block_options.update(engine=args.engine, target=args.target)
+    text_options = dict(block_options)
+    if args.mode == 'compress' and args.level is not None:
+        text_options['level'] = args.level
+    if args.dictionary:
+        # Se lee una vez; la caché lo identifica por su contenido y no por la ruta
+        from Diccionario import load_dictionary
+        text_options['dictionary'] = load_dictionary(args.dictionary)
+
+    def file_options(input_file):
+        class_name = find_entry(table, input_file)[1]
+        if class_name == 'TextHuffmanEncoder':
+            return text_options
+        return block_options if class_name == 'ImageHuffmanEncoder' else options
+
+    # Un archivo que escribiría sobre el resultado de otro cuenta como fallido en lugar de pisarlo
+    files, duplicates = split_duplicates(find_files(args.inputs, table))
+    tasks = ((args.mode, input_file, os.path.normpath(os.path.join(args.output, relative)), file_options(input_file),
+              (record_stages, args.trace_memory, profile_file(input_file, relative)))
+             for input_file, relative in files)
+
+    start = time.perf_counter()
+    processed = bytes_read = bytes_written = 0
+    failed = len(duplicates)
+    for input_file, previous_file in duplicates:
+        print(f"FAILED {input_file}: same output path as {previous_file}", file=sys.stderr)
+    recorder = StageRecorder()
+    for input_file, output_file, size_read, size_written, error, stages in map_blocks(process_file, tasks, args.workers):
+        recorder.merge(stages)
+        if error:
+            failed += 1
+            print(f"FAILED {input_file}: {error}", file=sys.stderr)
+            continue
+        processed += 1
+        bytes_read += size_read
+        bytes_written += size_written
+        if not args.quiet:
+            print(f"{input_file} -> {output_file}")
+
+    print_summary(processed, failed, bytes_read, bytes_written, time.perf_counter() - start)
+    if record_stages:
+        print(recorder.report())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
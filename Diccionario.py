@@ -0,0 +1,170 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Tablas de Huffman preentrenadas para textos pequeños: en archivos de pocos KB la tabla de
+# cada bloque ocupa más de lo que ahorra y construir el árbol domina el tiempo. Una tabla
+# entrenada con un corpus de muestra se guarda en un archivo de diccionario y los archivos
+# comprimidos con ella solo guardan su identificador.
+#
+#   python Diccionario.py carpeta_o_archivo [...] -o tabla.dict
+#
+# Formato del diccionario: MAGIC (4) | versión (1) | longitud del escape (1) | tabla
+# La tabla es la de Bloques.encode_table; el identificador son los 8 primeros bytes del hash
+# BLAKE2 de la longitud del escape y la tabla, así que cambia con cualquier cambio de la tabla.
+#
+# Los caracteres que no están en la tabla se codifican con el código de escape seguido del
+# índice del caracter en la lista de escapados del bloque, que se guarda antes de los datos.
+import argparse
+from collections import Counter
+import hashlib
+import os
+import sys
+import bitarray
+from Bloques import SYMBOLS_UTF8, decode_table, encode_table
+from Huffman import MAX_CODE_LENGTH, TableDecoder, build_code_lengths, canonical_codes
+
+MAGIC = b'\x89HUD'
+VERSION = 1
+
+ID_SIZE = 8
+
+# Símbolo del escape en las longitudes y los códigos; se ordena antes que cualquier caracter
+ESCAPE = ''
+
+READ_SIZE = 1 << 20
+
+
+class HuffmanDictionary:
+    """
+    Tabla de Huffman estática para texto: longitudes de código por caracter y del escape.
+    Los códigos canónicos, el libro de códigos y el decodificador se construyen una sola vez.
+    """
+
+    def __init__(self, lengths, escape_length):
+        self.lengths = dict(lengths)
+        self.escape_length = escape_length
+        self.table = encode_table(self.lengths, SYMBOLS_UTF8)
+        self.id = hashlib.blake2b(bytes((escape_length,)) + self.table, digest_size=ID_SIZE).digest()
+        self._codes = canonical_codes(dict(self.lengths, **{ESCAPE: escape_length}))
+        self._codebook = None
+        self._decoder = None
+
+    def __repr__(self):
+        # La caché de resultados usa esta representación como parte de la clave
+        return f"HuffmanDictionary({self.id.hex()})"
+
+    def __getstate__(self):
+        # A los procesos de trabajo solo se envía lo necesario para reconstruirlo
+        return {'lengths': self.lengths, 'escape_length': self.escape_length}
+
+    def __setstate__(self, state):
+        self.__init__(state['lengths'], state['escape_length'])
+
+    def codes(self, escaped=()):
+        """
+        Devuelve {caracter: (código, longitud)} con los caracteres escapados del bloque.
+        """
+        codes = {char: code for char, code in self._codes.items() if char != ESCAPE}
+        escape_code, escape_length = self._codes[ESCAPE]
+        index_bits = (len(escaped) - 1).bit_length()
+        for index, char in enumerate(escaped):
+            codes[char] = ((escape_code << index_bits) | index, escape_length + index_bits)
+        return codes
+
+    def codebook(self, escaped=()):
+        """
+        Devuelve el libro de códigos de bitarray para un bloque con los caracteres escapados dados.
+        """
+        if not escaped and self._codebook is not None:
+            return self._codebook
+        codebook = {char: bitarray.bitarray(format(code, f'0{length}b')) for char, (code, length) in self.codes(escaped).items()}
+        if not escaped:
+            self._codebook = codebook
+        return codebook
+
+    def decoder(self, escaped=()):
+        """
+        Devuelve el decodificador por tablas para un bloque con los caracteres escapados dados.
+        """
+        if not escaped and self._decoder is not None:
+            return self._decoder
+        decoder = TableDecoder({char.encode('utf-8'): code for char, code in self.codes(escaped).items()})
+        if not escaped:
+            self._decoder = decoder
+        return decoder
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(MAGIC + bytes((VERSION, self.escape_length)) + self.table)
+
+
+def load_dictionary(path):
+    """
+    Lee un archivo de diccionario y devuelve su HuffmanDictionary.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a Huffman dictionary.")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Unsupported dictionary version {data[len(MAGIC)]}.")
+
+    codes, _ = decode_table(data, SYMBOLS_UTF8, len(MAGIC) + 2)
+    lengths = {symbol.decode('utf-8'): length for symbol, (_, length) in codes.items()}
+    return HuffmanDictionary(lengths, data[len(MAGIC) + 1])
+
+
+def train_dictionary(paths, max_code_length=MAX_CODE_LENGTH):
+    """
+    Cuenta los caracteres de los archivos de texto de muestra y devuelve su HuffmanDictionary.
+    El escape pesa tanto como los caracteres vistos una sola vez, que estiman los que faltan.
+    """
+    frequencies = Counter()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            for chunk in iter(lambda: file.read(READ_SIZE), ''):
+                frequencies.update(chunk)
+
+    singletons = sum(1 for count in frequencies.values() if count == 1)
+    lengths = build_code_lengths(dict(frequencies, **{ESCAPE: max(1, singletons)}), max_code_length)
+    escape_length = lengths.pop(ESCAPE)
+    return HuffmanDictionary(lengths, escape_length)
+
+
+def find_text_files(paths):
+    """
+    Genera los archivos .txt de las rutas dadas, recorriendo los directorios.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, subfolders, names in os.walk(path):
+                subfolders.sort()
+                for name in sorted(names):
+                    if name.lower().endswith('.txt'):
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Train a static Huffman table for text from a sample corpus.")
+    parser.add_argument('inputs', nargs='+', help="sample text files or directories")
+    parser.add_argument('-o', '--output', required=True, help="dictionary file to write")
+    parser.add_argument('--max-code-length', type=int, default=MAX_CODE_LENGTH, help="longest code allowed")
+    args = parser.parse_args(arguments)
+
+    files = list(find_text_files(args.inputs))
+    if not files:
+        print("No text files found.", file=sys.stderr)
+        return 1
+    dictionary = train_dictionary(files, args.max_code_length)
+    dictionary.save(args.output)
+    print(f"Dictionary {dictionary.id.hex()}: {len(dictionary.lengths)} symbols from {len(files)} files, "
+          f"escape code of {dictionary.escape_length} bits")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,575 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Núcleo de Huffman compartido por los codificadores de texto e imágenes
+import heapq
+import numpy as np
+
+# Longitud máxima de un código; acota el tamaño de las tablas del decodificador
+MAX_CODE_LENGTH = 20
+
+# Bits que consume el decodificador en cada consulta de su tabla principal
+TABLE_BITS = 10
+
+# Decodificación vectorizada: el flujo se parte en tramos de SEGMENT_BITS bits que se decodifican
+# a la vez; los flujos más cortos que VECTOR_MIN_BITS se decodifican con el ciclo de tablas
+SEGMENT_BITS = 256
+VECTOR_MIN_BITS = 1 << 13
+
+
+class HuffmanNode:
+    def __init__(self, char=None, freq=0):
+        # Inicializa un nodo del árbol de Huffman
+        self.char = char
+        self.freq = freq
+        self.left = None
+        self.right = None
+
+    def __lt__(self, other):
+        # Define la comparación de nodos basada en la frecuencia
+        return self.freq < other.freq
+
+
+def build_code_lengths(frequency_map, max_length=MAX_CODE_LENGTH):
+    """
+    Calcula la longitud del código de cada símbolo usando una cola de prioridad.
+    """
+    symbols = list(frequency_map)
+    n = len(symbols)
+
+    if n == 0:
+        return {}
+    if n > 1 << max_length:
+        raise ValueError(f"Too many symbols ({n}) for a maximum code length of {max_length} bits.")
+    if n == 1:
+        # Un único símbolo necesita al menos un bit para poder decodificarse
+        return {symbols[0]: 1}
+
+    # Las hojas ocupan los índices 0..n-1 y los nodos internos los siguientes;
+    # el índice sirve además como desempate estable dentro del montículo
+    heap = [(frequency_map[symbol], index) for index, symbol in enumerate(symbols)]
+    heapq.heapify(heap)
+    parent = [0] * (2 * n - 1)
+
+    next_index = n
+    while len(heap) > 1:
+        left_freq, left = heapq.heappop(heap)
+        right_freq, right = heapq.heappop(heap)
+        parent[left] = parent[right] = next_index
+        heapq.heappush(heap, (left_freq + right_freq, next_index))
+        next_index += 1
+
+    # Cada padre tiene un índice mayor que sus hijos, así que basta un recorrido inverso
+    depth = [0] * (2 * n - 1)
+    for index in range(2 * n - 3, -1, -1):
+        depth[index] = depth[parent[index]] + 1
+
+    lengths = {symbol: depth[index] for index, symbol in enumerate(symbols)}
+    if max(depth[:n]) > max_length:
+        _limit_code_lengths(lengths, frequency_map, symbols, max_length)
+    return lengths
+
+
+def _limit_code_lengths(lengths, frequency_map, symbols, max_length):
+    """
+    Recorta las longitudes a max_length manteniendo la desigualdad de Kraft.
+    """
+    limit = 1 << max_length
+    by_frequency = sorted(range(len(symbols)), key=lambda index: frequency_map[symbols[index]])
+
+    kraft = 0
+    for symbol in symbols:
+        lengths[symbol] = min(lengths[symbol], max_length)
+        kraft += 1 << (max_length - lengths[symbol])
+
+    # Alarga los códigos de los símbolos menos frecuentes hasta que el código sea válido
+    for index in by_frequency:
+        symbol = symbols[index]
+        while kraft > limit and lengths[symbol] < max_length:
+            lengths[symbol] += 1
+            kraft -= 1 << (max_length - lengths[symbol])
+        if kraft <= limit:
+            break
+
+    # Aprovecha el espacio sobrante acortando los códigos de los símbolos más frecuentes
+    for index in reversed(by_frequency):
+        symbol = symbols[index]
+        while lengths[symbol] > 1 and kraft + (1 << (max_length - lengths[symbol])) <= limit:
+            kraft += 1 << (max_length - lengths[symbol])
+            lengths[symbol] -= 1
+
+
+def canonical_codes(lengths):
+    """
+    Asigna los códigos canónicos y devuelve un diccionario símbolo -> (código, longitud).
+    """
+    codes = {}
+    code = 0
+    previous_length = 0
+
+    for symbol in sorted(lengths, key=lambda symbol: (lengths[symbol], symbol)):
+        length = lengths[symbol]
+        code <<= length - previous_length
+        codes[symbol] = (code, length)
+        code += 1
+        previous_length = length
+
+    return codes
+
+
+def build_tree_from_codes(codes):
+    """
+    Construye el árbol de Huffman que corresponde a los códigos dados.
+    """
+    root = HuffmanNode()
+
+    for symbol, (code, length) in codes.items():
+        node = root
+        for shift in range(length - 1, -1, -1):
+            if (code >> shift) & 1:
+                if node.right is None:
+                    node.right = HuffmanNode()
+                node = node.right
+            else:
+                if node.left is None:
+                    node.left = HuffmanNode()
+                node = node.left
+        node.char = symbol
+
+    return root
+
+
+def code_tables(codes, alphabet_size=256):
+    """
+    Devuelve los arreglos (códigos, longitudes) indexados por símbolo para un alfabeto de enteros.
+    """
+    values = np.zeros(alphabet_size, dtype=np.uint64)
+    lengths = np.zeros(alphabet_size, dtype=np.uint8)
+    for symbol, (code, length) in codes.items():
+        values[symbol] = code
+        lengths[symbol] = length
+    return values, lengths
+
+
+class BitPacker:
+    """
+    Escritor de bits vectorizado: concatena valores de longitud variable, del bit más
+    significativo al menos significativo, sobre un búfer de bytes empaquetados.
+    """
+
+    def __init__(self, chunk_size=1 << 20):
+        self.chunk_size = chunk_size
+        self.out = bytearray()
+        self.carry = 0
+        self.carry_bits = 0
+
+    @property
+    def nbits(self):
+        return len(self.out) * 8 + self.carry_bits
+
+    def write(self, values, lengths):
+        """
+        Añade cada valor con su longitud en bits; cada longitud debe ser de 1 a 64 bits.
+        """
+        values = np.asarray(values, dtype=np.uint64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+
+        # Se procesa por bloques para que la memoria temporal no dependa del tamaño de la entrada
+        for start in range(0, len(values), self.chunk_size):
+            self._write_chunk(values[start:start + self.chunk_size], lengths[start:start + self.chunk_size])
+
+    def _write_chunk(self, values, lengths):
+        ends = np.cumsum(lengths)
+        ends += self.carry_bits
+        starts = ends - lengths
+        total_bits = int(ends[-1])
+        words_index = starts >> 6
+        # Bits libres a la derecha del código dentro de su palabra; si es negativo, desborda
+        free = 64 - (starts & 63) - lengths
+
+        # Alinea cada código dentro de su palabra de 64 bits; lo que no cabe pasa a la siguiente
+        aligned = (values << np.maximum(free, 0).view(np.uint64)) >> np.maximum(-free, 0).view(np.uint64)
+
+        # Cada código ocupa a lo más 64 bits, así que en toda palabra empieza al menos uno y solo el
+        # último de cada palabra puede desbordar a la siguiente. Como los códigos de una palabra no
+        # se solapan, su OR es su suma: la diferencia de las sumas acumuladas (módulo 2**64) en el
+        # último código de cada palabra
+        lasts = np.append(np.flatnonzero(words_index[1:] != words_index[:-1]), len(values) - 1)
+        sums = np.cumsum(aligned).take(lasts)
+        words = np.zeros(len(lasts) + 1, dtype=np.uint64)
+        words[0] = sums[0]
+        np.subtract(sums[1:], sums[:-1], out=words[1:-1])
+        overflow = -free.take(lasts)
+        spills = values.take(lasts) << np.clip(64 - overflow, 0, 63).view(np.uint64)
+        words[1:] |= np.where(overflow > 0, spills, 0)
+        words[0] |= np.uint64(self.carry)
+
+        full_words = total_bits >> 6
+        self.out += words[:full_words].astype('>u8').tobytes()
+        self.carry = int(words[full_words])
+        self.carry_bits = total_bits & 63
+
+    def getvalue(self):
+        """
+        Devuelve (bytes, número de bits) con el último byte completado con ceros.
+        """
+        tail = self.carry.to_bytes(8, 'big')[:(self.carry_bits + 7) // 8]
+        return bytes(self.out) + tail, self.nbits
+
+
+def pack_bits(values, lengths):
+    """
+    Empaqueta los valores con sus longitudes y devuelve (bytes, número de bits).
+    """
+    packer = BitPacker()
+    packer.write(values, lengths)
+    return packer.getvalue()
+
+
+def pack_codes(symbols, code_values, code_lengths, chunk_size=1 << 16):
+    """
+    Codifica un arreglo de bytes con las tablas de code_tables y devuelve (bytes, número de bits).
+    Los bytes se procesan en trozos de chunk_size para que los temporales quepan en la caché.
+    """
+    symbols = np.ascontiguousarray(symbols, dtype=np.uint8).ravel()
+    packer = BitPacker()
+    code_lengths = code_lengths.astype(np.uint64)
+
+    # Tablas de pares de bytes; la entrada adicional, de longitud cero, sirve de relleno
+    pair_values = np.zeros(65537, dtype=np.uint64)
+    pair_lengths = np.zeros(65537, dtype=np.uint64)
+    pair_values[:65536] = ((code_values[:, None] << code_lengths[None, :]) | code_values[None, :]).ravel()
+    pair_lengths[:65536] = (code_lengths[:, None] + code_lengths[None, :]).ravel()
+
+    # Agrupa tantos pares consecutivos como quepan en 64 bits antes de empaquetar
+    max_pair_length = int(pair_lengths.max()) if len(symbols) else 0
+    group = max(1, 64 // max(max_pair_length, 1))
+    chunk_size -= chunk_size % 2
+
+    for start in range(0, len(symbols) - len(symbols) % 2, chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        chunk = chunk[:len(chunk) - len(chunk) % 2]
+        pairs = chunk.view('>u2').astype(np.int32)
+        padding = -len(pairs) % group
+        if padding:
+            pairs = np.concatenate((pairs, np.full(padding, 65536, dtype=np.int32)))
+
+        # La transpuesta deja cada posición del grupo contigua en memoria; take es bastante más
+        # rápido que el índice avanzado con índices contiguos
+        indices = np.ascontiguousarray(pairs.reshape(-1, group).T)
+        values = pair_values.take(indices)
+        lengths = pair_lengths.take(indices)
+        grouped_values = values[0].copy()
+        grouped_lengths = lengths[0].copy()
+        for row in range(1, group):
+            np.left_shift(grouped_values, lengths[row], out=grouped_values)
+            grouped_values |= values[row]
+            grouped_lengths += lengths[row]
+        packer.write(grouped_values, grouped_lengths)
+
+    if len(symbols) % 2:
+        last = symbols[-1:]
+        packer.write(code_values[last], code_lengths[last])
+
+    return packer.getvalue()
+
+
+def read_fields(data, lengths):
+    """
+    Lee campos consecutivos de las longitudes dadas (de 0 a 57 bits) de un flujo de bits.
+    """
+    lengths = lengths.astype(np.uint64)
+    offsets = np.cumsum(lengths) - lengths
+    buffer = bytes(data) + bytes(8)
+    # Vista con una palabra de 64 bits big endian por cada byte de inicio posible
+    words = np.ndarray((len(buffer) - 7,), dtype='>u8', buffer=buffer, strides=(1,))
+    words = words[(offsets >> np.uint64(3)).astype(np.int64)].astype(np.uint64)
+    fields = (words << (offsets & np.uint64(7))) >> (np.uint64(64) - np.maximum(lengths, np.uint64(1)))
+    return np.where(lengths > 0, fields, 0).astype(np.int64)
+
+
+def codes_from_tree(root):
+    """
+    Recorre el árbol sin recursión y devuelve un diccionario símbolo -> (código, longitud).
+    """
+    codes = {}
+    stack = [(root, 0, 0)] if root is not None else []
+
+    while stack:
+        node, code, length = stack.pop()
+        if node.char is not None:
+            codes[node.char] = (code, length)
+            continue
+        if node.left is not None:
+            stack.append((node.left, code << 1, length + 1))
+        if node.right is not None:
+            stack.append((node.right, (code << 1) | 1, length + 1))
+
+    return codes
+
+
+def _build_decode_table(entries, bits):
+    """
+    Construye una tabla de 2**bits entradas; los códigos más largos pasan a subtablas.
+    """
+    table = [None] * (1 << bits)
+    long_codes = {}
+
+    for code, length, symbol in entries:
+        if length <= bits:
+            # Todas las entradas que comienzan con este código apuntan al mismo símbolo
+            shift = bits - length
+            start = code << shift
+            table[start:start + (1 << shift)] = [(symbol, length, None)] * (1 << shift)
+        else:
+            prefix = code >> (length - bits)
+            suffix = code & ((1 << (length - bits)) - 1)
+            long_codes.setdefault(prefix, []).append((suffix, length - bits, symbol))
+
+    for prefix, sub_entries in long_codes.items():
+        sub_bits = min(bits, max(length for _, length, _ in sub_entries))
+        table[prefix] = (None, bits, (_build_decode_table(sub_entries, sub_bits), sub_bits))
+
+    return table
+
+
+def _walk_segments(words, table, max_length, nbits, starts, ends, path, mark=False, steps=None, ids=None):
+    """
+    Decodifica a la vez un tramo por cada inicio hasta ends y devuelve (bit final, paso de path
+    en que se unió a otro camino o -1, steps). Con mark llena path; si no, se detiene al unirse.
+    """
+    mask = (1 << max_length) - 1
+    pos = starts.copy()
+    exits = np.full(len(starts), nbits, dtype=np.int64)
+    joins = np.full(len(starts), -1, dtype=np.int64)
+    done = pos >= ends
+    exits[done] = pos[done]
+    # Solo se siguen los tramos activos: número de cada uno en starts, posición y fin
+    numbers = np.flatnonzero(~done)
+    pos, ends = pos[numbers], ends[numbers]
+    if ids is not None:
+        ids = ids[numbers]
+    step = 0
+    while len(numbers):
+        if not mark:
+            joined = path[pos]
+            hits = joined >= 0
+            if hits.any():
+                joins[numbers[hits]] = joined[hits]
+                keep = ~hits
+                numbers, pos, ends = numbers[keep], pos[keep], ends[keep]
+                if ids is not None:
+                    ids = ids[keep]
+        windows = (words[pos >> 3] >> (32 - max_length - (pos & 7))) & mask
+        entries = table[windows]
+        lengths = entries & 31
+        # Un código que no cabe es el relleno del final; los bits sin código avanzan de uno en uno
+        fits = pos + lengths <= nbits
+        # steps[ids, paso] es el índice del símbolo, -1 si no hay código y -2 fuera del tramo
+        if steps is not None:
+            if step == steps.shape[1]:
+                steps = np.concatenate((steps, np.full_like(steps, -2)), axis=1)
+            steps[ids[fits], step] = entries[fits] >> 5
+        if mark:
+            path[pos[fits]] = step
+        pos = pos + np.maximum(lengths, 1)
+        done = ~fits | (pos >= ends)
+        if done.any():
+            exits[numbers[done]] = np.where(fits[done], pos[done], nbits)
+            keep = ~done
+            numbers, pos, ends = numbers[keep], pos[keep], ends[keep]
+            if ids is not None:
+                ids = ids[keep]
+        step += 1
+    return exits, joins, steps
+
+
+class TableDecoder:
+    """
+    Decodificador de Huffman guiado por tablas que consume varios bits en cada paso.
+    """
+
+    def __init__(self, codes, table_bits=TABLE_BITS):
+        # codes relaciona cada símbolo, ya convertido a bytes, con su (código, longitud)
+        entries = [(code, length, symbol) for symbol, (code, length) in codes.items() if length > 0]
+        self.max_length = max((length for _, length, _ in entries), default=0)
+        self.min_length = min((length for _, length, _ in entries), default=0)
+        self.table_bits = max(1, min(table_bits, self.max_length))
+        self.table = _build_decode_table(entries, self.table_bits)
+        self._entries = entries
+        self._flat = None
+
+        # Estado que se conserva entre llamadas cuando se decodifica por bloques
+        self._acc = 0
+        self._nacc = 0
+        self._pending = b''
+
+    def decode(self, data, nbits=None, final=True):
+        """
+        Decodifica los bits empaquetados en data y devuelve un bytearray con los símbolos.
+        Con final=False los bits que no completan un código se guardan para la siguiente llamada.
+        """
+        if nbits is None:
+            nbits = len(data) * 8
+
+        out = bytearray()
+        if self.max_length == 0:
+            return out
+        if final and not self._nacc and not self._pending and nbits >= VECTOR_MIN_BITS \
+                and self.max_length <= MAX_CODE_LENGTH:
+            return self.decode_vectorized(data, nbits)
+
+        table = self.table
+        table_bits = self.table_bits
+        table_mask = (1 << table_bits) - 1
+        max_length = self.max_length
+        acc = self._acc
+        nacc = self._nacc
+        remaining = nacc + len(self._pending) * 8 + nbits
+        if self._pending:
+            data = self._pending + bytes(data)
+        data = memoryview(data)
+        pos = 0
+
+        # Sin el final del flujo solo se decodifica mientras quepa el código más largo
+        limit = 0 if final else max_length - 1
+
+        while remaining > limit:
+            # Recarga el acumulador de 64 en 64 bits para cubrir el código más largo
+            while nacc < max_length:
+                chunk = data[pos:pos + 8]
+                pos += 8
+                acc = ((acc & ((1 << nacc) - 1)) << 64) | (int.from_bytes(chunk, 'big') << (64 - 8 * len(chunk)))
+                nacc += 64
+
+            entry = table[(acc >> (nacc - table_bits)) & table_mask]
+            if entry is None:
+                break
+            symbol, length, sub = entry
+
+            while sub is not None and length <= remaining:
+                # El código continúa en una subtabla
+                nacc -= length
+                remaining -= length
+                subtable, sub_bits = sub
+                entry = subtable[(acc >> (nacc - sub_bits)) & ((1 << sub_bits) - 1)]
+                if entry is None:
+                    break
+                symbol, length, sub = entry
+
+            if entry is None or sub is not None or length > remaining:
+                # Datos inválidos o bits de relleno al final del flujo
+                break
+            nacc -= length
+            remaining -= length
+            out += symbol
+
+        if final:
+            self._acc, self._nacc, self._pending = 0, 0, b''
+        else:
+            # Conserva los bits reales que quedan en el acumulador y los bytes sin leer
+            unread = bytes(data[pos:])
+            real_bits = max(remaining - len(unread) * 8, 0)
+            self._acc = (acc >> (nacc - real_bits)) & ((1 << real_bits) - 1)
+            self._nacc = real_bits
+            self._pending = unread
+
+        return out
+
+    def flat_table(self):
+        """
+        Devuelve una tabla con una entrada por cada ventana posible de max_length bits: el índice
+        del símbolo del código con que empieza la ventana por 32 más la longitud del código, o -32
+        si no empieza ningún código. También devuelve los bytes de los símbolos: un arreglo con
+        el byte de cada uno si todos miden un byte o, si no, (bytes unidos, inicio y tamaño de
+        cada símbolo). Se construye la primera vez que se necesita.
+        """
+        if self._flat is None:
+            table = np.full(1 << self.max_length, -32, dtype=np.int32)
+            for index, (code, length, _) in enumerate(self._entries):
+                shift = self.max_length - length
+                table[code << shift:(code + 1) << shift] = (index << 5) | length
+
+            symbols = [symbol for _, _, symbol in self._entries]
+            if all(len(symbol) == 1 for symbol in symbols):
+                symbol_bytes = np.frombuffer(b''.join(symbols), dtype=np.uint8)
+            else:
+                sizes = np.array([len(symbol) for symbol in symbols], dtype=np.int64)
+                symbol_bytes = (np.frombuffer(b''.join(symbols), dtype=np.uint8), np.cumsum(sizes) - sizes, sizes)
+            self._flat = (table, symbol_bytes)
+        return self._flat
+
+    def decode_vectorized(self, data, nbits):
+        """
+        Decodifica un flujo completo con NumPy, por tramos de SEGMENT_BITS bits a la vez, y
+        corrige el principio de los tramos que no empezaban en un código.
+        """
+        table, symbol_bytes = self.flat_table()
+        max_length = self.max_length
+        dtype = np.int16 if len(symbol_bytes if isinstance(symbol_bytes, np.ndarray) else symbol_bytes[1]) < 1 << 15 \
+            else np.int32
+
+        # Palabra de 32 bits que empieza en cada byte; contiene cualquier ventana de max_length bits
+        nbytes = (nbits + 7) // 8
+        buffer = bytes(data[:nbytes]) + bytes(4)
+        words = np.ndarray((nbytes + 1,), dtype='>u4', buffer=buffer, strides=(1,)).astype(np.int64)
+
+        bounds = np.arange(0, nbits, SEGMENT_BITS, dtype=np.int64)
+        ends = np.append(bounds[1:], nbits)
+        # Índice del símbolo de cada paso (columnas) de cada tramo (filas)
+        steps = np.full((len(bounds), SEGMENT_BITS // self.min_length + 1), -2, dtype=dtype)
+        path = np.full(len(bounds) * SEGMENT_BITS, -1, dtype=np.int16)
+        exits, _, steps = _walk_segments(words, table, max_length, nbits, bounds, ends, path, True, steps,
+                                         np.arange(len(bounds)))
+
+        starts = np.append(0, exits[:-1])
+        pending = np.flatnonzero(starts != bounds)
+        if len(pending):
+            # Desde el primer tramo que no empezó donde terminó el anterior, se calcula dónde termina
+            # cada tramo según el bit en que empiece (el anterior termina a menos de max_length bits
+            # de su inicio); cada camino se detiene al unirse al ya decodificado y termina donde él
+            first = int(pending[0])
+            segments = np.repeat(np.arange(first, len(bounds)), max_length)
+            candidates = (bounds[first:, None] + np.arange(max_length)).ravel()
+            table_exits, joins, _ = _walk_segments(words, table, max_length, nbits, candidates, ends[segments], path)
+            table_exits = np.where(joins >= 0, exits[segments], table_exits).reshape(-1, max_length).tolist()
+
+            # Se encadenan los tramos para saber dónde empieza en verdad cada uno
+            used_exits, segment_bounds = exits.tolist(), bounds.tolist()
+            entry = used_exits[first - 1]
+            for number in range(first, len(bounds)):
+                starts[number] = entry
+                if entry == segment_bounds[number]:
+                    entry = used_exits[number]
+                elif entry - segment_bounds[number] < max_length:
+                    entry = table_exits[number - first][entry - segment_bounds[number]]
+                # Si no, el flujo ya terminó y el tramo queda vacío
+
+            # Los tramos que empezaron mal se decodifican desde su inicio hasta unirse al camino
+            # ya decodificado, y sus pasos anteriores a la unión se descartan
+            pending = np.flatnonzero(starts != bounds)
+            prefix = np.full((len(bounds), max_length + 1), -2, dtype=dtype)
+            _, joins, prefix = _walk_segments(words, table, max_length, nbits, starts[pending], ends[pending], path,
+                                              steps=prefix, ids=pending)
+            discarded = np.zeros(len(bounds), dtype=np.int64)
+            discarded[pending] = np.where(joins >= 0, joins, steps.shape[1])
+            steps[np.arange(steps.shape[1]) < discarded[:, None]] = -2
+            steps = np.concatenate((prefix, steps), axis=1)
+
+        # Recorriendo los tramos en orden y, dentro de cada uno, sus pasos, quedan los símbolos en orden
+        indices = steps.ravel()
+        indices = indices[indices != -2]
+        invalid = np.flatnonzero(indices < 0)
+        if len(invalid):
+            # Datos inválidos: como el ciclo de tablas, se detiene en el primer código que no existe
+            indices = indices[:invalid[0]]
+
+        if isinstance(symbol_bytes, np.ndarray):
+            return bytearray(symbol_bytes[indices].tobytes())
+        joined, symbol_starts, sizes = symbol_bytes
+        sizes = sizes[indices]
+        # Posición en joined de cada byte de salida: inicio del símbolo más el avance dentro de él
+        gather = np.repeat(symbol_starts[indices] - (np.cumsum(sizes) - sizes), sizes) + np.arange(int(sizes.sum()))
+        return bytearray(joined[gather].tobytes())
@@ -4,62 +4,110 @@
 """
 
 # Importación de las librerías necesarias para su funcionamiento
-from tkinter import messagebox
 import bitarray
+import json
 import os
 from PIL import Image
 import numpy as np
-
-
-class HuffmanNode:
-    def __init__(self, char=None, freq=0):
-        # Inicializa un nodo del árbol de Huffman
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-
-    def __lt__(self, other):
-        # Define la comparación de nodos basada en la frecuencia
-        return self.freq < other.freq
+from Analisis import check_engine
+from Bloques import SYMBOLS_BYTES, compress_blocks, decompress_blocks, is_container, partial_output, read_metadata, utf8_length
+from Medicion import NULL_RECORDER
+from Prediccion import filter_image, unfilter_image
+from Huffman import HuffmanNode, MAX_CODE_LENGTH, TableDecoder, build_code_lengths, build_tree_from_codes, canonical_codes, code_tables, codes_from_tree, pack_codes
+
+
+# Tamaño por defecto, en bytes, de los bloques que se codifican por separado
+BLOCK_SIZE = 1 << 22
+
+
+def image_metadata(img, img_data, prediction=None, tile_size=None):
+    """
+    Describe la imagen (forma, tipo de dato, modo de PIL, paleta, predicción usada y tamaño
+    de mosaico) para guardarla en la cabecera.
+    """
+    palette = img.getpalette() if img.mode == 'P' else None
+    return json.dumps({
+        'shape': list(img_data.shape),
+        'dtype': img_data.dtype.str,
+        'mode': img.mode,
+        'palette': bytes(palette).hex() if palette is not None else None,
+        'prediction': prediction,
+        'tile_size': tile_size,
+    }).encode('utf-8')
+
+
+def rebuild_image(img_data, metadata):
+    """
+    Reconstruye la imagen de PIL a partir de los píxeles y de los metadatos de la cabecera.
+    """
+    img = Image.fromarray(img_data)
+    if metadata['palette'] is not None:
+        img.putpalette(bytes.fromhex(metadata['palette']))
+    elif img.mode != metadata['mode']:
+        img = img.convert(metadata['mode'])
+    return img
+
+
+def tile_bounds(number, shape, tile_size):
+    """
+    Devuelve (fila, columna, alto, ancho, canal) del bloque number de una imagen por mosaicos.
+    Los bloques se ordenan por fila de mosaicos, luego por columna y luego por canal.
+    """
+    height, width = shape[0], shape[1]
+    channels = shape[2] if len(shape) > 2 else 1
+    tile_columns = -(-width // tile_size)
+    tile, channel = divmod(number, channels)
+    tile_row, tile_column = divmod(tile, tile_columns)
+    top, left = tile_row * tile_size, tile_column * tile_size
+    return top, left, min(tile_size, height - top), min(tile_size, width - left), channel
+
+
+def decode_tile(data, height, width, dtype, prediction):
+    """
+    Reconstruye un mosaico de un canal a partir de los bytes de su bloque.
+    """
+    if prediction == 'png':
+        filter_types = np.frombuffer(data, dtype=np.uint8, count=height)
+        residuals = np.frombuffer(data, dtype=np.uint8, offset=height).reshape(height, width)
+        return unfilter_image(filter_types, residuals)
+    return np.frombuffer(data, dtype=dtype).reshape(height, width)
 
 
 class ImageHuffmanEncoder:
-    # Variable de clase para almacenar datos de imagen original
-    original_img_data = None
-
-    def __init__(self):
-        # Inicializa el codificador Huffman para imágenes
-        self.nodes = []
+    def __init__(self, block_size=BLOCK_SIZE, workers=None, show_preview=False, prediction=False, tile_size=None,
+                 recorder=None, engine='huffman', target='balanced'):
+        # Inicializa el codificador Huffman para imágenes; workers es el número de procesos
+        # que codifican los bloques (por defecto, uno por núcleo), show_preview muestra
+        # la imagen descomprimida con matplotlib, prediction aplica los filtros de PNG
+        # antes de codificar, tile_size divide la imagen en mosaicos de ese lado, recorder
+        # recibe las mediciones de cada etapa y engine elige el motor ('huffman', 'stored',
+        # 'zlib', 'lzma' o 'auto', que lo decide según target)
+        check_engine(engine, target)
+        self.max_code_length = MAX_CODE_LENGTH
+        self.block_size = block_size
+        self.workers = workers
+        self.show_preview = show_preview
+        # Última imagen comprimida por esta instancia; solo se guarda para la vista previa
+        self.original_img_data = None
+        self.prediction = prediction
+        self.tile_size = tile_size
+        self.recorder = recorder or NULL_RECORDER
+        self.engine = engine
+        self.target = target
 
     def build_frequency_map(self, data):
         """
-        Construye y devuelve un diccionario con la frecuencia de cada caracter en los datos.
+        Construye y devuelve un diccionario con la frecuencia de cada byte en los datos.
         """
-        frequency_map = {}
-        for char in data:
-            frequency_map[char] = frequency_map.get(char, 0) + 1
-        return frequency_map
+        counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+        return {int(byte): int(counts[byte]) for byte in np.flatnonzero(counts)}
 
     def build_tree(self, frequency_map):
         """
-        Construye y devuelve un árbol de Huffman basado en el mapa de frecuencias dado.
+        Construye y devuelve un árbol de Huffman canónico basado en el mapa de frecuencias dado.
         """
-        self.nodes = [HuffmanNode(char, freq) for char, freq in frequency_map.items()]
-
-        while len(self.nodes) > 1:
-            # Combina nodos de menor frecuencia para construir el árbol
-            self.nodes.sort(key=lambda x: x.freq)
-            left = self.nodes.pop(0)
-            right = self.nodes.pop(0)
-
-            merged_node = HuffmanNode(freq=left.freq + right.freq)
-            merged_node.left = left
-            merged_node.right = right
-
-            self.nodes.append(merged_node)
-
-        return self.nodes[0]
+        lengths = build_code_lengths(frequency_map, self.max_code_length)
+        return build_tree_from_codes(canonical_codes(lengths))
 
     def build_codebook(self, root, current_code="", codebook=None):
         """
@@ -78,73 +126,180 @@ class ImageHuffmanEncoder:
 
     def compress(self, data):
         """
-        Comprime los datos utilizando el algoritmo de Huffman y devuelve los datos comprimidos y el árbol de Huffman.
+        Comprime los datos utilizando el algoritmo de Huffman y devuelve un bitarray con los datos comprimidos y el árbol de Huffman.
         """
-        frequency_map = self.build_frequency_map(data)
-        root = self.build_tree(frequency_map)
-        codebook = self.build_codebook(root)
-
-        encoded_data = "".join(codebook[char] for char in data)
+        with self.recorder.stage('frequency map', len(data)):
+            frequency_map = self.build_frequency_map(data)
+        with self.recorder.stage('tree'):
+            root = self.build_tree(frequency_map)
+        with self.recorder.stage('codebook'):
+            code_values, code_lengths = code_tables(codes_from_tree(root))
+
+        # Los códigos se buscan y empaquetan con NumPy sobre todos los bytes a la vez
+        with self.recorder.stage('bit packing', len(data)) as stage:
+            packed_data, nbits = pack_codes(np.frombuffer(data, dtype=np.uint8), code_values, code_lengths)
+            stage.bytes_out = len(packed_data)
+        encoded_data = bitarray.bitarray()
+        encoded_data.frombytes(packed_data)
+        del encoded_data[nbits:]
         return encoded_data, root
 
-    def decompress(self, encoded_data, root):
+    def build_decoder(self, root):
         """
-        Descomprime los datos comprimidos utilizando el árbol de Huffman.
+        Construye el decodificador por tablas correspondiente al árbol de Huffman.
         """
-        decoded_data = []
-        current_node = root
-
-        for bit in encoded_data:
-            if current_node is not None:
-                if bit == "0" and current_node.left:
-                    current_node = current_node.left
-                elif bit == "1" and current_node.right:
-                    current_node = current_node.right
-
-                if current_node.char is not None:
-                    decoded_data.append(current_node.char)
-                    current_node = root
-            else:
-                break
+        codes = {bytes((char,)): code for char, code in codes_from_tree(root).items()}
+        return TableDecoder(codes)
 
-        return decoded_data
+    def decompress(self, encoded_data, root):
+        """
+        Descomprime un bitarray utilizando la tabla de decodificación del árbol de Huffman.
+        """
+        return bytes(self.build_decoder(root).decode(encoded_data.tobytes(), len(encoded_data)))
 
     def compress_file(self, input_image, output_folder, progress_callback=None):
         """
         Comprime un archivo de imagen y guarda el archivo comprimido en la carpeta de salida.
         """
-        with Image.open(input_image) as img:
+        with self.recorder.stage('read', os.path.getsize(input_image)) as stage, Image.open(input_image) as img:
             img_data = np.array(img)
-            ImageHuffmanEncoder.original_img_data = img_data  # Almacenamos la información de la imagen original como variable de clase
-
-        print("Original Image Shape:", img_data.shape)
-
-        encoded_data, root = self.compress(img_data.tobytes())
-        bit_array = bitarray.bitarray(encoded_data)
+            stage.bytes_out = img_data.nbytes
+            # Los filtros de predicción solo tienen sentido con muestras de 8 bits que no sean
+            # índices de una paleta
+            predictable = img_data.dtype == np.uint8 and img.mode != 'P'
+            prediction = 'png' if self.prediction and predictable else None
+            metadata = image_metadata(img, img_data, prediction, self.tile_size)
+            if self.show_preview:
+                self.original_img_data = img_data
 
         file_name, _ = os.path.splitext(os.path.basename(input_image))
         output_file_path = os.path.join(output_folder, f"{file_name}_compressed.bin")
 
-        with open(output_file_path, 'wb') as file:
-            tree_bytes = self.encode_tree(root)
-            file.write(len(tree_bytes).to_bytes(4, byteorder='big'))
-            file.write(tree_bytes)
-            bit_array.tofile(file)
+        if self.tile_size:
+            # Cada canal de cada mosaico es un bloque con su propia tabla
+            chunks = self.tile_chunks(img_data, prediction)
+            # Aproximado: no cuenta el byte de filtro de cada fila de cada mosaico
+            total_size = img_data.nbytes
+        else:
+            if prediction:
+                # Se codifica el filtro de cada fila seguido de los residuos
+                with self.recorder.stage('prediction', img_data.nbytes) as stage:
+                    filter_types, residuals = filter_image(img_data)
+                    data = filter_types.tobytes() + residuals.tobytes()
+                    stage.bytes_out = len(data)
+            else:
+                data = img_data.tobytes()
+
+            # Cada bloque de block_size bytes se codifica con su propia tabla en un proceso aparte
+            chunks = (data[start:start + self.block_size] for start in range(0, len(data), self.block_size))
+            total_size = len(data)
+
+        compress_blocks(chunks, output_file_path, SYMBOLS_BYTES, metadata,
+                        max_code_length=self.max_code_length, workers=self.workers,
+                        progress_callback=progress_callback, total_size=total_size, recorder=self.recorder,
+                        engine=self.engine, target=self.target)
 
         if progress_callback:
             progress_callback(100)
 
         return output_file_path
 
+    def tile_chunks(self, img_data, prediction):
+        """
+        Genera los bytes de cada mosaico y canal, filtrados por separado si hay predicción.
+        Como se generan al leer los bloques, su tiempo cuenta en la etapa de lectura.
+        """
+        pixels = img_data.reshape(img_data.shape[0], img_data.shape[1], -1)
+        height, width, channels = pixels.shape
+
+        for top in range(0, height, self.tile_size):
+            for left in range(0, width, self.tile_size):
+                for channel in range(channels):
+                    tile = pixels[top:top + self.tile_size, left:left + self.tile_size, channel]
+                    if prediction:
+                        filter_types, residuals = filter_image(tile)
+                        yield filter_types.tobytes() + residuals.tobytes()
+                    else:
+                        yield tile.tobytes()
+
+    def decode_pixels(self, metadata, numbered_blocks, region=None):
+        """
+        Reconstruye los píxeles a partir de los bloques decodificados, dados como pares
+        (número, bytes). region = (x, y, ancho, alto) limita el resultado a ese rectángulo.
+        """
+        shape = tuple(metadata['shape'])
+        dtype = np.dtype(metadata['dtype'])
+        prediction = metadata.get('prediction')
+        tile_size = metadata.get('tile_size')
+        x, y, width, height = region or (0, 0, shape[1], shape[0])
+
+        if not tile_size:
+            data = b''.join(block for _, block in numbered_blocks)
+            if prediction == 'png':
+                filter_types = np.frombuffer(data, dtype=np.uint8, count=shape[0])
+                residuals = np.frombuffer(data, dtype=np.uint8, offset=shape[0]).reshape(shape)
+                pixels = unfilter_image(filter_types, residuals)
+            else:
+                pixels = np.frombuffer(data, dtype=dtype).reshape(shape)
+            return pixels[y:y + height, x:x + width]
+
+        channels = shape[2] if len(shape) > 2 else 1
+        pixels = np.zeros((height, width, channels), dtype=dtype)
+        for number, block in numbered_blocks:
+            top, left, tile_height, tile_width, channel = tile_bounds(number, shape, tile_size)
+            tile = decode_tile(block, tile_height, tile_width, dtype, prediction)
+
+            # Copia solo la intersección del mosaico con la región pedida
+            row_start, row_end = max(top, y), min(top + tile_height, y + height)
+            column_start, column_end = max(left, x), min(left + tile_width, x + width)
+            pixels[row_start - y:row_end - y, column_start - x:column_end - x, channel] = \
+                tile[row_start - top:row_end - top, column_start - left:column_end - left]
+
+        return pixels.reshape((height, width) + shape[2:])
+
+    def decompress_region(self, input_file, x, y, width, height):
+        """
+        Descomprime solo el rectángulo (x, y, ancho, alto) de la imagen y lo devuelve como imagen
+        de PIL. Con mosaicos solo se leen y decodifican los bloques que tocan la región.
+        """
+        metadata = json.loads(read_metadata(input_file) or 'null')
+        if metadata is None:
+            raise ValueError("The compressed file does not record the image shape. Please compress the image again.")
+
+        shape = metadata['shape']
+        x, y = max(x, 0), max(y, 0)
+        width, height = min(width, shape[1] - x), min(height, shape[0] - y)
+        if width <= 0 or height <= 0:
+            raise ValueError("The requested region is outside the image.")
+
+        tile_size = metadata.get('tile_size')
+        numbers = None
+        if tile_size:
+            channels = shape[2] if len(shape) > 2 else 1
+            tile_columns = -(-shape[1] // tile_size)
+            numbers = [
+                (tile_row * tile_columns + tile_column) * channels + channel
+                for tile_row in range(y // tile_size, (y + height - 1) // tile_size + 1)
+                for tile_column in range(x // tile_size, (x + width - 1) // tile_size + 1)
+                for channel in range(channels)
+            ]
+
+        _, blocks = decompress_blocks(input_file, self.workers, numbers)
+        numbered_blocks = zip(numbers, blocks) if numbers is not None else enumerate(blocks)
+        region_data = self.decode_pixels(metadata, numbered_blocks, (x, y, width, height))
+        return rebuild_image(np.ascontiguousarray(region_data), metadata)
+
     def show_image(self, original_img, decompressed_img):
         # Aquí abrimos la imagen en la misma aplicación para verificar que la imagen original y la descomprimida sean la misma
         import matplotlib.pyplot as plt
 
-        plt.subplot(1, 2, 1)
-        plt.title('Original Image')
-        plt.imshow(original_img)
+        # Sin la imagen original solo se muestra la descomprimida
+        if original_img is not None:
+            plt.subplot(1, 2, 1)
+            plt.title('Original Image')
+            plt.imshow(original_img)
+            plt.subplot(1, 2, 2)
 
-        plt.subplot(1, 2, 2)
         plt.title('Decompressed Image')
         plt.imshow(decompressed_img)
 
@@ -153,74 +308,88 @@ class ImageHuffmanEncoder:
     def decompress_file(self, input_file, output_folder, progress_callback=None):
         """
         Descomprime un archivo binario y guarda el archivo descomprimido en la carpeta de salida.
+        La cabecera describe la imagen, así que no depende de estado compartido ni de la interfaz.
         """
-        if ImageHuffmanEncoder.original_img_data is None:
-            messagebox.showerror("Error", "Please compress an image first.")
-            return  # Evitamos que continúe si no hay información de la imagen original
-
-        with open(input_file, 'rb') as file:
-            tree_size = int.from_bytes(file.read(4), byteorder='big')
-            tree_bytes = file.read(tree_size)
-            encoded_data = bitarray.bitarray()
-            encoded_data.fromfile(file)
-
-        root = self.decode_tree(tree_bytes)
-        decoded_data = self.decompress(encoded_data.to01(), root)
-
-        # Convertir los datos decodificados a bytes
-        decoded_data_bytes = bytes(decoded_data)
-
-        # Reconstruir la imagen descomprimida
-        decompressed_img_data = np.frombuffer(decoded_data_bytes, dtype=np.uint8).reshape(ImageHuffmanEncoder.original_img_data.shape)
+        metadata = None
+        if is_container(input_file):
+            header, blocks = decompress_blocks(input_file, self.workers, progress_callback=progress_callback,
+                                               recorder=self.recorder)
+            metadata = json.loads(header) if header else None
+        else:
+            # Formato original: un árbol seguido de un único flujo de bits
+            with open(input_file, 'rb') as file:
+                tree_size = int.from_bytes(file.read(4), byteorder='big')
+                tree_bytes = file.read(tree_size)
+                encoded_data = file.read()
+
+            # La tabla escribe los bytes de los píxeles directamente en un bytearray
+            root = self.decode_tree(tree_bytes)
+            blocks = [self.build_decoder(root).decode(encoded_data)]
+
+        # Reconstruir la imagen descomprimida; los bloques se decodifican a medida que se consumen,
+        # así que esta etapa incluye sus tiempos
+        with self.recorder.stage('reconstruction') as stage:
+            if metadata is None:
+                # Sin metadatos no se conoce la forma: los píxeles se escriben tal cual, como en
+                # el formato original
+                decompressed_img_data = np.frombuffer(b''.join(blocks), dtype=np.uint8)
+            else:
+                decompressed_img_data = self.decode_pixels(metadata, enumerate(blocks))
+            stage.bytes_out = decompressed_img_data.nbytes
 
-        # Mostrar las imágenes
-        self.show_image(ImageHuffmanEncoder.original_img_data, decompressed_img_data)
+        # Mostrar las imágenes solo si se pidió la vista previa
+        if self.show_preview:
+            original = self.original_img_data
+            if decompressed_img_data.ndim == 1 and original is not None and original.nbytes == decompressed_img_data.nbytes:
+                decompressed_img_data = decompressed_img_data.view(original.dtype).reshape(original.shape)
+            if decompressed_img_data.ndim > 1:
+                self.show_image(original, decompressed_img_data)
 
         file_name, _ = os.path.splitext(os.path.basename(input_file))
         output_file_path = os.path.join(output_folder, f"{file_name}_decompressed.bmp")
 
-        with open(output_file_path, 'wb') as file:
-            file.write(decoded_data_bytes)
+        with self.recorder.stage('write', decompressed_img_data.nbytes) as stage, partial_output(output_file_path):
+            if metadata is None or metadata['mode'] is None:
+                # Sin modo conocido se conservan los píxeles tal cual, como en el formato original
+                with open(output_file_path, 'wb') as file:
+                    file.write(decompressed_img_data.tobytes())
+            else:
+                rebuild_image(decompressed_img_data, metadata).save(output_file_path, format='BMP')
+            stage.bytes_out = os.path.getsize(output_file_path)
 
         if progress_callback:
             progress_callback(100)
 
         return output_file_path
 
-    def encode_tree(self, root):
-        """
-        Codifica el árbol de Huffman en bytes.
-        """
-        if root is None:
-            return b''
-
-        if isinstance(root.char, int):
-            return b'\x01' + root.char.to_bytes(4, byteorder='big')
-        elif root.char is not None:
-            return b'\x02' + root.char.encode('utf-8')
-        else:
-            left_bytes = self.encode_tree(root.left)
-            right_bytes = self.encode_tree(root.right)
-            return b'\x00' + len(left_bytes).to_bytes(4, byteorder='big') + left_bytes + right_bytes
-
     def decode_tree(self, tree_bytes):
         """
-        Decodifica los bytes y reconstruye el árbol de Huffman.
+        Reconstruye el árbol de Huffman de un archivo con el formato original.
+        Recorre los bytes una sola vez, con una pila explícita y sin copiar sub-bloques.
         """
         if not tree_bytes:
             return None
 
-        if tree_bytes[0] == 1:
-            char = int.from_bytes(tree_bytes[1:5], byteorder='big')
-            return HuffmanNode(char)
-        elif tree_bytes[0] == 2:
-            char = tree_bytes[1:].decode('utf-8')
-            return HuffmanNode(char)
-        else:
-            left_size = int.from_bytes(tree_bytes[1:5], byteorder='big')
-            left_tree = self.decode_tree(tree_bytes[5:5 + left_size])
-            right_tree = self.decode_tree(tree_bytes[5 + left_size:])
-            root = HuffmanNode()
-            root.left = left_tree
-            root.right = right_tree
-            return root
+        # Cada nodo interno es 0x00 seguido del tamaño (4 bytes) de su subárbol izquierdo;
+        # las hojas son 0x01 con un entero de 4 bytes o 0x02 con un caracter en UTF-8
+        holder = HuffmanNode()
+        pending = [(holder, 'left')]
+        pos = 0
+
+        while pending and pos < len(tree_bytes):
+            parent, side = pending.pop()
+            if tree_bytes[pos] == 1:
+                node = HuffmanNode(int.from_bytes(tree_bytes[pos + 1:pos + 5], byteorder='big'))
+                pos += 5
+            elif tree_bytes[pos] == 2:
+                size = utf8_length(tree_bytes[pos + 1])
+                node = HuffmanNode(tree_bytes[pos + 1:pos + 1 + size].decode('utf-8'))
+                pos += 1 + size
+            else:
+                node = HuffmanNode()
+                pos += 5
+                pending.append((node, 'right'))
+                pending.append((node, 'left'))
+            setattr(parent, side, node)
+
+        return holder.left
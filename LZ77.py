@@ -0,0 +1,332 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Motor LZ77 + Huffman para el texto: sobre los bytes UTF-8 de cada bloque se buscan
+# coincidencias con cadenas de candidatos y los literales, longitudes y distancias se
+# codifican con el núcleo de Huffman, al estilo de deflate.
+#
+# Formato de un bloque (todos los campos son varints):
+#   tamaño original | tokens | coincidencias
+#   tabla literal/longitud | tabla de distancias (las de Bloques.encode_table)
+#   tamaño del flujo de literales | tamaño del de distancias | literales y longitudes | distancias | bits extra
+# Los bits extra de la longitud y la distancia de cada coincidencia van juntos en su propio
+# flujo para poder leerlos de una vez con operaciones vectorizadas; ocupa el resto del registro.
+#
+# A diferencia de zlib, que encadena en una tabla hash las posiciones anteriores con el mismo
+# hash, las cadenas de candidatos salen de ordenar las posiciones por sus primeros bytes (ver
+# find_matches), porque así se buscan todas a la vez con NumPy.
+import numpy as np
+# Bloques importa este módulo, así que sus funciones se usan a través del módulo
+import Bloques
+from Huffman import TableDecoder, build_code_lengths, canonical_codes, code_tables, pack_bits, read_fields
+from Medicion import NULL_RECORDER
+
+MIN_MATCH = 4
+MAX_MATCH = 258
+WINDOW_SIZE = 1 << 16
+
+# Alfabetos: 256 literales seguidos de los códigos de longitud, y los códigos de distancia
+LITERALS = 256
+LENGTH_CODES = 16
+DISTANCE_CODES = 32
+
+# Longitud máxima de los códigos de ambos alfabetos
+MAX_CODE_LENGTH = 15
+
+# Nivel -> (candidatos revisados por posición, análisis perezoso, longitud suficiente). Una
+# posición deja de buscar en cuanto tiene una coincidencia de la longitud suficiente. Los
+# niveles bajos son más rápidos y los altos comprimen más
+LEVELS = {
+    1: (1, False, 16),
+    2: (2, False, 16),
+    3: (4, False, 32),
+    4: (4, True, 32),
+    5: (8, True, 32),
+    6: (16, True, 64),
+    7: (32, True, 128),
+    8: (64, True, MAX_MATCH),
+    9: (128, True, MAX_MATCH),
+}
+DEFAULT_LEVEL = 6
+
+# Candidatos que se revisan en todas las posiciones; el resto, solo donde empieza una coincidencia
+SCAN_DEPTH = 2
+REFINE_ROUNDS = 2
+
+
+def bucket_codes(values):
+    """
+    Divide valores no negativos en (código, bits extra, valor extra): los valores menores que 4
+    son su propio código y después cada potencia de dos se parte en dos códigos.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    # log2 exacto para valores de hasta 2**53
+    top = np.floor(np.log2(np.maximum(values, 1))).astype(np.int64)
+    extra_bits = np.maximum(top - 1, 0)
+    codes = np.where(values < 4, values, 2 * top + ((values >> extra_bits) & 1))
+    return codes, extra_bits, values & ((np.int64(1) << extra_bits) - 1)
+
+
+def bucket_bases(codes):
+    """
+    Inversa de bucket_codes: devuelve (valor base, bits extra) de cada código.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    extra_bits = np.maximum((codes >> 1) - 1, 0)
+    bases = np.where(codes < 4, codes, (2 | (codes & 1)) << extra_bits)
+    return bases, extra_bits
+
+
+def match_lengths(words, positions, candidates, limits):
+    """
+    Devuelve la longitud común entre cada posición y su candidato, hasta su límite, comparando
+    de 8 en 8 bytes. words tiene una palabra de 64 bits little endian por cada byte de inicio.
+    """
+    # Los primeros MIN_MATCH bytes ya coinciden porque son la clave del grupo
+    lengths = np.full(len(positions), MIN_MATCH, dtype=np.int64)
+    active = np.flatnonzero(lengths < limits)
+    while active.size:
+        difference = words[positions[active] + lengths[active]] ^ words[candidates[active] + lengths[active]]
+        equal = difference == 0
+
+        # El primer byte distinto es el del bit menos significativo encendido
+        different = active[~equal]
+        low_bit = difference[~equal]
+        low_bit &= ~low_bit + np.uint64(1)
+        lengths[different] += np.log2(low_bit.astype(np.float64)).astype(np.int64) >> 3
+
+        active = active[equal]
+        lengths[active] += 8
+        active = active[lengths[active] < limits[active]]
+    return np.minimum(lengths, limits)
+
+
+def find_matches(data, chain_length, nice_length=MAX_MATCH, lazy=False):
+    """
+    Busca para cada posición la coincidencia más larga entre sus chain_length candidatos más
+    cercanos y devuelve (longitudes, distancias); una longitud 0 indica que no hay coincidencia.
+    En lugar de una tabla hash con cadenas se ordenan las posiciones por sus primeros MIN_MATCH
+    bytes: los candidatos de una posición son las anteriores en su mismo grupo, sin colisiones.
+    Como zlib, que solo busca donde está el analizador, todas las posiciones revisan
+    SCAN_DEPTH candidatos y solo aquellas donde el análisis empieza una coincidencia (o la
+    siguiente, con lazy) revisan el resto de la cadena.
+    """
+    size = len(data)
+    best_lengths = np.zeros(size + 1, dtype=np.int64)
+    best_distances = np.zeros(size + 1, dtype=np.int64)
+    starts = size - MIN_MATCH + 1
+    if starts < 2:
+        return best_lengths, best_distances
+
+    buffer = bytes(data) + bytes(8)
+    words = np.ndarray((size,), dtype='<u8', buffer=buffer, strides=(1,))
+    # Ordenar la clave seguida de la posición en 64 bits es varias veces más rápido que un
+    # argsort estable y da el mismo orden: las posiciones de una clave quedan de menor a mayor
+    keyed = (words[:starts] << np.uint64(32)) | np.arange(starts, dtype=np.uint64)
+    keyed.sort()
+    order = (keyed & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    ranks = np.empty(starts, dtype=np.int64)
+    ranks[order] = np.arange(starts)
+    sorted_keys = (keyed >> np.uint64(32)).astype(np.uint32)
+    limits = np.minimum(MAX_MATCH, size - np.arange(size + 1))
+    # Con la longitud suficiente una posición ya no busca, aunque pudiera mejorar
+    targets = np.minimum(nice_length, limits)
+
+    def search(positions, depths):
+        position_ranks = ranks[positions]
+        for depth in depths:
+            # El candidato a esta profundidad es el anterior en el orden, si tiene la misma clave
+            usable = position_ranks >= depth
+            positions = positions[usable]
+            position_ranks = position_ranks[usable]
+            candidate_ranks = position_ranks - depth
+            candidates = order[candidate_ranks]
+            same_key = (sorted_keys[candidate_ranks] == sorted_keys[position_ranks]) & (positions - candidates <= WINDOW_SIZE)
+            # Si el candidato no sirve, tampoco los siguientes, que están más lejos
+            positions = positions[same_key]
+            position_ranks = position_ranks[same_key]
+            candidates = candidates[same_key]
+            if not positions.size:
+                break
+
+            open_positions = best_lengths[positions] < targets[positions]
+            searched = positions[open_positions]
+            lengths = match_lengths(words, searched, candidates[open_positions], limits[searched])
+            # Ante la misma longitud se queda el candidato más cercano, que se revisa primero
+            better = lengths > best_lengths[searched]
+            best_lengths[searched[better]] = lengths[better]
+            best_distances[searched[better]] = searched[better] - candidates[open_positions][better]
+
+    # En el orden de las claves los candidatos de cada posición quedan justo antes
+    search(order, range(1, min(chain_length, SCAN_DEPTH) + 1))
+    if chain_length > SCAN_DEPTH:
+        # Alargar coincidencias cambia el análisis, así que se repite con las posiciones nuevas
+        searched = np.zeros(starts + 1, dtype=bool)
+        for _ in range(REFINE_ROUNDS):
+            chosen, _, _ = parse(best_lengths, best_distances, lazy)
+            pending = np.zeros(starts + 1, dtype=bool)
+            pending[chosen] = True
+            if lazy:
+                pending[chosen + 1] = True
+            pending[searched] = False
+            chosen = np.flatnonzero(pending[:starts])
+            if not chosen.size:
+                break
+            searched |= pending
+            search(chosen, range(SCAN_DEPTH + 1, chain_length + 1))
+
+    return best_lengths, best_distances
+
+
+def parse(best_lengths, best_distances, lazy):
+    """
+    Elige las coincidencias que se emiten, de izquierda a derecha, y devuelve sus posiciones,
+    longitudes y distancias. Con lazy una coincidencia se pospone mientras la de la posición
+    siguiente sea más larga.
+    """
+    candidates = np.flatnonzero(best_lengths >= MIN_MATCH)
+    chosen = candidates
+    if lazy:
+        # Cada candidato avanza hasta la primera posición cuya siguiente no es más larga
+        stops = np.flatnonzero(best_lengths[1:] <= best_lengths[:-1])
+        chosen = stops[np.searchsorted(stops, candidates)]
+    # Siguiente candidato fuera de la coincidencia elegida desde cada uno
+    following = np.searchsorted(candidates, chosen + best_lengths[chosen]).tolist()
+
+    selected = []
+    index = 0
+    while index < len(following):
+        selected.append(index)
+        index = following[index]
+
+    positions = chosen[selected]
+    return positions, best_lengths[positions], best_distances[positions]
+
+
+def huffman_code(symbols, alphabet_size):
+    """
+    Construye el código de Huffman de los símbolos y devuelve (tabla, bytes, bits). La tabla es
+    la de Bloques.encode_table con cada símbolo como punto de código, que se guarda en diferencias.
+    """
+    counts = np.bincount(symbols, minlength=alphabet_size)
+    lengths = build_code_lengths({int(symbol): int(counts[symbol]) for symbol in np.flatnonzero(counts)},
+                                 MAX_CODE_LENGTH)
+    code_values, code_lengths = code_tables(canonical_codes(lengths), alphabet_size)
+    table = Bloques.encode_table({chr(symbol): length for symbol, length in lengths.items()}, Bloques.SYMBOLS_UTF8)
+    return table, pack_bits(code_values[symbols], code_lengths[symbols])
+
+
+def huffman_decode(data, codes, count, symbol_size):
+    """
+    Decodifica count símbolos (de symbol_size bytes, big endian) con los códigos de Bloques.decode_table.
+    """
+    codes = {ord(symbol.decode('utf-8')).to_bytes(symbol_size, byteorder='big'): code for symbol, code in codes.items()}
+    decoded_data = TableDecoder(codes).decode(data) if count else b''
+    # El relleno del último byte puede decodificarse como símbolos de más
+    if len(decoded_data) < count * symbol_size:
+        raise ValueError("Corrupted block: the stream ends before its last symbol.")
+    return np.frombuffer(bytes(decoded_data[:count * symbol_size]), dtype=f'>u{symbol_size}').astype(np.int64)
+
+
+def compress_block(data, level=DEFAULT_LEVEL, recorder=NULL_RECORDER):
+    """
+    Codifica los bytes de un bloque con el nivel dado (de 1 a 9) y devuelve su registro.
+    """
+    chain_length, lazy, nice_length = LEVELS[level]
+    size = len(data)
+    source = np.frombuffer(data, dtype=np.uint8)
+
+    with recorder.stage('match finding', size):
+        best_lengths, best_distances = find_matches(data, chain_length, nice_length, lazy)
+
+    with recorder.stage('parsing', size):
+        positions, lengths, distances = parse(best_lengths, best_distances, lazy)
+        # Marca los bytes cubiertos por coincidencias; cada token empieza en un literal o una coincidencia
+        delta = np.zeros(size + 1, dtype=np.int64)
+        delta[positions] += 1
+        delta[positions + lengths] -= 1
+        starts = np.cumsum(delta[:size]) == 0
+        starts[positions] = True
+        token_positions = np.flatnonzero(starts)
+
+        length_codes, length_extra_bits, length_extra = bucket_codes(lengths - MIN_MATCH)
+        distance_codes, distance_extra_bits, distance_extra = bucket_codes(distances - 1)
+        symbols = source[token_positions].astype(np.int64)
+        symbols[np.searchsorted(token_positions, positions)] = LITERALS + length_codes
+
+    with recorder.stage('bit packing', size) as stage:
+        literal_table, (literal_stream, _) = huffman_code(symbols, LITERALS + LENGTH_CODES)
+        distance_table, (distance_stream, _) = huffman_code(distance_codes, DISTANCE_CODES)
+        extra_stream, _ = pack_bits(np.stack((length_extra, distance_extra), axis=1).ravel().astype(np.uint64),
+                                    np.stack((length_extra_bits, distance_extra_bits), axis=1).ravel())
+        record = b''.join((
+            Bloques.encode_varint(size),
+            Bloques.encode_varint(len(symbols)),
+            Bloques.encode_varint(len(positions)),
+            literal_table,
+            distance_table,
+            Bloques.encode_varint(len(literal_stream)),
+            Bloques.encode_varint(len(distance_stream)),
+            literal_stream,
+            distance_stream,
+            extra_stream,
+        ))
+        stage.bytes_out = len(record)
+    return record
+
+
+def decompress_block(record, recorder=NULL_RECORDER):
+    """
+    Decodifica el registro de un bloque y devuelve sus bytes originales.
+    """
+    record = memoryview(record)
+    original_size, pos = Bloques.decode_varint(record, 0)
+    token_count, pos = Bloques.decode_varint(record, pos)
+    match_count, pos = Bloques.decode_varint(record, pos)
+    literal_codebook, pos = Bloques.decode_table(record, Bloques.SYMBOLS_UTF8, pos)
+    distance_codebook, pos = Bloques.decode_table(record, Bloques.SYMBOLS_UTF8, pos)
+    literal_size, pos = Bloques.decode_varint(record, pos)
+    distance_size, pos = Bloques.decode_varint(record, pos)
+    streams = [record[pos:pos + literal_size], record[pos + literal_size:pos + literal_size + distance_size],
+               record[pos + literal_size + distance_size:]]
+
+    with recorder.stage('bit unpacking', len(record)) as stage:
+        symbols = huffman_decode(streams[0], literal_codebook, token_count, 2)
+        is_match = symbols >= LITERALS
+        if int(is_match.sum()) != match_count:
+            raise ValueError("Corrupted block: the number of matches does not match the stored count.")
+        distance_codes = huffman_decode(streams[1], distance_codebook, match_count, 1)
+
+        length_bases, length_extra_bits = bucket_bases(symbols[is_match] - LITERALS)
+        distance_bases, distance_extra_bits = bucket_bases(distance_codes)
+        extra = read_fields(streams[2], np.stack((length_extra_bits, distance_extra_bits), axis=1).ravel()).reshape(-1, 2)
+        lengths = length_bases + extra[:, 0] + MIN_MATCH
+        distances = distance_bases + extra[:, 1] + 1
+
+        literals = symbols[~is_match].astype(np.uint8).tobytes()
+        # Literales anteriores a cada coincidencia
+        literals_before = np.flatnonzero(is_match) - np.arange(match_count)
+        stage.bytes_out = len(literals)
+
+    with recorder.stage('copy', len(literals)) as stage:
+        out = bytearray()
+        literal_pos = 0
+        for literal_end, length, distance in zip(literals_before.tolist(), lengths.tolist(), distances.tolist()):
+            out += literals[literal_pos:literal_end]
+            literal_pos = literal_end
+            start = len(out) - distance
+            if start < 0:
+                raise ValueError("Corrupted block: a match points before the start of the block.")
+            if distance >= length:
+                out += out[start:start + length]
+            else:
+                # La coincidencia se solapa consigo misma: repite el patrón de distance bytes
+                out += (out[start:] * (length // distance + 1))[:length]
+        out += literals[literal_pos:]
+        stage.bytes_out = len(out)
+
+    if len(out) != original_size:
+        raise ValueError("Corrupted block: decoded size does not match the stored size.")
+    return bytes(out)
@@ -0,0 +1,197 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Instrumentación por etapas: cada codificador marca sus etapas (lectura, mapa de frecuencias,
+# árbol, empaquetado, escritura...) con recorder.stage(nombre) y el registrador anota el tiempo,
+# los bytes de entrada y salida y la memoria máxima. El registrador por defecto no hace nada.
+from contextlib import contextmanager
+import cProfile
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows no tiene resource; ahí el pico de memoria solo se mide con tracemalloc
+    resource = None
+
+
+# Marca el final de un iterador medido
+_END = object()
+
+
+def peak_rss():
+    """
+    Devuelve el pico de memoria residente del proceso en bytes, o 0 si no se puede medir.
+    """
+    # En Linux, ru_maxrss conserva tras exec el pico del proceso padre; VmHWM empieza de cero
+    try:
+        with open('/proc/self/status', 'rb') as status:
+            for line in status:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo da en bytes y Linux en kilobytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Stage:
+    """
+    Medición de una etapa: segundos, bytes de entrada y salida y pico de memoria en bytes.
+    """
+
+    def __init__(self, name, seconds=0.0, bytes_in=0, bytes_out=0, peak_memory=0):
+        self.name = name
+        self.seconds = seconds
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.peak_memory = peak_memory
+
+
+class NullRecorder:
+    """
+    Registrador que no anota nada; es el valor por defecto de todos los codificadores.
+    """
+    # Sin opciones, los procesos de trabajo tampoco miden nada
+    options = None
+    stages = ()
+
+    def __init__(self):
+        self._stage = Stage('')
+
+    @contextmanager
+    def stage(self, name, bytes_in=0):
+        yield self._stage
+
+    def iterate(self, name, iterable, size=None):
+        return iterable
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0, peak_memory=0):
+        pass
+
+    def merge(self, stages):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+
+
+class StageRecorder:
+    """
+    Registrador que guarda cada etapa. El pico de memoria es el de memoria residente del proceso
+    al terminar la etapa. Con trace_memory se mide en su lugar el pico de Python (incluidos los
+    arrays de numpy) durante la etapa con tracemalloc, que es más preciso pero mucho más lento.
+    En ambos casos es del proceso entero, así que con varios trabajos a la vez se mezclan.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @property
+    def options(self):
+        """
+        Opciones con las que los procesos de trabajo crean su propio registrador.
+        """
+        return {'trace_memory': self.trace_memory}
+
+    @contextmanager
+    def stage(self, name, bytes_in=0):
+        """
+        Mide el bloque with como la etapa name; bytes_out se puede fijar sobre la etapa devuelta.
+        """
+        stage = Stage(name, bytes_in=bytes_in)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            stage.peak_memory = tracemalloc.get_traced_memory()[1] if self.trace_memory else peak_rss()
+            self.stages.append(stage)
+
+    def iterate(self, name, iterable, size=None):
+        """
+        Recorre iterable midiendo como etapa name la obtención de cada elemento, por ejemplo la
+        lectura de un generador de bloques; size(elemento) da los bytes producidos.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stage:
+                item = next(iterator, _END)
+                if item is not _END and size is not None:
+                    stage.bytes_out = size(item)
+            if item is _END:
+                return
+            yield item
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0, peak_memory=0):
+        """
+        Anota una etapa medida en otra parte, por ejemplo en un proceso de trabajo.
+        """
+        self.stages.append(Stage(name, seconds, bytes_in, bytes_out, peak_memory))
+
+    def merge(self, stages):
+        self.stages.extend(stages)
+
+    def summary(self):
+        """
+        Agrupa las etapas por nombre, en orden de aparición: suma tiempos y bytes y toma el mayor pico.
+        """
+        totals = {}
+        for stage in self.stages:
+            total = totals.setdefault(stage.name, Stage(stage.name))
+            total.seconds += stage.seconds
+            total.bytes_in += stage.bytes_in
+            total.bytes_out += stage.bytes_out
+            total.peak_memory = max(total.peak_memory, stage.peak_memory)
+        return list(totals.values())
+
+    def report(self):
+        """
+        Devuelve una tabla de texto con el resumen por etapa.
+        """
+        lines = [f"{'stage':<20}{'seconds':>10}{'MB in':>10}{'MB out':>10}{'MB/s':>10}{'peak MB':>10}"]
+        for stage in self.summary():
+            speed = max(stage.bytes_in, stage.bytes_out) / 1e6 / stage.seconds if stage.seconds else 0
+            lines.append(f"{stage.name:<20}{stage.seconds:>10.3f}{stage.bytes_in / 1e6:>10.2f}"
+                         f"{stage.bytes_out / 1e6:>10.2f}{speed:>10.2f}{stage.peak_memory / 1e6:>10.1f}")
+        return '\n'.join(lines)
+
+
+def worker_recorder(options):
+    """
+    Registrador para un proceso de trabajo a partir de las opciones del principal (None si no
+    se mide nada); sus etapas se devuelven y se mezclan en el registrador principal.
+    """
+    return StageRecorder(**options) if options is not None else NULL_RECORDER
+
+
+@contextmanager
+def profiled(profile_file=None):
+    """
+    Si se indica profile_file, perfila el bloque with con cProfile y guarda las estadísticas ahí
+    (se leen con pstats o snakeviz). Sin archivo no hace nada.
+    """
+    if not profile_file:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
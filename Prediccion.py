@@ -0,0 +1,100 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Etapa de predicción para imágenes con los filtros de PNG (None, Sub, Up, Average y Paeth).
+# Cada fila usa el filtro que deja los residuos más pequeños; los residuos, con mucha menos
+# entropía que los píxeles, son los que se codifican después con Huffman.
+import numpy as np
+
+FILTER_NONE = 0
+FILTER_SUB = 1
+FILTER_UP = 2
+FILTER_AVERAGE = 3
+FILTER_PAETH = 4
+
+# Filas que se filtran a la vez; acota la memoria temporal en imágenes grandes
+BAND_ROWS = 256
+
+
+def _as_channels(img_data):
+    # Trabaja siempre con forma (alto, ancho, canales)
+    return img_data.reshape(img_data.shape[0], img_data.shape[1], -1)
+
+
+def _paeth(left, up, up_left):
+    estimate = left + up - up_left
+    distance_left = np.abs(estimate - left)
+    distance_up = np.abs(estimate - up)
+    distance_up_left = np.abs(estimate - up_left)
+    return np.where((distance_left <= distance_up) & (distance_left <= distance_up_left), left,
+                    np.where(distance_up <= distance_up_left, up, up_left))
+
+
+def _predictions(left, up, up_left):
+    # Predicción de cada filtro, en el orden de sus identificadores
+    return (np.zeros_like(left), left, up, (left + up) >> 1, _paeth(left, up, up_left))
+
+
+def filter_image(img_data):
+    """
+    Filtra una imagen de 8 bits y devuelve (filtro de cada fila, residuos con la forma original).
+    """
+    pixels = _as_channels(img_data)
+    height, width, channels = pixels.shape
+    filter_types = np.zeros(height, dtype=np.uint8)
+    residuals = np.empty_like(pixels)
+
+    for start in range(0, height, BAND_ROWS):
+        band = pixels[start:start + BAND_ROWS].astype(np.int16)
+        previous_row = pixels[start - 1:start].astype(np.int16) if start else np.zeros((1, width, channels), dtype=np.int16)
+
+        # Vecinos izquierdo, superior y superior izquierdo, con ceros fuera de la imagen
+        up = np.concatenate((previous_row, band[:-1]))
+        left = np.zeros_like(band)
+        left[:, 1:] = band[:, :-1]
+        up_left = np.zeros_like(band)
+        up_left[:, 1:] = up[:, :-1]
+
+        candidates = np.stack([(band - prediction) & 0xFF for prediction in _predictions(left, up, up_left)])
+
+        # Heurística de PNG: suma mínima de los residuos interpretados con signo
+        scores = np.minimum(candidates, 256 - candidates).sum(axis=(2, 3))
+        best = np.argmin(scores, axis=0)
+        rows = np.arange(len(band))
+        filter_types[start:start + len(band)] = best
+        residuals[start:start + len(band)] = candidates[best, rows]
+
+    return filter_types, residuals.reshape(img_data.shape)
+
+
+def unfilter_image(filter_types, residuals):
+    """
+    Invierte filter_image. Cada píxel depende de sus vecinos ya reconstruidos, así que se
+    recorren las antidiagonales: todos los píxeles de una antidiagonal se calculan a la vez.
+    """
+    values = _as_channels(residuals)
+    height, width, channels = values.shape
+
+    # Copia con una fila y una columna de ceros al principio para los vecinos fuera de la imagen
+    padded = np.zeros((height + 1, width + 1, channels), dtype=np.int16)
+    filter_types = np.asarray(filter_types)
+
+    for diagonal in range(height + width - 1):
+        rows = np.arange(max(0, diagonal - width + 1), min(height, diagonal + 1))
+        columns = diagonal - rows
+
+        left = padded[rows + 1, columns]
+        up = padded[rows, columns + 1]
+        up_left = padded[rows, columns]
+        predictions = _predictions(left, up, up_left)
+        types = filter_types[rows][:, None]
+
+        prediction = predictions[FILTER_NONE]
+        for filter_type in (FILTER_SUB, FILTER_UP, FILTER_AVERAGE, FILTER_PAETH):
+            prediction = np.where(types == filter_type, predictions[filter_type], prediction)
+
+        padded[rows + 1, columns + 1] = (values[rows, columns] + prediction) & 0xFF
+
+    return padded[1:, 1:].astype(np.uint8).reshape(residuals.shape)
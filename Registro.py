@@ -0,0 +1,94 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Correspondencia entre extensiones y codificadores, compartida por la interfaz gráfica y la consola.
+# Los módulos de cada códec se importan la primera vez que se usan, así que arrancar no carga
+# moviepy, numpy, PIL ni bitarray.
+import importlib
+import os
+from Medicion import profiled
+
+
+# Extensión del archivo original -> (módulo, clase del codificador, extensión del archivo comprimido)
+COMPRESSORS = {
+    '.txt': ('Texto', 'TextHuffmanEncoder', '.txt.bin'),
+    '.bmp': ('Imagenes', 'ImageHuffmanEncoder', '.bmp.bin'),
+    '.wav': ('Audio', 'AudioCompressor', '.wav'),
+    '.mp4': ('Video', 'VideoCompressor', '.mp4'),
+}
+
+# Extensión del archivo comprimido -> (módulo, clase del codificador, extensión del archivo descomprimido)
+DECOMPRESSORS = {
+    '.txt.bin': ('Texto', 'TextHuffmanEncoder', '.txt'),
+    '.bmp.bin': ('Imagenes', 'ImageHuffmanEncoder', '.bmp'),
+    '.wav': ('Audio', 'AudioCompressor', '.wav'),
+    '.mp4': ('Video', 'VideoCompressor', '.mp4'),
+}
+
+
+def find_entry(table, path):
+    """
+    Devuelve la entrada de la tabla cuya extensión coincide con el final de la ruta, o None.
+    """
+    name = path.lower()
+    for extension, entry in table.items():
+        if name.endswith(extension):
+            return entry
+    return None
+
+
+def load_encoder(entry):
+    """
+    Importa el módulo de la entrada (solo la primera vez) y devuelve la clase del codificador.
+    """
+    module_name, class_name, _ = entry
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def compress_path(input_file, output_folder, progress_callback=None, profile_file=None, cache=None, **options):
+    """
+    Comprime un archivo con el codificador de su extensión y devuelve la ruta del resultado.
+    Las opciones se pasan al constructor del codificador (por ejemplo recorder, para medir las
+    etapas) y progress_callback, que recibe el porcentaje completado, a su método. Con
+    profile_file el trabajo se perfila con cProfile y las estadísticas se guardan ahí. Con
+    cache (un Cache.ResultCache) se reutiliza el resultado si el archivo ya se comprimió igual.
+    """
+    entry = find_entry(COMPRESSORS, input_file)
+    if entry is None:
+        raise ValueError("Unsupported file type. Please select a .txt, .bmp, .wav, or .mp4 file.")
+    compressed_file_extension = entry[2]
+
+    def compress():
+        with profiled(profile_file):
+            output_file = load_encoder(entry)(**options).compress_file(input_file, output_folder, progress_callback)
+        compressed_file_path = os.path.splitext(output_file)[0] + compressed_file_extension
+        os.replace(output_file, compressed_file_path)
+        return compressed_file_path
+
+    if cache is None:
+        return compress()
+    return cache.run('compress', entry, options, input_file, output_folder, compress, progress_callback)
+
+
+def decompress_path(input_file, output_folder, progress_callback=None, profile_file=None, cache=None, **options):
+    """
+    Descomprime un archivo con el codificador de su extensión y devuelve la ruta del resultado.
+    Las opciones, profile_file y cache se tratan como en compress_path.
+    """
+    entry = find_entry(DECOMPRESSORS, input_file)
+    if entry is None:
+        raise ValueError("Unsupported file type. Please select a .bin or .wav file.")
+    original_file_extension = entry[2]
+
+    def decompress():
+        with profiled(profile_file):
+            output_file = load_encoder(entry)(**options).decompress_file(input_file, output_folder, progress_callback)
+        decompressed_file_path = output_file + original_file_extension
+        os.replace(output_file, decompressed_file_path)
+        return decompressed_file_path
+
+    if cache is None:
+        return decompress()
+    return cache.run('decompress', entry, options, input_file, output_folder, decompress, progress_callback)
@@ -0,0 +1,140 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Remuestreo de audio por un factor racional up/down con un filtro FIR polifásico.
+# Las muestras se manejan con forma (frames, canales) para no mezclar los canales
+# intercalados, y el filtro conserva su estado entre bloques para trabajar en streaming.
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Cruces por cero del sinc a cada lado del centro; más cruces dan un corte más abrupto
+ZERO_CROSSINGS = 16
+
+# Parámetro beta de la ventana de Kaiser (atenuación de unos 80 dB en la banda de rechazo)
+KAISER_BETA = 8.0
+
+
+def read_samples(frames, sample_width, channels):
+    """
+    Convierte los bytes de un bloque WAV en un array float64 con forma (frames, canales).
+    Admite muestras de 8 (sin signo), 16, 24 y 32 bits.
+    """
+    if sample_width == 1:
+        samples = np.frombuffer(frames, dtype=np.uint8).astype(np.float64) - 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float64)
+    elif sample_width == 3:
+        # Cada muestra de 3 bytes se coloca en los bytes altos de un entero de 32 bits
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = (padded.view('<i4').ravel() >> 8).astype(np.float64)
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float64)
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes.")
+    return samples.reshape(-1, channels)
+
+
+def write_samples(samples, sample_width):
+    """
+    Convierte un array (frames, canales) en los bytes de un bloque WAV, redondeando y
+    recortando al rango de la muestra.
+    """
+    bits = 8 * sample_width
+    samples = np.clip(np.rint(samples), -(1 << (bits - 1)), (1 << (bits - 1)) - 1).ravel()
+
+    if sample_width == 1:
+        return (samples + 128).astype(np.uint8).tobytes()
+    if sample_width == 2:
+        return samples.astype('<i2').tobytes()
+    if sample_width == 3:
+        return samples.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    if sample_width == 4:
+        return samples.astype('<i4').tobytes()
+    raise ValueError(f"Unsupported sample width: {sample_width} bytes.")
+
+
+def design_filter(up, down, zero_crossings=ZERO_CROSSINGS, beta=KAISER_BETA):
+    """
+    Diseña el filtro paso bajas (sinc con ventana de Kaiser) a la frecuencia sobremuestreada
+    por up y lo devuelve separado en fases: un array (up, taps por fase).
+    """
+    ratio = max(up, down)
+    half_length = zero_crossings * ratio
+    taps = np.arange(-half_length, half_length + 1)
+    coefficients = np.sinc(taps / ratio) * np.kaiser(len(taps), beta)
+
+    # Ganancia up para compensar los ceros que se intercalan al sobremuestrear
+    coefficients *= up / coefficients.sum()
+
+    # Completa con ceros hasta un múltiplo de up; la fase p usa los coeficientes p, p + up, ...
+    taps_per_phase = -(-len(coefficients) // up)
+    coefficients = np.concatenate((coefficients, np.zeros(taps_per_phase * up - len(coefficients))))
+    return coefficients.reshape(taps_per_phase, up).T.copy(), half_length
+
+
+class PolyphaseResampler:
+    def __init__(self, up, down, channels, zero_crossings=ZERO_CROSSINGS):
+        # Remuestrea por up/down; el estado (últimas muestras de entrada y número de muestras
+        # leídas y producidas) pasa de un bloque al siguiente
+        divisor = np.gcd(up, down)
+        self.up = up // divisor
+        self.down = down // divisor
+        self.channels = channels
+        self.phases, self.delay = design_filter(self.up, self.down, zero_crossings)
+        self.taps_per_phase = self.phases.shape[1]
+
+        # Historia de la entrada; antes del inicio la señal vale cero
+        self.history = np.zeros((self.taps_per_phase - 1, channels))
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def output_length(self):
+        """
+        Número total de muestras de salida correspondiente a la entrada recibida hasta ahora.
+        """
+        return -(-self.samples_in * self.up // self.down)
+
+    def process(self, samples, limit=None):
+        """
+        Filtra un bloque (frames, canales) y devuelve todas las muestras de salida que ya
+        pueden calcularse con la entrada recibida.
+        """
+        buffer = np.concatenate((self.history, samples))
+        start = self.samples_in - len(self.history)  # Índice global de buffer[0]
+        if limit is None:
+            self.samples_in += len(samples)
+            available = self.samples_in
+        else:
+            available = self.samples_in + len(samples)
+
+        # La salida n toma la entrada (n * down + delay) // up con la fase (n * down + delay) % up;
+        # se produce cuando esa entrada ya está en el búfer
+        end = max(self.samples_out, -(-(available * self.up - self.delay) // self.down))
+        if limit is not None:
+            end = min(end, limit)
+        output = np.empty((max(end - self.samples_out, 0), self.channels))
+        windows = sliding_window_view(buffer, self.taps_per_phase, axis=0)
+
+        # Las salidas n, n + up, n + 2 up, ... comparten fase y avanzan down muestras de entrada,
+        # así que cada fase es un producto de ventanas equiespaciadas por sus coeficientes
+        for offset in range(min(self.up, len(output))):
+            position = (self.samples_out + offset) * self.down + self.delay
+            first = position // self.up - start - (self.taps_per_phase - 1)
+            count = len(range(offset, len(output), self.up))
+            selected = windows[first:first + (count - 1) * self.down + 1:self.down]
+            output[offset::self.up] = selected @ self.phases[position % self.up, ::-1]
+
+        self.samples_out = end
+        self.history = buffer[len(buffer) - len(self.history):]
+        return output
+
+    def flush(self):
+        """
+        Devuelve las últimas muestras de salida, completando la entrada con ceros.
+        """
+        padding = np.zeros((self.delay // self.up + 1, self.channels))
+        return self.process(padding, limit=self.output_length())
@@ -0,0 +1,431 @@
+"""
+@author: Christopher Oswaldo Márquez Reyes
+@author: Valeria Marian Andrade Monreal
+"""
+
+# Pruebas de rendimiento: genera corpus sintéticos deterministas (sin red), comprime y
+# descomprime cada uno en un proceso nuevo y muestra MB/s, razón de compresión y pico de
+# memoria. Con una línea base guardada, falla si el rendimiento cae más del umbral. La línea
+# base depende de la máquina, así que no se incluye: cada máquina guarda la suya.
+#
+#   python Rendimiento.py [--scale factor] [--repeat n] [--only nombre ...]
+#   python Rendimiento.py --save-baseline            guarda los resultados como línea base
+#   python Rendimiento.py --baseline archivo.json    compara con otra línea base
+#   python Rendimiento.py --check                    falla también si no hay línea base comparable
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import filecmp
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+import zlib
+import numpy as np
+
+
+# Semilla de todos los corpus; cada caso deriva la suya de su nombre
+SEED = 2024
+
+# Caída relativa de MB/s que se tolera respecto a la línea base
+THRESHOLD = 0.2
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Rendimiento.json')
+
+# Tamaños de los corpus con scale = 1
+TEXT_SIZE = 1 << 21
+IMAGE_SIDE = 1024
+AUDIO_SECONDS = 10
+VIDEO_SECONDS = 4
+FRAMERATE = 44100
+
+# Alfabetos del texto multilingüe: latino con acentos, griego, cirílico, ideogramas CJK y emojis
+SCRIPTS = (
+    'abcdefghijklmnopqrstuvwxyzáéíóúñü',
+    'αβγδεζηθικλμνξοπρστυφχψω',
+    'абвгдежзийклмнопрстуфхцчшщыьэюя',
+    ''.join(chr(code) for code in range(0x4E00, 0x4E00 + 400)),
+    '😀😂😍🎉🚀🌍🔥✨',
+)
+
+
+def vocabulary(rng, alphabet, words, max_length):
+    """
+    Devuelve words palabras aleatorias del alfabeto y pesos de Zipf para elegirlas.
+    """
+    letters = np.array(list(alphabet))
+    lengths = rng.integers(1, max_length + 1, size=words)
+    vocabulary = [''.join(rng.choice(letters, size=length)) for length in lengths]
+    weights = 1 / np.arange(1, words + 1)
+    return vocabulary, weights / weights.sum()
+
+
+def write_text(path, text, size):
+    # Se recorta a size bytes sin partir ningún caracter
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write(text.encode('utf-8')[:size].decode('utf-8', errors='ignore'))
+
+
+def words_to_text(rng, words):
+    # Una línea cada doce palabras, en promedio
+    separators = np.where(rng.random(len(words)) < 1 / 12, '\n', ' ')
+    return ''.join(word + separator for word, separator in zip(words, separators))
+
+
+def ascii_text(path, scale, rng):
+    size = int(TEXT_SIZE * scale)
+    words, weights = vocabulary(rng, 'abcdefghijklmnopqrstuvwxyz', 2000, 10)
+    chosen = rng.choice(len(words), size=size // 5, p=weights)
+    write_text(path, words_to_text(rng, [words[index] for index in chosen]), size)
+
+
+def multilingual_text(path, scale, rng):
+    size = int(TEXT_SIZE * scale)
+    lines = []
+    length = 0
+    vocabularies = [vocabulary(rng, alphabet, 500, 8) for alphabet in SCRIPTS]
+    while length < size:
+        # Cada línea está en un solo alfabeto, como en un documento real
+        words, weights = vocabularies[rng.integers(len(SCRIPTS))]
+        chosen = rng.choice(len(words), size=rng.integers(5, 20), p=weights)
+        line = ' '.join(words[index] for index in chosen) + '\n'
+        lines.append(line)
+        length += len(line.encode('utf-8'))
+    write_text(path, ''.join(lines), size)
+
+
+def cjk_text(path, scale, rng):
+    # Ideogramas CJK sueltos con frecuencias de Zipf: Huffman por caracteres gana a zlib, que
+    # casi no encuentra repeticiones largas
+    size = int(TEXT_SIZE * scale)
+    characters = np.array([chr(code) for code in range(0x4E00, 0x4E00 + 3000)] + ['\n'])
+    weights = 1 / np.arange(1, len(characters) + 1)
+    weights[-1] = weights[:-1].sum() / 40
+    write_text(path, ''.join(rng.choice(characters, size=size // 3, p=weights / weights.sum())), size)
+
+
+def log_text(path, scale, rng):
+    # Registro de servidor: plantillas fijas con horas, niveles, rutas y números variables
+    size = int(TEXT_SIZE * scale)
+    levels = ('INFO', 'INFO', 'INFO', 'DEBUG', 'WARN', 'ERROR')
+    paths = [f"/api/v1/{name}/{number}" for name in ('users', 'orders', 'items', 'search') for number in range(50)]
+    templates = (
+        "{level} [worker-{worker}] GET {path} 200 {millis} ms",
+        "{level} [worker-{worker}] POST {path} 201 {millis} ms user={user}",
+        "{level} [scheduler] job {user} finished in {millis} ms",
+        "{level} [db] slow query on {path}: {millis} ms",
+    )
+    lines = []
+    length = 0
+    second = 0
+    while length < size:
+        second += int(rng.integers(0, 3))
+        line = f"2024-03-{1 + second // 86400:02d} {second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d} " + \
+            templates[rng.integers(len(templates))].format(
+                level=levels[rng.integers(len(levels))], worker=rng.integers(16), path=paths[rng.integers(len(paths))],
+                millis=rng.integers(1, 5000), user=rng.integers(100000)) + '\n'
+        lines.append(line)
+        length += len(line)
+    write_text(path, ''.join(lines), size)
+
+
+def noisy_bmp(path, scale, rng):
+    from PIL import Image
+
+    side = max(int(IMAGE_SIDE * scale ** 0.5), 8)
+    Image.fromarray(rng.integers(0, 256, size=(side, side, 3), dtype=np.uint8)).save(path, format='BMP')
+
+
+def flat_bmp(path, scale, rng):
+    from PIL import Image
+
+    side = max(int(IMAGE_SIDE * scale ** 0.5), 8)
+    # Degradado suave con rectángulos de color uniforme encima
+    rows, columns = np.mgrid[0:side, 0:side]
+    pixels = np.stack([rows * 255 // side, columns * 255 // side, (rows + columns) * 127 // side], axis=-1)
+    for _ in range(20):
+        top, left = rng.integers(0, side, size=2)
+        height, width = rng.integers(side // 16, side // 4, size=2)
+        pixels[top:top + height, left:left + width] = rng.integers(0, 256, size=3)
+    Image.fromarray(pixels.astype(np.uint8)).save(path, format='BMP')
+
+
+def wave_corpus(path, scale, rng, channels, sample_width):
+    from Remuestreo import write_samples
+
+    frames = int(AUDIO_SECONDS * FRAMERATE * scale)
+    times = np.arange(frames) / FRAMERATE
+    # Varios tonos distintos por canal con un poco de ruido, a -6 dB del máximo
+    signal = np.zeros((frames, channels))
+    for channel in range(channels):
+        for frequency in rng.uniform(100, 4000, size=3):
+            signal[:, channel] += np.sin(2 * np.pi * frequency * times + rng.uniform(0, 2 * np.pi)) / 4
+    signal += rng.normal(0, 0.01, size=signal.shape)
+    full_scale = (1 << (8 * sample_width - 1)) - 1
+
+    with wave.open(path, 'wb') as wave_file:
+        wave_file.setnchannels(channels)
+        wave_file.setsampwidth(sample_width)
+        wave_file.setframerate(FRAMERATE)
+        wave_file.writeframes(write_samples(signal * full_scale, sample_width))
+
+
+def find_ffmpeg():
+    """
+    Devuelve la ruta del ffmpeg que usa moviepy, o None si no está disponible.
+    """
+    try:
+        from Video import ffmpeg_binary
+        binary = ffmpeg_binary()
+        subprocess.run([binary, '-version'], check=True, capture_output=True)
+        return binary
+    except (ImportError, OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_mp4(path, scale, rng):
+    duration = max(VIDEO_SECONDS * scale, 1)
+    subprocess.run([find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'lavfi', '-i', f'testsrc2=size=320x240:rate=25:duration={duration}',
+                    '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+                    '-c:v', 'libx264', '-b:v', '300k', '-threads', '1', '-c:a', 'aac', '-shortest', path],
+                   check=True, capture_output=True)
+
+
+# (nombre, extensión, generador, opciones del codificador, si el resultado debe ser idéntico)
+CASES = (
+    ('text-ascii', '.txt', ascii_text, {}, True),
+    ('text-multilingual', '.txt', multilingual_text, {}, True),
+    ('text-multilingual-auto', '.txt', multilingual_text, {'engine': 'auto'}, True),
+    ('text-cjk', '.txt', cjk_text, {}, True),
+    ('text-cjk-auto', '.txt', cjk_text, {'engine': 'auto'}, True),
+    ('text-log', '.txt', log_text, {}, True),
+    ('text-log-lz77', '.txt', log_text, {'level': 6}, True),
+    ('text-log-auto', '.txt', log_text, {'engine': 'auto'}, True),
+    ('bmp-noisy', '.bmp', noisy_bmp, {}, True),
+    ('bmp-noisy-auto', '.bmp', noisy_bmp, {'engine': 'auto'}, True),
+    ('bmp-flat', '.bmp', flat_bmp, {}, True),
+    ('bmp-flat-prediction', '.bmp', flat_bmp, {'prediction': True}, True),
+    ('wav-mono-8', '.wav', functools.partial(wave_corpus, channels=1, sample_width=1), {'lossless': True}, True),
+    ('wav-mono-16', '.wav', functools.partial(wave_corpus, channels=1, sample_width=2), {'lossless': True}, True),
+    ('wav-stereo-16', '.wav', functools.partial(wave_corpus, channels=2, sample_width=2), {'lossless': True}, True),
+    ('wav-stereo-24', '.wav', functools.partial(wave_corpus, channels=2, sample_width=3), {'lossless': True}, True),
+    ('wav-stereo-16-resample', '.wav', functools.partial(wave_corpus, channels=2, sample_width=2), {}, False),
+    ('mp4-synthetic', '.mp4', synthetic_mp4, {}, False),
+)
+
+
+def generate_corpus(case, folder, scale):
+    """
+    Escribe el archivo del caso en la carpeta (si no existe ya) y devuelve su ruta.
+    """
+    name, extension, generator, _, _ = case
+    path = os.path.join(folder, f"{name}-x{scale:g}{extension}")
+    if not os.path.exists(path):
+        generator(path, scale, np.random.default_rng([SEED, zlib.crc32(name.encode('utf-8'))]))
+    return path
+
+
+def same_content(original, restored):
+    """
+    Compara el original con el resultado: las imágenes por sus píxeles y el resto byte a byte.
+    """
+    if original.lower().endswith('.bmp'):
+        from PIL import Image
+        with Image.open(original) as first, Image.open(restored) as second:
+            return np.array_equal(np.array(first), np.array(second))
+    return filecmp.cmp(original, restored, shallow=False)
+
+
+def run_case(task):
+    """
+    Se ejecuta en un proceso nuevo: comprime y descomprime el corpus repeat veces y devuelve
+    el mejor tiempo de cada operación, los tamaños, el pico de memoria y la verificación.
+    """
+    name, corpus_file, options, lossless, repeat = task
+    from Medicion import peak_rss
+    from Registro import COMPRESSORS, compress_path, decompress_path, find_entry, load_encoder
+
+    # El módulo del códec se importa antes de medir para no contar su carga
+    load_encoder(find_entry(COMPRESSORS, corpus_file))
+    compress_times, decompress_times = [], []
+    with tempfile.TemporaryDirectory() as folder:
+        for attempt in range(repeat):
+            compressed_folder = os.path.join(folder, f"compressed{attempt}")
+            restored_folder = os.path.join(folder, f"restored{attempt}")
+            os.makedirs(compressed_folder)
+            os.makedirs(restored_folder)
+
+            start = time.perf_counter()
+            compressed_file = compress_path(corpus_file, compressed_folder, **options)
+            compress_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            restored_file = decompress_path(compressed_file, restored_folder, **options)
+            decompress_times.append(time.perf_counter() - start)
+
+        size = os.path.getsize(corpus_file)
+        compressed_size = os.path.getsize(compressed_file)
+        verified = same_content(corpus_file, restored_file) if lossless else None
+
+    return {
+        'name': name,
+        'size': size,
+        'compressed_size': compressed_size,
+        'ratio': compressed_size / size,
+        'compress_mbps': size / 1e6 / min(compress_times),
+        'decompress_mbps': size / 1e6 / min(decompress_times),
+        'peak_rss': peak_rss(),
+        'verified': verified,
+    }
+
+
+def run_isolated(task):
+    """
+    Ejecuta un caso en un intérprete nuevo para que el pico de memoria sea solo el suyo.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_case, task).result()
+
+
+def print_header():
+    print(f"{'case':<24}{'MB':>8}{'ratio':>8}{'comp MB/s':>11}{'decomp MB/s':>13}{'peak MB':>9}  check")
+
+
+def print_result(result):
+    check = {True: 'ok', False: 'MISMATCH', None: '-'}[result['verified']]
+    print(f"{result['name']:<24}{result['size'] / 1e6:>8.2f}{result['ratio']:>8.3f}"
+          f"{result['compress_mbps']:>11.2f}{result['decompress_mbps']:>13.2f}{result['peak_rss'] / 1e6:>9.1f}  {check}")
+
+
+def compare(results, baseline, threshold):
+    """
+    Devuelve los mensajes de los casos cuyo MB/s cayó más del umbral respecto a la línea base.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result['name'])
+        if reference is None:
+            continue
+        for key in ('compress_mbps', 'decompress_mbps'):
+            if result[key] < reference[key] * (1 - threshold):
+                regressions.append(f"{result['name']} {key}: {result[key]:.2f} MB/s, "
+                                   f"baseline {reference[key]:.2f} MB/s (-{1 - result[key] / reference[key]:.0%})")
+    return regressions
+
+
+def machine():
+    """
+    Describe la máquina y el entorno en que se mide, para guardarlos con la línea base.
+    """
+    return {'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'system': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__}
+
+
+def auto_losses(results):
+    """
+    Devuelve los mensajes de los casos con engine='auto' cuya salida es mayor que la de Huffman,
+    el motor por defecto, sobre el mismo corpus (el caso con el mismo generador y sin opciones).
+    """
+    by_name = {result['name']: result for result in results}
+    losses = []
+    for name, _, generator, options, _ in CASES:
+        if options != {'engine': 'auto'} or name not in by_name:
+            continue
+        reference = next((case[0] for case in CASES if case[2] is generator and not case[3]), None)
+        if reference in by_name and by_name[name]['compressed_size'] > by_name[reference]['compressed_size']:
+            losses.append(f"{name}: {by_name[name]['compressed_size']} bytes, "
+                          f"{reference} (huffman): {by_name[reference]['compressed_size']} bytes")
+    return losses
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark every codec on deterministic synthetic corpora.")
+    parser.add_argument('--scale', type=float, default=1.0, help="corpus size multiplier")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the fastest one is reported")
+    parser.add_argument('--workers', type=int, default=1, help="processes per encoder (default 1, for stable numbers)")
+    parser.add_argument('--only', nargs='+', metavar='CASE', help="run only these cases")
+    parser.add_argument('--corpus', help="folder where the corpora are generated and reused (default: a temporary one)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare with or to save")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--check', action='store_true',
+                        help="also fail when there is no baseline recorded with the same settings")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="tolerated relative MB/s drop before failing (default 0.2)")
+    return parser
+
+
+def main(arguments=None):
+    args = build_parser().parse_args(arguments)
+
+    cases = [case for case in CASES if not args.only or case[0] in args.only]
+    if find_ffmpeg() is None:
+        cases = [case for case in cases if case[1] != '.mp4']
+        print("ffmpeg not found: skipping the video corpus")
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        folder = args.corpus or temporary_folder
+        os.makedirs(folder, exist_ok=True)
+        results = []
+        print_header()
+        for case in cases:
+            name, _, _, options, lossless = case
+            corpus_file = generate_corpus(case, folder, args.scale)
+            results.append(run_isolated((name, corpus_file, dict(options, workers=args.workers), lossless, args.repeat)))
+            print_result(results[-1])
+
+    failed = [result['name'] for result in results if result['verified'] is False]
+    for name in failed:
+        print(f"FAILED {name}: the restored file differs from the original", file=sys.stderr)
+    # El motor automático nunca debe dar una salida mayor que Huffman
+    losses = auto_losses(results)
+    for message in losses:
+        print(f"FAILED auto engine chose a larger output: {message}", file=sys.stderr)
+    failed += losses
+
+    record = {'scale': args.scale, 'workers': args.workers, 'machine': machine(),
+              'results': {result['name']: result for result in results}}
+    if args.save_baseline:
+        # Se conservan los casos de la línea base que no se ejecutaron esta vez
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as file:
+                previous = json.load(file)
+            if (previous['scale'], previous['workers']) == (args.scale, args.workers):
+                record['results'] = dict(previous['results'], **record['results'])
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(record, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if (baseline['scale'], baseline['workers']) != (args.scale, args.workers):
+            print(f"The baseline was recorded with --scale {baseline['scale']:g} --workers {baseline['workers']}; "
+                  f"not comparing", file=sys.stderr)
+            if args.check:
+                return 1
+        else:
+            if baseline.get('machine') != record['machine']:
+                print(f"WARNING: the baseline was recorded on another machine or environment "
+                      f"({baseline.get('machine', 'unknown')})", file=sys.stderr)
+            regressions = compare(results, baseline['results'], args.threshold)
+            for message in regressions:
+                print(f"REGRESSION {message}", file=sys.stderr)
+            if regressions:
+                return 1
+            print(f"No case is more than {args.threshold:.0%} slower than the baseline")
+    else:
+        print(f"WARNING: no baseline at {args.baseline}; nothing was checked for regressions. "
+              f"Record one on this machine with --save-baseline", file=sys.stderr)
+        if args.check:
+            return 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,25 +5,46 @@
 
 import bitarray
 import os
+from Bloques import SYMBOLS_UTF8, compress_blocks, decompress_blocks, is_container, partial_output, utf8_length
+from Huffman import HuffmanNode, MAX_CODE_LENGTH, TableDecoder, build_code_lengths, build_tree_from_codes, canonical_codes, codes_from_tree
+from Analisis import check_engine
+from Diccionario import load_dictionary
+from LZ77 import LEVELS
+from Medicion import NULL_RECORDER
 
 
-class HuffmanNode:
-    def __init__(self, char=None, freq=0):
-        # Inicializa un nodo del árbol de Huffman
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-
-    def __lt__(self, other):
-        # Define la comparación de nodos basada en la frecuencia
-        return self.freq < other.freq
+# Tamaño por defecto, en caracteres, de los bloques que se leen y codifican por separado
+BUFFER_SIZE = 1 << 20
 
 
 class TextHuffmanEncoder:
-    def __init__(self):
-        # Inicializa el codificador Huffman
-        self.nodes = []
+    def __init__(self, buffer_size=BUFFER_SIZE, workers=None, recorder=None, level=None, dictionary=None,
+                 engine='huffman', target='balanced'):
+        # Inicializa el codificador Huffman; buffer_size acota la memoria usada por bloque,
+        # workers es el número de procesos (por defecto, uno por núcleo) y recorder recibe
+        # el tiempo, los bytes y la memoria de cada etapa (por defecto no se mide nada).
+        # Con level (de 1, más rápido, a 9, más compacto) se buscan antes repeticiones con LZ77,
+        # que comprime mucho más los textos repetitivos como los registros, pero es más lento.
+        # Con dictionary (un archivo de Diccionario.py o un HuffmanDictionary) se codifica con su
+        # tabla preentrenada, lo que conviene a los archivos pequeños. Si no, engine elige el
+        # motor ('huffman', 'stored', 'zlib', 'lzma' o 'auto', que lo decide según target)
+        if level is not None and level not in LEVELS:
+            raise ValueError(f"Invalid compression level {level}; use 1 to 9.")
+        if level is not None and dictionary is not None:
+            raise ValueError("A compression level and a dictionary cannot be used together.")
+        if engine != 'huffman' and (level is not None or dictionary is not None):
+            raise ValueError("An engine other than huffman cannot be used with a level or a dictionary.")
+        check_engine(engine, target)
+        if isinstance(dictionary, str):
+            dictionary = load_dictionary(dictionary)
+        self.max_code_length = MAX_CODE_LENGTH
+        self.buffer_size = buffer_size
+        self.workers = workers
+        self.recorder = recorder or NULL_RECORDER
+        self.level = level
+        self.dictionary = dictionary
+        self.engine = engine
+        self.target = target
 
     def build_frequency_map(self, data):
         """
@@ -36,23 +57,10 @@ class TextHuffmanEncoder:
 
     def build_tree(self, frequency_map):
         """
-        Construye y devuelve un árbol de Huffman basado en el mapa de frecuencias dado.
+        Construye y devuelve un árbol de Huffman canónico basado en el mapa de frecuencias dado.
         """
-        self.nodes = [HuffmanNode(char, freq) for char, freq in frequency_map.items()]
-
-        while len(self.nodes) > 1:
-            # Combina nodos de menor frecuencia para construir el árbol
-            self.nodes.sort(key=lambda x: x.freq)
-            left = self.nodes.pop(0)
-            right = self.nodes.pop(0)
-
-            merged_node = HuffmanNode(freq=left.freq + right.freq)
-            merged_node.left = left
-            merged_node.right = right
-
-            self.nodes.append(merged_node)
-
-        return self.nodes[0]
+        lengths = build_code_lengths(frequency_map, self.max_code_length)
+        return build_tree_from_codes(canonical_codes(lengths))
 
     def build_codebook(self, root, current_code="", codebook=None):
         """
@@ -71,57 +79,58 @@ class TextHuffmanEncoder:
 
     def compress(self, data):
         """
-        Comprime los datos utilizando el algoritmo de Huffman y devuelve los datos comprimidos y el árbol de Huffman.
+        Comprime los datos utilizando el algoritmo de Huffman y devuelve un bitarray con los datos comprimidos y el árbol de Huffman.
         """
-        frequency_map = self.build_frequency_map(data)
-        root = self.build_tree(frequency_map)
-        codebook = self.build_codebook(root)
+        with self.recorder.stage('frequency map', len(data)):
+            frequency_map = self.build_frequency_map(data)
+        with self.recorder.stage('tree'):
+            root = self.build_tree(frequency_map)
+        with self.recorder.stage('codebook'):
+            codebook = self.build_codebook(root)
 
-        encoded_data = "".join(codebook[char] for char in data)
+        # bitarray escribe cada código directamente en un búfer de bits empaquetados
+        with self.recorder.stage('bit packing', len(data)) as stage:
+            encoded_data = bitarray.bitarray()
+            if codebook:
+                encoded_data.encode({char: bitarray.bitarray(code) for char, code in codebook.items()}, data)
+            stage.bytes_out = len(encoded_data) // 8
         return encoded_data, root
 
-    def decompress(self, encoded_data, root):
+    def build_decoder(self, root):
         """
-        Descomprime los datos comprimidos utilizando el árbol de Huffman.
+        Construye el decodificador por tablas correspondiente al árbol de Huffman.
         """
-        decoded_data = ""
-        current_node = root
-
-        for bit in encoded_data:
-            if current_node is not None:
-                if bit == "0" and current_node.left:
-                    current_node = current_node.left
-                elif bit == "1" and current_node.right:
-                    current_node = current_node.right
+        codes = {char.encode('utf-8'): code for char, code in codes_from_tree(root).items()}
+        return TableDecoder(codes)
 
-                if current_node.char is not None:
-                    decoded_data += current_node.char
-                    current_node = root
-            else:
-                # Maneja el caso donde current_node es None
-                # Esto podría suceder si los datos comprimidos son inválidos
-                break
+    def decompress(self, encoded_data, root):
+        """
+        Descomprime un bitarray utilizando la tabla de decodificación del árbol de Huffman.
+        """
+        decoded_data = self.build_decoder(root).decode(encoded_data.tobytes(), len(encoded_data))
+        return decoded_data.decode('utf-8')
 
-        return decoded_data
+    def read_chunks(self, input_file):
+        """
+        Lee el archivo de texto en bloques de buffer_size caracteres.
+        """
+        with open(input_file, 'r', encoding='utf-8') as file:
+            yield from iter(lambda: file.read(self.buffer_size), '')
 
     def compress_file(self, input_file, output_folder, progress_callback=None):
         """
         Comprime un archivo de texto y guarda el archivo comprimido en la carpeta de salida.
+        Cada bloque de buffer_size caracteres se codifica con su propia tabla en un proceso aparte.
         """
-        with open(input_file, 'r', encoding='utf-8') as file:
-            data = file.read()
-
-        encoded_data, root = self.compress(data)
-        bit_array = bitarray.bitarray(encoded_data)
-
         file_name, _ = os.path.splitext(os.path.basename(input_file))
         output_file_path = os.path.join(output_folder, f"{file_name}_compressed.bin")
 
-        with open(output_file_path, 'wb') as file:
-            tree_bytes = self.encode_tree(root)
-            file.write(len(tree_bytes).to_bytes(4, byteorder='big'))
-            file.write(tree_bytes)
-            bit_array.tofile(file)
+        compress_blocks(self.read_chunks(input_file), output_file_path, SYMBOLS_UTF8,
+                        max_code_length=self.max_code_length, workers=self.workers,
+                        progress_callback=progress_callback, total_size=os.path.getsize(input_file),
+                        recorder=self.recorder, level=self.level, dictionary=self.dictionary,
+                        metadata=self.dictionary.id if self.dictionary else b'', engine=self.engine,
+                        target=self.target)
 
         if progress_callback:
             progress_callback(100)
@@ -131,59 +140,88 @@ class TextHuffmanEncoder:
     def decompress_file(self, input_file, output_folder, progress_callback=None):
         """
         Descomprime un archivo binario y guarda el archivo descomprimido en la carpeta de salida.
+        Acepta tanto el contenedor por bloques como el formato original de un solo árbol.
         """
-        with open(input_file, 'rb') as file:
-            tree_size = int.from_bytes(file.read(4), byteorder='big')
-            tree_bytes = file.read(tree_size)
-            encoded_data = bitarray.bitarray()
-            encoded_data.fromfile(file)
-
-        root = self.decode_tree(tree_bytes)
-        decoded_data = self.decompress(encoded_data.to01(), root)
-
-        # Cambios para corregir la escritura de datos descomprimidos
-        decoded_data_bytes = decoded_data.encode('utf-8')
+        if not is_container(input_file):
+            return self.decompress_legacy_file(input_file, output_folder, progress_callback)
 
         file_name, _ = os.path.splitext(os.path.basename(input_file))
         output_file_path = os.path.join(output_folder, f"{file_name}_decompressed.txt")
 
-        with open(output_file_path, 'wb') as file:
-            file.write(decoded_data_bytes)
+        _, blocks = decompress_blocks(input_file, self.workers, progress_callback=progress_callback,
+                                      recorder=self.recorder, dictionary=self.dictionary)
+        # Si el callback cancela a mitad de la escritura, no queda un texto a medias
+        with partial_output(output_file_path), open(output_file_path, 'wb') as file:
+            for block in blocks:
+                with self.recorder.stage('write', len(block)) as stage:
+                    file.write(block)
+                    stage.bytes_out = len(block)
 
         if progress_callback:
             progress_callback(100)
 
         return output_file_path
 
-    def encode_tree(self, root):
+    def decompress_legacy_file(self, input_file, output_folder, progress_callback=None):
         """
-        Codifica el árbol de Huffman en bytes.
+        Descomprime un archivo con el formato original: un árbol seguido de un único flujo de bits.
         """
-        if root is None:
-            return b''
+        file_name, _ = os.path.splitext(os.path.basename(input_file))
+        output_file_path = os.path.join(output_folder, f"{file_name}_decompressed.txt")
 
-        if root.char is not None:
-            return b'\x01' + root.char.encode('utf-8')
-        else:
-            left_bytes = self.encode_tree(root.left)
-            right_bytes = self.encode_tree(root.right)
-            return b'\x00' + len(left_bytes).to_bytes(4, byteorder='big') + left_bytes + right_bytes
+        total_size = os.path.getsize(input_file)
+        with open(input_file, 'rb') as source, partial_output(output_file_path), open(output_file_path, 'wb') as file:
+            tree_size = int.from_bytes(source.read(4), byteorder='big')
+            tree_bytes = source.read(tree_size)
+
+            # La tabla produce directamente los bytes UTF-8 de cada caracter, bloque por bloque
+            with self.recorder.stage('codebook', tree_size):
+                decoder = self.build_decoder(self.decode_tree(tree_bytes))
+            chunk = source.read(self.buffer_size)
+            while chunk:
+                with self.recorder.stage('read') as stage:
+                    next_chunk = source.read(self.buffer_size)
+                    stage.bytes_out = len(next_chunk)
+                with self.recorder.stage('bit unpacking', len(chunk)) as stage:
+                    decoded_data = decoder.decode(chunk, final=not next_chunk)
+                    stage.bytes_out = len(decoded_data)
+                with self.recorder.stage('write', len(decoded_data)) as stage:
+                    file.write(decoded_data)
+                    stage.bytes_out = len(decoded_data)
+                chunk = next_chunk
+                if progress_callback:
+                    progress_callback(100 * source.tell() / total_size)
+
+        if progress_callback:
+            progress_callback(100)
+
+        return output_file_path
 
     def decode_tree(self, tree_bytes):
         """
-        Decodifica los bytes y reconstruye el árbol de Huffman.
+        Reconstruye el árbol de Huffman de un archivo con el formato original.
+        Recorre los bytes una sola vez, con una pila explícita y sin copiar sub-bloques.
         """
         if not tree_bytes:
             return None
 
-        if tree_bytes[0] == 1:
-            char = tree_bytes[1:].decode('utf-8')
-            return HuffmanNode(char)
-        else:
-            left_size = int.from_bytes(tree_bytes[1:5], byteorder='big')
-            left_tree = self.decode_tree(tree_bytes[5:5 + left_size])
-            right_tree = self.decode_tree(tree_bytes[5 + left_size:])
-            root = HuffmanNode()
-            root.left = left_tree
-            root.right = right_tree
-            return root
+        # Cada nodo interno es 0x00 seguido del tamaño (4 bytes) de su subárbol izquierdo,
+        # y cada hoja es 0x01 seguido de su caracter en UTF-8
+        holder = HuffmanNode()
+        pending = [(holder, 'left')]
+        pos = 0
+
+        while pending and pos < len(tree_bytes):
+            parent, side = pending.pop()
+            if tree_bytes[pos] == 1:
+                size = utf8_length(tree_bytes[pos + 1])
+                node = HuffmanNode(tree_bytes[pos + 1:pos + 1 + size].decode('utf-8'))
+                pos += 1 + size
+            else:
+                node = HuffmanNode()
+                pos += 5
+                pending.append((node, 'right'))
+                pending.append((node, 'left'))
+            setattr(parent, side, node)
+
+        return holder.left
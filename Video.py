@@ -3,38 +3,249 @@
 @author: Valeria Marian Andrade Monreal
 """
 
-# Importación de las librerías necesarias para su correcto funcionamiento
-from moviepy.editor import VideoFileClip
+# Importación de las librerías necesarias para su correcto funcionamiento; moviepy tarda
+# segundos en cargarse, así que se importa solo en las funciones que lo usan
 import os
+import re
+import subprocess
+import tempfile
+from Bloques import map_blocks
+from Cache import cached_by_identity
+from Medicion import NULL_RECORDER
+
+
+# Duración aproximada de cada segmento en el modo paralelo; los cortes caen en el
+# fotograma clave siguiente porque se divide sin recodificar
+SEGMENT_SECONDS = 10
+
+# Códecs que el contenedor MP4 admite tal cual; con ellos basta copiar los flujos
+MP4_VIDEO_CODECS = ('h264', 'hevc', 'mpeg4', 'av1')
+MP4_AUDIO_CODECS = ('aac', 'mp3', 'alac')
+
+
+def ffmpeg_binary():
+    """
+    Devuelve la ruta del ffmpeg que usa moviepy.
+    """
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(arguments):
+    """
+    Ejecuta el ffmpeg que usa moviepy con los argumentos dados y falla si termina con error.
+    """
+    command = [ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y'] + arguments
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def parse_bitrate(bitrate):
+    """
+    Convierte una tasa como "1000k" o "5M" a kb/s.
+    """
+    bitrate = str(bitrate).strip().lower()
+    multiplier = {'k': 1, 'm': 1000}.get(bitrate[-1:])
+    if multiplier:
+        return float(bitrate[:-1]) * multiplier
+    return float(bitrate) / 1000
+
+
+@cached_by_identity(maxsize=256)
+def probe_file(input_file):
+    """
+    Devuelve los códecs y tasas de bits (kb/s) del archivo. El resultado se recuerda según la
+    identidad del archivo (ruta, tamaño, fecha de modificación e inodo).
+    """
+    result = subprocess.run([ffmpeg_binary(), '-hide_banner', '-i', input_file],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    output = result.stderr.decode('utf-8', errors='replace')
+
+    # ffmpeg sin salida termina con error pero describe la entrada en stderr
+    info = {'bitrate': None, 'video_codec': None, 'video_bitrate': None, 'audio_codec': None}
+    match = re.search(r'Duration: .*?bitrate: (\d+) kb/s', output)
+    if match:
+        info['bitrate'] = int(match.group(1))
+    match = re.search(r'Stream #\S+.*?: Video: (\w+)([^\n]*)', output)
+    if match:
+        info['video_codec'] = match.group(1)
+        stream_bitrate = re.search(r'(\d+) kb/s', match.group(2))
+        info['video_bitrate'] = int(stream_bitrate.group(1)) if stream_bitrate else None
+    match = re.search(r'Stream #\S+.*?: Audio: (\w+)', output)
+    if match:
+        info['audio_codec'] = match.group(1)
+    return info
+
+
+def can_copy_streams(info):
+    """
+    Indica si los flujos del archivo pueden copiarse a MP4 sin recodificar.
+    """
+    return info['video_codec'] in MP4_VIDEO_CODECS and info['audio_codec'] in MP4_AUDIO_CODECS + (None,)
+
+
+def copy_streams(input_file, output_file):
+    """
+    Reempaqueta el archivo en MP4 copiando los flujos, sin recodificar.
+    """
+    run_ffmpeg(['-i', input_file, '-map', '0:v', '-map', '0:a?', '-c', 'copy', '-movflags', '+faststart', output_file])
+    return output_file
+
+
+def encode_segment(task):
+    """
+    Codifica un segmento (entrada, salida, argumentos del codificador) sin audio en un proceso aparte.
+    """
+    segment_file, output_file, encoder_arguments = task
+    run_ffmpeg(['-i', segment_file, '-an'] + encoder_arguments + [output_file])
+    return output_file
 
 
 class VideoCompressor:
-    def compress_file(self, input_file, output_folder):
-        # Cargar el video usando moviepy
-        clip = VideoFileClip(input_file)
+    def __init__(self, preset="medium", crf=None, threads=None, bitrate="1000k", parallel=False,
+                 workers=None, segment_seconds=SEGMENT_SECONDS, stream_copy=True, recorder=None):
+        # Inicializa el compresor; preset, crf, threads y bitrate se pasan a libx264 (con crf
+        # se ignora bitrate). Con parallel el video se divide en segmentos por fotogramas clave
+        # que se codifican a la vez en workers procesos (por defecto, uno por núcleo). Con
+        # stream_copy se copian los flujos sin recodificar cuando eso ya da el resultado pedido.
+        # recorder recibe las mediciones de cada etapa
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.bitrate = bitrate
+        self.parallel = parallel
+        self.workers = workers
+        self.segment_seconds = segment_seconds
+        self.stream_copy = stream_copy
+        self.recorder = recorder or NULL_RECORDER
+
+    def encoder_arguments(self):
+        """
+        Devuelve los argumentos de ffmpeg para libx264 según la configuración.
+        """
+        arguments = ['-c:v', 'libx264', '-preset', self.preset]
+        if self.crf is not None:
+            arguments += ['-crf', str(self.crf)]
+        elif self.bitrate:
+            arguments += ['-b:v', self.bitrate]
+        if self.threads:
+            arguments += ['-threads', str(self.threads)]
+        return arguments
 
+    def compress_file(self, input_file, output_folder, progress_callback=None):
         # Extraer el nombre y la extensión del archivo de entrada
-        file_name, file_extension = os.path.splitext(os.path.basename(clip.filename))
+        file_name, file_extension = os.path.splitext(os.path.basename(input_file))
 
         # Construir la ruta de salida para el archivo comprimido
         output_file = os.path.join(output_folder, f"compressed_{file_name}.mp4")
 
-        # Escribir el video comprimido usando codec libx264, audio_codec aac y bitrate de 1000k (ajustable)
-        clip.write_videofile(output_file, codec="libx264", audio_codec="aac", bitrate="1000k")  # Ajusta el bitrate según tus necesidades
+        if self.stream_copy:
+            with self.recorder.stage('probe'):
+                compressed = self.already_compressed(input_file)
+            if compressed:
+                return self.copy_streams(input_file, output_file)
+
+        if self.parallel:
+            return self.compress_segments(input_file, output_file, progress_callback)
+
+        with self.recorder.stage('transcode', os.path.getsize(input_file)) as stage:
+            # Cargar el video usando moviepy
+            from moviepy.editor import VideoFileClip
+            clip = VideoFileClip(input_file)
+
+            # Escribir el video comprimido usando codec libx264, audio_codec aac y la configuración elegida
+            clip.write_videofile(output_file, codec="libx264", audio_codec="aac",
+                                 bitrate=None if self.crf is not None else self.bitrate, preset=self.preset,
+                                 threads=self.threads, ffmpeg_params=['-crf', str(self.crf)] if self.crf is not None else None)
+            clip.close()
+            stage.bytes_out = os.path.getsize(output_file)
+
+        if progress_callback:
+            progress_callback(100)
+
+        return output_file
+
+    def already_compressed(self, input_file):
+        """
+        Indica si el archivo ya está por debajo de la tasa pedida con códecs que MP4 admite,
+        de modo que recodificarlo solo perdería calidad.
+        """
+        if self.crf is not None or not self.bitrate:
+            return False
+        info = probe_file(input_file)
+        bitrate = info['video_bitrate'] or info['bitrate']
+        return can_copy_streams(info) and bitrate is not None and bitrate <= parse_bitrate(self.bitrate)
 
+    def copy_streams(self, input_file, output_file):
+        """
+        Copia los flujos sin recodificar, midiendo la etapa.
+        """
+        with self.recorder.stage('stream copy', os.path.getsize(input_file)) as stage:
+            copy_streams(input_file, output_file)
+            stage.bytes_out = os.path.getsize(output_file)
         return output_file
 
-    def decompress_file(self, input_file, output_folder):
-        # Cargar el video usando moviepy
-        clip = VideoFileClip(input_file)
+    def compress_segments(self, input_file, output_file, progress_callback=None):
+        """
+        Divide el video en fotogramas clave sin recodificar, codifica los segmentos en paralelo
+        y los une sin recodificar; el audio se codifica una sola vez al unir. progress_callback
+        recibe el porcentaje de segmentos codificados.
+        """
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(output_file) or None) as work_folder:
+            # El muxer de segmentos con copia de flujo solo puede cortar en fotogramas clave
+            with self.recorder.stage('split', os.path.getsize(input_file)):
+                run_ffmpeg(['-i', input_file, '-map', '0:v:0', '-c', 'copy', '-f', 'segment',
+                            '-segment_time', str(self.segment_seconds), '-reset_timestamps', '1',
+                            os.path.join(work_folder, 'segment_%05d.mp4')])
+                segments = sorted(name for name in os.listdir(work_folder) if name.startswith('segment_'))
 
+            tasks = ((os.path.join(work_folder, name), os.path.join(work_folder, f"encoded_{name}"), self.encoder_arguments())
+                     for name in segments)
+            encoded = []
+            # Cada etapa de codificación es la espera del siguiente segmento codificado
+            for path in self.recorder.iterate('encode', map_blocks(encode_segment, tasks, self.workers), os.path.getsize):
+                encoded.append(path)
+                if progress_callback:
+                    progress_callback(100 * len(encoded) / len(segments))
+
+            list_file = os.path.join(work_folder, 'segments.txt')
+            with open(list_file, 'w', encoding='utf-8') as file:
+                for path in encoded:
+                    # Las comillas simples se escapan como espera el demuxer concat
+                    escaped_path = path.replace("'", "'\\''")
+                    file.write(f"file '{escaped_path}'\n")
+
+            with self.recorder.stage('concat') as stage:
+                run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_file, '-i', input_file,
+                            '-map', '0:v:0', '-map', '1:a?', '-c:v', 'copy', '-c:a', 'aac', output_file])
+                stage.bytes_out = os.path.getsize(output_file)
+
+        return output_file
+
+    def decompress_file(self, input_file, output_folder, progress_callback=None):
         # Extraer el nombre y la extensión del archivo de entrada
-        file_name, file_extension = os.path.splitext(os.path.basename(clip.filename))
+        file_name, file_extension = os.path.splitext(os.path.basename(input_file))
 
         # Construir la ruta de salida para el archivo descomprimido
         output_file = os.path.join(output_folder, f"decompressed_{file_name}.mp4")
 
-        # Escribir el video descomprimido usando codec libx264, audio_codec aac y bitrate de 5000k (ajustable)
-        clip.write_videofile(output_file, codec="libx264", audio_codec="aac", bitrate="5000k")  # Ajusta el bitrate según tus necesidades
+        # Recodificar no recupera calidad: si los códecs caben en MP4 basta copiar los flujos
+        if self.stream_copy:
+            with self.recorder.stage('probe'):
+                copyable = can_copy_streams(probe_file(input_file))
+            if copyable:
+                return self.copy_streams(input_file, output_file)
+
+        with self.recorder.stage('transcode', os.path.getsize(input_file)) as stage:
+            # Cargar el video usando moviepy
+            from moviepy.editor import VideoFileClip
+            clip = VideoFileClip(input_file)
+
+            # Escribir el video descomprimido usando codec libx264, audio_codec aac y bitrate de 5000k (ajustable)
+            clip.write_videofile(output_file, codec="libx264", audio_codec="aac", bitrate="5000k")  # Ajusta el bitrate según tus necesidades
+            clip.close()
+            stage.bytes_out = os.path.getsize(output_file)
+
+        if progress_callback:
+            progress_callback(100)
 
         return output_file